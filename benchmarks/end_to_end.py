@@ -0,0 +1,343 @@
+"""
+End-to-end latency and throughput of the bot's message path, fully offline.
+
+Simulated users send text messages through the real python-telegram-bot
+Application and handlers. Groq is replaced by a local fake server (see
+fake_groq.py) reached through the real SDK, Telegram by a fake request object
+(fake_telegram.py) and Qdrant runs in-process (:memory:) or as the local index.
+Embeddings, retrieval, context building and streaming run unchanged.
+
+With --transport webhook the updates are posted over HTTP to the bot's webhook
+server, as Telegram would, instead of being handed to the application directly.
+
+Reports p50/p95/p99 per stage, messages per second and peak RSS. With
+--baseline the run is compared with a stored report and exits with status 1
+when a stage, the throughput or the memory regressed by more than --tolerance.
+
+    python -m benchmarks.end_to_end --users 20 --messages 10 --save-baseline .hyppo/bench-baseline.json
+    python -m benchmarks.end_to_end --users 20 --messages 10 --baseline .hyppo/bench-baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .fake_groq import FakeGroqServer
+from .fake_telegram import FakeTelegramRequest, WebhookSender, message_data
+
+QUESTIONS = [
+    "How do I find a room in a shared flat near the university?",
+    "Where can I buy a bus ticket to the Fisciano campus?",
+    "How much does a room cost in Salerno?",
+    "What documents do I need for the residence permit?",
+    "How do I get the codice fiscale?",
+    "Which supermarkets are cheap near the centre?",
+    "What can I do in Salerno on the weekend?",
+    "¿Dónde puedo alquilar un piso cerca de la universidad?",
+    "¿Cómo llego al campus de Fisciano en autobús?",
+    "¿Qué documentos necesito para el permiso de residencia?",
+    "Dove posso trovare una stanza in affitto?",
+    "Come arrivo al campus di Fisciano?",
+]
+
+STAGES = ['handler', 'webhook_ack', 'embed', 'retrieval', 'context', 'llm_first_token', 'llm', 'telegram']
+
+
+class StageTimer:
+    """Collects per-stage durations by wrapping the async methods of the live objects."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def reset(self):
+        self.samples.clear()
+
+    def wrap(self, owner, attribute: str, stage: str):
+        original = getattr(owner, attribute)
+
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.samples[stage].append((time.perf_counter() - start) * 1000)
+
+        setattr(owner, attribute, timed)
+
+    def wrap_stream(self, owner, attribute: str, first_stage: str, stage: str):
+        original = getattr(owner, attribute)
+
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            first = True
+            try:
+                async for piece in original(*args, **kwargs):
+                    if first:
+                        self.samples[first_stage].append((time.perf_counter() - start) * 1000)
+                        first = False
+                    yield piece
+            finally:
+                self.samples[stage].append((time.perf_counter() - start) * 1000)
+
+        setattr(owner, attribute, timed)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        stages = {}
+        for stage in STAGES:
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stages[stage] = {'count': len(values), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+        return stages
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def build_services(args, workdir: str):
+    from bot.services import BotServices
+    from llm.Groq_client import GroqClient
+    from llm.answer_cache import SemanticAnswerCache
+    from llm.gateway import GatewayConfig
+    from rag.pipeline import RAGPipeline
+
+    rag = RAGPipeline("benchmark", args.model, recreate_collection=True,
+                      manifest_path=os.path.join(workdir, "manifest.json"),
+                      embedding_cache_dir=os.path.join(workdir, "embeddings"),
+                      vector_backend="local" if args.backend == "local" else "qdrant",
+                      index_directory=os.path.join(workdir, "index"), use_hybrid_search=True)
+    # The fake server has no rate limits, the buckets would only measure themselves
+    gateway_config = GatewayConfig(max_concurrency=args.llm_concurrency, requests_per_minute=1e6,
+                                   tokens_per_minute=1e9, fallback_models=())
+    llm = GroqClient(rag=rag, answer_cache=SemanticAnswerCache() if args.answer_cache else None,
+                     gateway_config=gateway_config)
+    services = BotServices(data_directory=args.data, rag=rag, llm=llm)
+    services.warm_up()
+    return services
+
+
+async def simulate(args, services, timer: StageTimer) -> Dict[str, Any]:
+    from telegram import Update
+    from telegram.ext import Application
+    from bot.services import SERVICES_KEY
+    from bot.webhook import WebhookServer
+    from run_bot import add_handlers
+
+    telegram = FakeTelegramRequest(args.telegram_latency)
+    timer.wrap(telegram, 'do_request', 'telegram')
+    application = (
+        Application.builder()
+        .token("123456:benchmark")
+        .request(telegram)
+        .get_updates_request(FakeTelegramRequest())
+        .concurrent_updates(args.users)
+        .build()
+    )
+    application.bot_data[SERVICES_KEY] = services
+    add_handlers(application)
+
+    timer.wrap(services.rag.embedding_manager, 'aembed_query', 'embed')
+    timer.wrap(services.rag, 'asearch', 'retrieval')
+    timer.wrap(services.llm.context_builder, 'abuild', 'context')
+    timer.wrap_stream(services.llm.gateway, 'stream', 'llm_first_token', 'llm')
+
+    update_ids = itertools.count(1)
+    rng = random.Random(args.seed)
+    rejected = 0
+
+    server = sender = None
+    # Futures resolved when the webhook workers are done with an update
+    processed: Dict[int, asyncio.Future] = {}
+    if args.transport == 'webhook':
+        server = WebhookServer(application, "benchmark-secret", host="127.0.0.1", port=0, workers=args.users)
+        process_update = server.process_update
+
+        async def tracked(update):
+            try:
+                await process_update(update)
+            finally:
+                processed.pop(update.update_id).set_result(None)
+
+        server.process_update = tracked
+
+    async def send(user_id: int):
+        nonlocal rejected
+        data = message_data(next(update_ids), user_id, rng.choice(QUESTIONS))
+        start = time.perf_counter()
+        if sender is None:
+            await application.process_update(Update.de_json(data, application.bot))
+        else:
+            done = processed[data['update_id']] = asyncio.get_running_loop().create_future()
+            status = await sender.send(data)
+            timer.samples['webhook_ack'].append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                processed.pop(data['update_id'])
+                rejected += 1
+                return
+            await done
+        timer.samples['handler'].append((time.perf_counter() - start) * 1000)
+
+    async def user(user_id: int):
+        for _ in range(args.messages):
+            await send(user_id)
+            if args.think_time:
+                await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+    async with application:
+        if server is not None:
+            await server.start()
+            server.ready = True
+            sender = WebhookSender(f"http://127.0.0.1:{server.port}{server.path}", server.secret_token)
+        try:
+            for user_id in range(args.users, args.users + 2):
+                await send(user_id)
+            timer.reset()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(user(user_id) for user_id in range(args.users)))
+            elapsed = time.perf_counter() - start
+        finally:
+            if server is not None:
+                await sender.aclose()
+                await server.stop()
+
+    messages = args.users * args.messages
+    return {
+        'messages': messages,
+        'seconds': elapsed,
+        'messages_per_second': messages / elapsed,
+        'telegram_calls': dict(telegram.calls),
+        'webhook_rejected': rejected,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of the report against the baseline, larger than `tolerance` (a fraction)."""
+    regressions = []
+    for stage, current in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        for percentile in ('p50', 'p95'):
+            if current[percentile] > previous[percentile] * (1 + tolerance):
+                regressions.append(f"{stage} {percentile} {previous[percentile]:.1f} -> {current[percentile]:.1f} ms")
+    if report['messages_per_second'] < baseline['messages_per_second'] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['messages_per_second']:.2f} -> {report['messages_per_second']:.2f} msg/s")
+    if report['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']:.0f} -> {report['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    config = report['config']
+    print(f"{config['users']} users x {config['messages']} messages, backend {config['backend']}, "
+          f"LLM latency {config['llm_latency']}s at {config['llm_tokens_per_second']} tok/s")
+    print(f"{'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'base p95':>10}")
+    for stage, values in report['stages'].items():
+        base = (baseline or {}).get('stages', {}).get(stage)
+        base_p95 = f"{base['p95']:>10.1f}" if base else f"{'-':>10}"
+        print(f"{stage:<18}{values['count']:>7}{values['p50']:>10.1f}{values['p95']:>10.1f}{values['p99']:>10.1f}{base_p95}")
+    print(f"throughput {report['messages_per_second']:.2f} msg/s, peak RSS {report['peak_rss_mb']:.0f} MB")
+    if report.get('webhook_rejected'):
+        print(f"{report['webhook_rejected']} updates rejected by the webhook server")
+
+
+def run(args) -> int:
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s', force=True)
+    server = FakeGroqServer(args.llm_latency, args.llm_tokens_per_second, args.answer_tokens,
+                            args.rate_limit_ratio, args.error_ratio, args.seed).start()
+    os.environ['GROQ_BASE_URL'] = server.base_url
+    os.environ['GROQ_API_KEY'] = 'benchmark'
+    if args.backend == 'memory':
+        os.environ['QDRANT_URL'] = ':memory:'
+
+    timer = StageTimer()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            services = build_services(args, workdir)
+            result = asyncio.run(simulate(args, services, timer))
+            services.rag.close()
+    finally:
+        server.stop()
+
+    report = {
+        'config': {key: getattr(args, key) for key in ('users', 'messages', 'think_time', 'backend', 'model',
+                                                       'llm_latency', 'llm_tokens_per_second', 'answer_tokens',
+                                                       'telegram_latency', 'llm_concurrency', 'answer_cache',
+                                                       'transport')},
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+        **result
+    }
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print("warning: the baseline was recorded with different settings")
+    print_report(report, baseline)
+
+    if args.save_baseline:
+        directory = os.path.dirname(args.save_baseline)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"saved baseline to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regression beyond {args.tolerance:.0%}")
+    return 0
+
+
+def main():
+    from rag.models import DEFAULT_EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+    parser.add_argument('--messages', type=int, default=5, help='Messages sent by each user')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean seconds between two messages of a user')
+    parser.add_argument('--data', default='data', help='Knowledge base directory')
+    parser.add_argument('--model', default=DEFAULT_EMBEDDING_MODEL, help='FastEmbed model name')
+    parser.add_argument('--backend', choices=('memory', 'local'), default='memory',
+                        help='In-process Qdrant (memory) or the local vector index')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Seconds before the first LLM token')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=500.0, help='LLM generation speed')
+    parser.add_argument('--answer-tokens', type=int, default=120, help='Words in every answer')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='Fraction of LLM calls answered with 429')
+    parser.add_argument('--error-ratio', type=float, default=0.0, help='Fraction of LLM calls answered with 500')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='Seconds per Bot API call')
+    parser.add_argument('--llm-concurrency', type=int, default=8, help='LLM requests in flight at once')
+    parser.add_argument('--answer-cache', action='store_true', help='Enable the semantic answer cache')
+    parser.add_argument('--transport', choices=('direct', 'webhook'), default='direct',
+                        help="Hand updates to the application directly or post them to the webhook server")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='Report to compare with')
+    parser.add_argument('--save-baseline', help='Write this run as a baseline report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed regression, as a fraction')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+OpenAI-compatible stand-in for the Groq API, served over real HTTP.
+
+The bot talks to it through the unmodified Groq SDK (GROQ_BASE_URL points here),
+so client, gateway and streaming code run exactly as in production. Answers
+start after a configurable latency and are streamed at a configurable token
+rate; a fraction of requests can be answered with 429 or 500.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+ANSWER = ("Salerno is a friendly city for Erasmus students. Most students rent a room in a shared flat "
+          "near the centre and take the bus to the Fisciano campus. ESN volunteers can help you with "
+          "the residence permit, the tax code and finding a flat. ")
+
+
+class FakeGroqServer:
+    def __init__(self,
+                 latency: float = 0.2,
+                 tokens_per_second: float = 500.0,
+                 answer_tokens: int = 120,
+                 rate_limit_ratio: float = 0.0,
+                 error_ratio: float = 0.0,
+                 seed: int = 0):
+        """
+        Args:
+            latency: Seconds before the first token (queueing plus prompt processing)
+            tokens_per_second: Generation speed after the first token
+            answer_tokens: Words in every answer
+            rate_limit_ratio: Fraction of requests answered with 429
+            error_ratio: Fraction of requests answered with 500
+            seed: Seed of the failure injection
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._words = (ANSWER.split() * (answer_tokens // len(ANSWER.split()) + 1))[:answer_tokens]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> 'FakeGroqServer':
+        """Serve on a free port from a thread with its own event loop, so the server does not compete with the bot's loop."""
+        self._thread = threading.Thread(target=self._run, name="fake-groq", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Every response closes the connection, so no keep-alive or chunked encoding is needed
+        try:
+            method, path, headers = await self._read_head(reader)
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            self.requests += 1
+            if method == 'GET' and '/models' in path:
+                model = path.rsplit('/', 1)[-1]
+                await self._send_json(writer, 200, {'id': model, 'object': 'model', 'owned_by': 'fake'})
+            elif method == 'POST' and path.endswith('/chat/completions'):
+                await self._completion(writer, json.loads(body or b'{}'))
+            else:
+                await self._send_json(writer, 404, {'error': {'message': f'{method} {path} not found'}})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> Tuple[str, str, dict]:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return request_line[0], request_line[1], headers
+
+    async def _send_head(self, writer: asyncio.StreamWriter, status: int, content_type: str, extra: Optional[dict] = None):
+        reasons = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error'}
+        headers = {
+            'content-type': content_type,
+            'connection': 'close',
+            'x-ratelimit-remaining-requests': '14000',
+            'x-ratelimit-remaining-tokens': '100000',
+            'x-ratelimit-reset-tokens': '1s',
+            **(extra or {})
+        }
+        head = f"HTTP/1.1 {status} {reasons.get(status, 'OK')}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode('latin-1'))
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict, extra: Optional[dict] = None):
+        body = json.dumps(payload).encode()
+        await self._send_head(writer, status, 'application/json', {'content-length': str(len(body)), **(extra or {})})
+        writer.write(body)
+        await writer.drain()
+
+    async def _completion(self, writer: asyncio.StreamWriter, request: dict):
+        roll = self._random.random()
+        if roll < self.rate_limit_ratio:
+            await self._send_json(writer, 429, {'error': {'message': 'Rate limit reached', 'type': 'tokens'}},
+                                  {'retry-after': '1'})
+            return
+        if roll < self.rate_limit_ratio + self.error_ratio:
+            await self._send_json(writer, 500, {'error': {'message': 'Internal error'}})
+            return
+
+        await asyncio.sleep(self.latency)
+        model = request.get('model', 'fake')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not request.get('stream'):
+            await asyncio.sleep(len(self._words) / self.tokens_per_second)
+            await self._send_json(writer, 200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ' '.join(self._words)}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(self._words), 'total_tokens': len(self._words)}
+            })
+            return
+
+        await self._send_head(writer, 200, 'text/event-stream')
+        interval = 1 / self.tokens_per_second
+        for index, word in enumerate(self._words):
+            delta = {'content': word + ' '} if index else {'role': 'assistant', 'content': word + ' '}
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(interval)
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
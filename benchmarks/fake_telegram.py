@@ -0,0 +1,105 @@
+"""
+Offline stand-in for the Telegram Bot API and a generator of synthetic updates.
+
+FakeTelegramRequest plugs into python-telegram-bot as the bot's HTTP request
+object, so replies and edits go through the real Bot and Message code and only
+the network round trip is simulated. WebhookSender plays Telegram's side of a
+webhook, posting updates to the bot's webhook server.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'HyppoBot', 'username': 'hyppo_bot'}
+
+
+class FakeTelegramRequest(BaseRequest):
+    def __init__(self, latency: float = 0.05):
+        """
+        Args:
+            latency: Simulated round trip of every Bot API call, in seconds
+        """
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1_000_000)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        self.calls[endpoint] += 1
+        await asyncio.sleep(self.latency)
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, parameters)}).encode()
+
+    def _result(self, endpoint: str, parameters: Dict[str, Any]) -> Any:
+        if endpoint == 'getMe':
+            return {**BOT_USER, 'can_join_groups': False, 'can_read_all_group_messages': False,
+                    'supports_inline_queries': False}
+        if endpoint in ('sendMessage', 'editMessageText'):
+            chat_id = int(parameters.get('chat_id', 0))
+            message_id = parameters.get('message_id') or next(self._message_ids)
+            return {'message_id': int(message_id), 'date': int(time.time()), 'text': parameters.get('text', ''),
+                    'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER}
+        return True
+
+
+def message_data(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """A private text message from `user_id`, as the JSON Telegram delivers."""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': f'Student {user_id}'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'Student {user_id}', 'language_code': 'en'},
+            'text': text
+        }
+    }
+
+
+def message_update(bot, update_id: int, user_id: int, text: str) -> Update:
+    """A private text message from `user_id`, as Telegram would deliver it."""
+    return Update.de_json(message_data(update_id, user_id, text), bot)
+
+
+class WebhookSender:
+    def __init__(self, url: str, secret_token: str, connections: int = 40):
+        """
+        Push updates to a webhook the way Telegram does: JSON POSTs carrying the
+        secret token header, over a bounded pool of keep-alive connections.
+
+        Args:
+            url: Webhook URL, e.g. http://127.0.0.1:8080/telegram
+            secret_token: Value of X-Telegram-Bot-Api-Secret-Token
+            connections: Concurrent connections, Telegram's default max_connections is 40
+        """
+        self.url = url
+        self.secret_token = secret_token
+        self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=connections))
+
+    async def send(self, update: Dict[str, Any]) -> int:
+        """POST one update and return the status code of the acknowledgement."""
+        response = await self._client.post(self.url, content=json.dumps(update),
+                                           headers={'Content-Type': 'application/json',
+                                                    'X-Telegram-Bot-Api-Secret-Token': self.secret_token})
+        return response.status_code
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,98 @@
+"""
+Recall@k versus memory of the vector storage modes on the knowledge base.
+
+Embeds the chunks of the data directory, stores them in a local vector store
+for every storage mode and compares the results of each mode with exact
+float32 search. Section titles are used as queries. --replicate adds noisy
+copies of the corpus to approximate a larger knowledge base.
+
+    python -m benchmarks.quantization --data data --k 5 --replicate 50
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from rag.embeddings import DocumentProcessor, EmbeddingManager
+from rag.loaders import discover_files, load_documents
+from rag.local_index import LocalVectorStore
+from rag.quantization import VectorCompression
+from rag.models import DEFAULT_EMBEDDING_MODEL
+
+MODES = {
+    'float32': VectorCompression(),
+    'float32 on disk': VectorCompression(on_disk=True),
+    'int8': VectorCompression(mode="scalar", on_disk=True),
+    'int8 no rescore': VectorCompression(mode="scalar", on_disk=True, rescore=False),
+    'binary': VectorCompression(mode="binary", on_disk=True),
+    'binary no rescore': VectorCompression(mode="binary", on_disk=True, rescore=False),
+    'matryoshka 192': VectorCompression(dimensions=192),
+    'pca 128': VectorCompression(dimensions=128, reduction="pca"),
+    'pca 128 + int8': VectorCompression(mode="scalar", on_disk=True, dimensions=128, reduction="pca"),
+}
+
+
+def load_corpus(directory: str, processor: DocumentProcessor):
+    chunks = []
+    for document in load_documents(discover_files(directory)):
+        chunks.extend(processor.process_document(document['content'], document['source'], document['metadata']))
+    return chunks
+
+
+def replicate(vectors: np.ndarray, copies: int, noise: float, seed: int = 0) -> np.ndarray:
+    """Original vectors plus `copies` noisy, renormalized copies of them."""
+    if copies <= 0:
+        return vectors
+    rng = np.random.default_rng(seed)
+    extra = np.repeat(vectors, copies, axis=0)
+    extra += rng.normal(0, noise, extra.shape).astype(np.float32)
+    extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+    return np.vstack([vectors, extra]).astype(np.float32)
+
+
+def run(args):
+    embedding_manager = EmbeddingManager(args.model)
+    processor = DocumentProcessor(count_tokens=embedding_manager.count_tokens)
+    chunks = load_corpus(args.data, processor)
+    vectors = replicate(embedding_manager.embed_documents([chunk['content'] for chunk in chunks]),
+                        args.replicate, args.noise)
+
+    titles = sorted({chunk['metadata']['section'] for chunk in chunks if chunk['metadata'].get('section')})
+    queries = embedding_manager.embed_queries(titles)
+    documents = [{'id': str(i), 'content': '', 'source': 'benchmark'} for i in range(len(vectors))]
+
+    exact = vectors @ queries.T
+    truth = [set(np.argsort(-exact[:, q])[:args.k].astype(str)) for q in range(len(queries))]
+
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dimensions, {len(queries)} queries, recall@{args.k}")
+    print(f"{'mode':<20}{'recall':>8}{'resident MB':>14}{'bytes/vector':>14}{'ms/query':>10}")
+    for name, compression in MODES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalVectorStore("benchmark", True, directory, vectors.shape[1],
+                                     hnsw_threshold=len(vectors) + 1, compression=compression)
+            if store.needs_reducer_fit:
+                store.fit_reducer(vectors)
+            store.add_documents(documents, vectors)
+
+            start = time.perf_counter()
+            results = store.query_batch(queries, args.k)
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+
+            recall = np.mean([len(truth[q] & {hit.id for hit in hits}) / args.k for q, hits in enumerate(results)])
+            resident = store.describe()['resident_vector_bytes']
+            print(f"{name:<20}{recall:>8.3f}{resident / 2**20:>14.2f}{resident / len(vectors):>14.1f}{elapsed:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data', help='Knowledge base directory')
+    parser.add_argument('--model', default=DEFAULT_EMBEDDING_MODEL, help='FastEmbed model name')
+    parser.add_argument('--k', type=int, default=5, help='Number of neighbours compared')
+    parser.add_argument('--replicate', type=int, default=0, help='Noisy copies of the corpus to add')
+    parser.add_argument('--noise', type=float, default=0.02, help='Standard deviation of the copy noise')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
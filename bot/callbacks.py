@@ -1,14 +1,15 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from .utils import user_languages, MESSAGES
+from .services import get_services
+from .utils import MESSAGES
 
 async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await query.answer()
 
-    user_id = query.from_user.id
+    chat_id = update.effective_chat.id
     language = query.data.split('_')[1]
-    user_languages[user_id] = language
+    get_services(context).conversations.set_language(chat_id, language)
 
     message = MESSAGES[language]['language_selected']
     await query.edit_message_text(text=message)
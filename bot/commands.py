@@ -1,6 +1,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from .utils import user_languages, MESSAGES, message_history
+from .services import get_services
+from .utils import MESSAGES
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [
@@ -10,15 +11,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    message_history = []
+    get_services(context).conversations.reset(update.effective_chat.id)
     await update.message.reply_text(
         "Welcome to HyppoBot! / Bienvenido a HyppoBot!\n\nPlease select your language / Selecciona tu idioma:",
         reply_markup=reply_markup
     )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    language = user_languages.get(user_id, 'en')
+    language = get_services(context).conversations.get_language(update.effective_chat.id)
 
     message = MESSAGES[language]['help']
     await update.message.reply_text(message)
\ No newline at end of file
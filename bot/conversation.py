@@ -0,0 +1,273 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for the history budget."""
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    """State kept for a single chat: language preference and the recent turns."""
+
+    __slots__ = ("chat_id", "language", "turns", "token_count", "last_active")
+
+    def __init__(self, chat_id: int, language: str = "en", max_turns: int = 2):
+        self.chat_id = chat_id
+        self.language = language
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.token_count = 0
+        self.last_active = time.monotonic()
+
+    def append(self, question: str, answer: str, max_tokens: int):
+        """
+        Append a turn and drop the oldest ones until the token budget is respected.
+
+        Args:
+            question: User message
+            answer: Bot response
+            max_tokens: Token budget for the whole history
+        """
+        if len(self.turns) == self.turns.maxlen:
+            self.token_count -= self._turn_tokens(self.turns[0])
+        turn = (question, answer)
+        self.turns.append(turn)
+        self.token_count += self._turn_tokens(turn)
+
+        # Always keep the latest turn, even if it is larger than the budget on its own
+        while self.token_count > max_tokens and len(self.turns) > 1:
+            self.token_count -= self._turn_tokens(self.turns.popleft())
+
+    def clear(self):
+        """Forget the conversation turns but keep the language."""
+        self.turns.clear()
+        self.token_count = 0
+
+    @staticmethod
+    def _turn_tokens(turn: Turn) -> int:
+        return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+class ConversationBackend(ABC):
+    """Persistence interface for conversations evicted from memory or lost on restart."""
+
+    @abstractmethod
+    def load(self, chat_id: int) -> Optional[Tuple[str, List[Turn]]]:
+        """Return (language, turns) for a chat, or None if nothing is stored."""
+
+    @abstractmethod
+    def save(self, conversation: Conversation):
+        """Persist the given conversation."""
+
+    @abstractmethod
+    def delete(self, chat_id: int):
+        """Remove the stored state of a chat."""
+
+    def close(self):
+        """Release backend resources."""
+
+
+class SQLiteConversationBackend(ConversationBackend):
+    def __init__(self, path: str = "conversations.db"):
+        """
+        Store conversations in a local SQLite database.
+
+        Writes never run on the caller's thread: save() and delete() record the
+        latest state of the chat and a single writer thread applies everything
+        pending in one transaction, so a commit (and its fsync) is shared by all
+        the turns completed meanwhile instead of stalling the event loop per turn.
+
+        Args:
+            path: Database file path (":memory:" for tests)
+        """
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "chat_id INTEGER PRIMARY KEY, language TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+        # chat_id -> (language, turns JSON, updated_at) to write, or None to delete
+        self._pending: Dict[int, Optional[Tuple[str, str, float]]] = {}
+        self._lock = threading.Lock()
+        # Serializes use of the connection between the writer and load()
+        self._db_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-writer")
+
+    def load(self, chat_id: int) -> Optional[Tuple[str, List[Turn]]]:
+        with self._lock:
+            if chat_id in self._pending:
+                pending = self._pending[chat_id]
+                return None if pending is None else (pending[0], [tuple(turn) for turn in json.loads(pending[1])])
+        with self._db_lock:
+            row = self.connection.execute(
+                "SELECT language, turns FROM conversations WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], [tuple(turn) for turn in json.loads(row[1])]
+
+    def save(self, conversation: Conversation):
+        self._schedule(conversation.chat_id,
+                       (conversation.language, json.dumps(list(conversation.turns)), time.time()))
+
+    def delete(self, chat_id: int):
+        self._schedule(chat_id, None)
+
+    def flush(self):
+        """Write everything pending now, on the calling thread."""
+        # Held from the swap to the commit: a load() missing a chat in the pending writes
+        # waits here and then reads the committed row, never the stale one
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            saved = [(chat_id, *state) for chat_id, state in pending.items() if state is not None]
+            deleted = [(chat_id,) for chat_id, state in pending.items() if state is None]
+            try:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO conversations (chat_id, language, turns, updated_at) VALUES (?, ?, ?, ?)",
+                    saved
+                )
+                self.connection.executemany("DELETE FROM conversations WHERE chat_id = ?", deleted)
+                self.connection.commit()
+            except Exception as e:
+                logger.error(f"Failed to persist {len(pending)} conversations: {e}")
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self.flush()
+        self.connection.close()
+
+    def _schedule(self, chat_id: int, state: Optional[Tuple[str, str, float]]):
+        with self._lock:
+            # A write is already queued when something is pending, it will pick this one up too
+            idle = not self._pending
+            self._pending[chat_id] = state
+        if idle:
+            self._writer.submit(self.flush)
+
+
+class ConversationStore:
+    def __init__(self,
+                 max_turns: int = 2,
+                 max_tokens: int = 1000,
+                 max_conversations: int = 5000,
+                 idle_ttl: float = 6 * 60 * 60,
+                 backend: Optional[ConversationBackend] = None):
+        """
+        Per-chat conversation state with bounded memory.
+
+        Conversations live in an LRU ordered by last activity: the least recently
+        used entry is dropped once max_conversations is reached, and idle entries
+        older than idle_ttl are expired from the head of the LRU on every access.
+
+        Args:
+            max_turns: Number of (question, answer) turns kept per chat
+            max_tokens: Token budget for the history of a single chat
+            max_conversations: Maximum number of chats kept in memory
+            idle_ttl: Seconds of inactivity after which a chat is evicted from memory
+            backend: Optional persistence backend
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self._conversations: "OrderedDict[int, Conversation]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def get(self, chat_id: int) -> Conversation:
+        """
+        Return the conversation of a chat, loading or creating it if needed.
+
+        Args:
+            chat_id: Telegram chat id
+
+        Returns:
+            The Conversation for the chat
+        """
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        conversation = self._conversations.get(chat_id)
+        if conversation is None:
+            conversation = self._load(chat_id)
+            self._conversations[chat_id] = conversation
+            if len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(chat_id)
+
+        conversation.last_active = now
+        return conversation
+
+    def history(self, chat_id: int) -> List[Turn]:
+        """Return a snapshot of the turns of a chat, oldest first."""
+        return list(self.get(chat_id).turns)
+
+    def append_turn(self, chat_id: int, question: str, answer: str):
+        """Record a completed (question, answer) turn for a chat."""
+        conversation = self.get(chat_id)
+        conversation.append(question, answer, self.max_tokens)
+        self._save(conversation)
+
+    def reset(self, chat_id: int):
+        """Clear the history of a chat, keeping its language."""
+        conversation = self.get(chat_id)
+        conversation.clear()
+        self._save(conversation)
+
+    def get_language(self, chat_id: int) -> str:
+        return self.get(chat_id).language
+
+    def set_language(self, chat_id: int, language: str):
+        conversation = self.get(chat_id)
+        conversation.language = language
+        self._save(conversation)
+
+    def close(self):
+        if self.backend:
+            self.backend.close()
+
+    def _evict_expired(self, now: float):
+        # The OrderedDict is sorted by last activity, so expired chats are at the head
+        while self._conversations:
+            chat_id, conversation = next(iter(self._conversations.items()))
+            if now - conversation.last_active < self.idle_ttl:
+                break
+            del self._conversations[chat_id]
+
+    def _load(self, chat_id: int) -> Conversation:
+        conversation = Conversation(chat_id, max_turns=self.max_turns)
+        if self.backend:
+            try:
+                stored = self.backend.load(chat_id)
+            except Exception as e:
+                logger.error(f"Failed to load conversation {chat_id}: {e}")
+                stored = None
+            if stored:
+                conversation.language = stored[0]
+                for question, answer in stored[1]:
+                    conversation.append(question, answer, self.max_tokens)
+        return conversation
+
+    def _save(self, conversation: Conversation):
+        if self.backend:
+            try:
+                self.backend.save(conversation)
+            except Exception as e:
+                logger.error(f"Failed to persist conversation {conversation.chat_id}: {e}")
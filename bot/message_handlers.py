@@ -1,19 +1,31 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from .utils import message_history
+from .services import get_services
+from .streaming import StreamingReply
+from telemetry.metrics import MESSAGES, stage
+from telemetry.tracing import TRACER
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
-    user_id = update.effective_user.id
-    response = handle_response(text)
+    chat_id = update.effective_chat.id
+    services = get_services(context)
+    # Sampled updates record a span per stage, keyed by update_id
+    token = TRACER.start(update.update_id)
+    try:
+        with stage('handler'):
+            await handle_response(services, update, chat_id, text)
+        MESSAGES.inc(outcome='answered')
+    except Exception:
+        MESSAGES.inc(outcome='failed')
+        raise
+    finally:
+        TRACER.finish(token)
 
-    await update.message.reply_text(response)
-
-def handle_response(text: str) -> str:
-    from llm.Groq_client import GroqClient
-    llm_model = GroqClient()
-    response = llm_model.generate(text,message_history) 
-    if len(message_history) > 1:
-        message_history.pop(0)
-    message_history.append((text, response))
-    return response
\ No newline at end of file
+async def handle_response(services, update: Update, chat_id: int, text: str) -> str:
+    conversations = services.conversations
+    reply = StreamingReply(update.message)
+    response = await reply.send(
+        services.llm.astream(text, conversations.history(chat_id), conversations.get_language(chat_id), chat_id)
+    )
+    conversations.append_turn(chat_id, text, response)
+    return response
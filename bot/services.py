@@ -0,0 +1,117 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+from telegram.ext import ContextTypes
+from rag.quantization import VectorCompression
+from rag.context_builder import DEFAULT_RERANKER_MODEL
+from rag.models import DEFAULT_EMBEDDING_MODEL
+from telemetry.startup import STARTUP
+from .conversation import ConversationStore
+
+if TYPE_CHECKING:
+    from llm.Groq_client import GroqClient
+    from llm.gateway import GatewayConfig
+    from rag.pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+
+SERVICES_KEY = "services"
+
+
+class BotServices:
+    """Application-scoped container for the heavy objects shared by all handlers."""
+
+    def __init__(self,
+                 collection_name: str = "hyppo-data",
+                 embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 data_directory: str = "data",
+                 vector_backend: str = "qdrant",
+                 rag: Optional['RAGPipeline'] = None,
+                 llm: Optional['GroqClient'] = None,
+                 conversations: Optional[ConversationStore] = None,
+                 watch_interval: float = 0,
+                 compression: Optional[VectorCompression] = None,
+                 on_model_mismatch: str = "refuse",
+                 llm_config: Optional['GatewayConfig'] = None,
+                 embedding_threads: Optional[int] = None,
+                 read_only: bool = False,
+                 reranker_model: Optional[str] = DEFAULT_RERANKER_MODEL):
+        """
+        Build the shared RAG pipeline and Groq client once per process.
+
+        Args:
+            collection_name: Qdrant collection holding the knowledge base
+            embedding_model: FastEmbed model name used for ingestion and queries
+            data_directory: Directory with the knowledge base files
+            vector_backend: "qdrant" (remote service) or "local" (in-process index)
+            rag: Pre-built RAGPipeline to reuse instead of creating one
+            llm: Pre-built GroqClient to reuse instead of creating one
+            conversations: Per-chat conversation store, in-memory only by default
+            watch_interval: Seconds between scans of data_directory for changed files, 0 disables watching
+            compression: Vector quantization, on-disk storage and dimension reduction settings
+            on_model_mismatch: "refuse" to start on a collection built with another model, or "migrate" it
+            llm_config: Concurrency, rate limits, retries and fallback models of the LLM gateway
+            embedding_threads: ONNX intra-op threads of the embedding model, None uses every core
+            read_only: Serve from a knowledge base synced by another process (a worker of the supervisor)
+            reranker_model: FastEmbed cross-encoder of the context builder, None keeps the retrieval order
+        """
+        # Imported here so the process can bring up its Telegram connection while
+        # fastembed, qdrant_client and groq are still loading on the startup thread
+        from llm.Groq_client import GroqClient
+        from llm.answer_cache import SemanticAnswerCache
+        from rag.context_builder import ContextBuilder
+        from rag.pipeline import RAGPipeline
+
+        self.data_directory = data_directory
+        self.watch_interval = watch_interval
+        with STARTUP.phase("rag_pipeline"):
+            self.rag = rag or RAGPipeline(collection_name, embedding_model, recreate_collection=False,
+                                          vector_backend=vector_backend, use_hybrid_search=True,
+                                          compression=compression, on_model_mismatch=on_model_mismatch,
+                                          embedding_threads=embedding_threads, read_only=read_only)
+        with STARTUP.phase("llm_client"):
+            self.llm = llm or GroqClient(rag=self.rag, answer_cache=SemanticAnswerCache(),
+                                         context_builder=ContextBuilder(reranker_model),
+                                         gateway_config=llm_config)
+        self.conversations = conversations or ConversationStore()
+
+    def warm_up(self):
+        """
+        Sync the knowledge base and get the ONNX sessions hot.
+
+        The first query runs on another thread while the index syncs, so the
+        services are ready as soon as the index is. The reranker keeps loading
+        in the background past that point: a question arriving first waits for
+        it, but a slow or failing model download never holds the bot back.
+        """
+        threading.Thread(target=self._timed, args=("reranker", lambda: self.llm.context_builder.reranker),
+                         name="reranker-warm-up", daemon=True).start()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up") as pool:
+            warm_query = pool.submit(self._timed, "warm_query", self.rag.embedding_manager.embed_query, "warm up")
+            if not self.rag.read_only:
+                self._timed("index_sync", self.rag.sync_directory, self.data_directory)
+            self._timed("lexical_index", self.rag.build_lexical_index)
+            warm_query.result()
+        if self.watch_interval > 0 and self.rag.read_only:
+            logger.warning("Not watching %s, the knowledge base is synced by another process", self.data_directory)
+        elif self.watch_interval > 0:
+            self.rag.watch_directory(self.data_directory, self.watch_interval)
+        logger.info("Bot services warmed up")
+
+    @staticmethod
+    def _timed(phase: str, function, *args):
+        with STARTUP.phase(phase):
+            return function(*args)
+
+    async def shutdown(self):
+        """Close the network clients held by the services."""
+        await self.llm.aclose()
+        await self.rag.aclose()
+        self.conversations.close()
+        logger.info("Bot services shut down")
+
+
+def get_services(context: ContextTypes.DEFAULT_TYPE) -> BotServices:
+    """Return the BotServices registered in the application's bot_data."""
+    return context.bot_data[SERVICES_KEY]
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Optional
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from telemetry.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class StreamingReply:
+    def __init__(self, message: Message, min_interval: float = 1.0, min_chars: int = 40):
+        """
+        Deliver a streamed answer by sending one reply and progressively editing it.
+
+        Tokens are coalesced: the reply is edited at most once every min_interval
+        seconds and only when at least min_chars new characters arrived, which keeps
+        the bot well under Telegram's edit rate limits. A final edit always carries
+        the complete text.
+
+        Args:
+            message: Incoming message to reply to
+            min_interval: Minimum seconds between two edits
+            min_chars: Minimum number of new characters that justify an edit
+        """
+        self.message = message
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self.reply: Optional[Message] = None
+        self._sent_text = ""
+        self._next_edit_at = 0.0
+
+    async def send(self, chunks: AsyncIterator[str]) -> str:
+        """
+        Consume a stream of text chunks and deliver them to the chat.
+
+        Args:
+            chunks: Async iterator of response pieces
+
+        Returns:
+            The complete response text
+        """
+        text = ""
+        async for chunk in chunks:
+            text += chunk
+            if self.reply is None:
+                await self._send_first(text)
+            elif self._should_edit(text):
+                await self._edit(text)
+
+        if self.reply is None:
+            await self._send_first(text or "...")
+        elif text != self._sent_text:
+            await self._edit(text, final=True)
+        return text
+
+    def _should_edit(self, text: str) -> bool:
+        return (time.monotonic() >= self._next_edit_at
+                and len(text) - len(self._sent_text) >= self.min_chars)
+
+    async def _send_first(self, text: str):
+        with stage('telegram_send'):
+            self.reply = await self.message.reply_text(text[:MAX_MESSAGE_LENGTH])
+        self._sent_text = text
+        self._next_edit_at = time.monotonic() + self.min_interval
+
+    async def _edit(self, text: str, final: bool = False):
+        while True:
+            try:
+                with stage('telegram_edit'):
+                    await self.reply.edit_text(text[:MAX_MESSAGE_LENGTH])
+                break
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                if not final:
+                    # Skip this edit, the coalesced text goes out with a later one
+                    self._next_edit_at = time.monotonic() + retry_after
+                    return
+                await asyncio.sleep(retry_after)
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    logger.error(f"Failed to edit streamed reply: {e}")
+                break
+        self._sent_text = text
+        self._next_edit_at = time.monotonic() + self.min_interval
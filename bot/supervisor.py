@@ -0,0 +1,241 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import urllib.request
+from typing import Callable, Hashable, List, Optional
+import httpx
+from telegram import Update
+from telegram.ext import ContextTypes
+from telemetry.metrics import QUEUE_DEPTH
+from .webhook import HEALTH_PATH, SECRET_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, shards: int, replicas: int = 100):
+        """
+        Consistent hashing of keys (chat ids) onto shards.
+
+        Every shard owns `replicas` points of the ring and a key goes to the
+        first point after its hash, so changing the number of shards only moves
+        about 1/shards of the keys.
+
+        Args:
+            shards: Number of shards, keys map to 0..shards-1
+            replicas: Virtual nodes per shard, more give a more even split
+        """
+        points = sorted((_hash(f"shard-{shard}-{replica}"), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard(self, key: Hashable) -> int:
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._shards[index]
+
+
+def shard_key(update: Update) -> Hashable:
+    """Chat of the update, so a conversation always lands on the same worker."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+class WorkerPool:
+    def __init__(self,
+                 target: Callable[[int, int, str, int], None],
+                 processes: int,
+                 secret_token: str,
+                 base_port: int = 8100,
+                 host: str = "127.0.0.1",
+                 path: str = "/telegram",
+                 restart_delay: float = 1.0):
+        """
+        Worker processes, each serving its shard of the chats on a local webhook.
+
+        Workers are started with the spawn method (onnxruntime and the client
+        thread pools don't survive a fork) and restarted on the same port when
+        they die, so their chats come back to them.
+
+        Args:
+            target: Module-level function run in each worker as target(shard, port, secret_token, processes)
+            processes: Number of workers
+            secret_token: Secret token the workers expect from the supervisor
+            base_port: Worker `shard` listens on base_port + shard
+            host: Interface the workers bind
+            path: URL path of the worker webhooks
+            restart_delay: Seconds between a worker dying and its restart
+        """
+        self.target = target
+        self.processes = processes
+        self.secret_token = secret_token
+        self.base_port = base_port
+        self.host = host
+        self.path = path
+        self.restart_delay = restart_delay
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[Optional[multiprocessing.Process]] = [None] * processes
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://{self.host}:{self.base_port + shard}{self.path}" for shard in range(self.processes)]
+
+    def start(self) -> 'WorkerPool':
+        for shard in range(self.processes):
+            self._spawn(shard)
+        self._monitor = threading.Thread(target=self._watch, name="worker-monitor", daemon=True)
+        self._monitor.start()
+        return self
+
+    def wait_ready(self, timeout: float = 300.0) -> bool:
+        """Block until every worker answers its health check, or `timeout` seconds passed."""
+        deadline = time.monotonic() + timeout
+        pending = set(range(self.processes))
+        while pending and time.monotonic() < deadline:
+            for shard in list(pending):
+                try:
+                    url = f"http://{self.host}:{self.base_port + shard}{HEALTH_PATH}"
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            pending.discard(shard)
+                except Exception:
+                    pass
+            if pending:
+                time.sleep(0.2)
+        if pending:
+            logger.warning(f"Workers {sorted(pending)} not ready after {timeout:.0f}s")
+        return not pending
+
+    def stop(self, timeout: float = 60.0):
+        """Ask the workers to drain and exit (SIGTERM), killing those still running after `timeout`."""
+        self._stopping.set()
+        for worker in self._workers:
+            if worker is not None and worker.is_alive():
+                worker.terminate()
+        deadline = time.monotonic() + timeout
+        for shard, worker in enumerate(self._workers):
+            if worker is None:
+                continue
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f"Worker {shard} did not stop in time, killing it")
+                worker.kill()
+                worker.join()
+        logger.info("Workers stopped")
+
+    def _spawn(self, shard: int):
+        worker = self._context.Process(target=self.target, name=f"hyppo-worker-{shard}",
+                                       args=(shard, self.base_port + shard, self.secret_token, self.processes))
+        worker.start()
+        self._workers[shard] = worker
+        logger.info(f"Started worker {shard} (pid {worker.pid}) on port {self.base_port + shard}")
+
+    def _watch(self):
+        while not self._stopping.wait(1.0):
+            for shard, worker in enumerate(self._workers):
+                if worker is not None and not worker.is_alive() and not self._stopping.is_set():
+                    logger.error(f"Worker {shard} exited with code {worker.exitcode}, restarting it")
+                    time.sleep(self.restart_delay)
+                    if not self._stopping.is_set():
+                        self._spawn(shard)
+
+
+class ShardRouter:
+    def __init__(self,
+                 urls: List[str],
+                 secret_token: str,
+                 max_queued: int = 1000,
+                 retry_timeout: float = 60.0):
+        """
+        Forward updates to the worker owning their chat.
+
+        Each shard has its own queue and forwarding task, so a chat's updates
+        reach its worker in order and a restarting worker only holds back its
+        own shard. Forwarding is retried (worker starting, restarting or full)
+        for up to `retry_timeout` seconds before the update is dropped.
+
+        Args:
+            urls: Webhook URL of each worker, indexed by shard
+            secret_token: Secret token the workers expect
+            max_queued: Updates waiting per shard before new ones are dropped
+            retry_timeout: Seconds an update is retried against its worker
+        """
+        self.urls = urls
+        self.secret_token = secret_token
+        self.retry_timeout = retry_timeout
+        self.ring = HashRing(len(urls))
+        self.queues = [asyncio.Queue(maxsize=max_queued) for _ in urls]
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks: List[asyncio.Task] = []
+        for shard, queue in enumerate(self.queues):
+            QUEUE_DEPTH.set_function(queue.qsize, queue=f"shard-{shard}")
+
+    async def start(self) -> 'ShardRouter':
+        self._client = httpx.AsyncClient(timeout=10)
+        self._tasks = [asyncio.create_task(self._forward(shard), name=f"shard-{shard}")
+                       for shard in range(len(self.urls))]
+        return self
+
+    async def stop(self, drain_timeout: float = 30.0):
+        """Forward the queued updates (up to drain_timeout), then stop."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {sum(queue.qsize() for queue in self.queues)} updates not forwarded in time")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handler of the supervisor's application: queue the update for its shard."""
+        shard = self.ring.shard(shard_key(update))
+        try:
+            self.queues[shard].put_nowait(update.to_dict())
+        except asyncio.QueueFull:
+            logger.error(f"Shard {shard} queue full, dropping update {update.update_id}")
+
+    async def _forward(self, shard: int):
+        queue = self.queues[shard]
+        while True:
+            update = await queue.get()
+            try:
+                await self._post(shard, update)
+            finally:
+                queue.task_done()
+
+    async def _post(self, shard: int, update: dict):
+        body = json.dumps(update)
+        headers = {'Content-Type': 'application/json', SECRET_HEADER: self.secret_token}
+        deadline = time.monotonic() + self.retry_timeout
+        delay = 0.1
+        while True:
+            try:
+                response = await self._client.post(self.urls[shard], content=body, headers=headers)
+                if response.status_code == 200:
+                    return
+                error = f"status {response.status_code}"
+                if response.status_code != 503:
+                    break
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            if time.monotonic() + delay > deadline:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        logger.error(f"Dropping update {update.get('update_id')} for worker {shard}: {error}")
@@ -1,5 +1,3 @@
-user_languages = {}
-
 MESSAGES = {
     'en': {
         'welcome': 'Welcome to HyppoBot!\n\nPlease select your preferred language:',
@@ -12,5 +10,3 @@ MESSAGES = {
         'help': 'Escribe /start para volver al menú',
     }
 }
-
-message_history = []
\ No newline at end of file
@@ -0,0 +1,206 @@
+import asyncio
+import hmac
+import json
+import logging
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Dict, List, Optional, Set, Tuple
+from telegram import Update
+from telegram.ext import Application
+from telemetry.metrics import IN_FLIGHT, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+HEALTH_PATH = "/healthz"
+
+
+class WebhookServer:
+    def __init__(self,
+                 application: Application,
+                 secret_token: str,
+                 host: str = "0.0.0.0",
+                 port: int = 8080,
+                 path: str = "/telegram",
+                 workers: int = 64,
+                 max_queued: int = 1000,
+                 drain_timeout: float = 30.0,
+                 idle_timeout: float = 75.0,
+                 max_body: int = 1 << 20):
+        """
+        Receive the updates Telegram pushes to the bot's webhook.
+
+        A POST to `path` is checked against the secret token, parsed and put on
+        an internal queue, and acknowledged with 200 right away, so Telegram never
+        waits for an answer to be generated. `workers` tasks take updates off the
+        queue and run the application's handlers, one update of a chat at a time
+        and in arrival order. A full queue answers 503, which Telegram retries
+        later. Connections are kept alive for load balancers.
+        GET /healthz answers 200 once the bot is ready and 503 while starting or
+        draining.
+
+        Args:
+            application: Initialized application whose handlers process the updates
+            secret_token: Value Telegram sends in X-Telegram-Bot-Api-Secret-Token
+            host: Interface to bind
+            port: Port to listen on, 0 picks a free one
+            path: URL path of the webhook
+            workers: Updates processed concurrently
+            max_queued: Updates accepted but not yet processed before answering 503
+            drain_timeout: Seconds stop() waits for queued updates to be processed
+            idle_timeout: Seconds an idle keep-alive connection stays open
+            max_body: Largest accepted request body, in bytes
+        """
+        self.application = application
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.idle_timeout = idle_timeout
+        self.max_body = max_body
+        # Set once the services are warm; until then updates are refused and Telegram retries
+        self.ready = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._in_flight = 0
+        self._draining = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._workers: List[asyncio.Task] = []
+        self._idle: Set[asyncio.StreamWriter] = set()
+        # chat_id -> [lock, updates holding or waiting for it]
+        self._chats: Dict[int, list] = {}
+        QUEUE_DEPTH.set_function(self.queue.qsize, queue="webhook")
+        IN_FLIGHT.set_function(lambda: self._in_flight, queue="webhook")
+
+    async def start(self) -> 'WebhookServer':
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._workers = [asyncio.create_task(self._work(), name=f"webhook-worker-{i}") for i in range(self.workers)]
+        logger.info("Webhook listening on port %d at %s with %d workers", self.port, self.path, self.workers)
+        return self
+
+    async def stop(self):
+        """Stop accepting updates, process the queued ones (up to drain_timeout) and stop the workers."""
+        self._draining = True
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would hold wait_closed() forever
+            for writer in list(self._idle):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+            logger.info("Webhook queue drained")
+        except asyncio.TimeoutError:
+            logger.warning("Webhook stopped with %d updates still queued", self.queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def process_update(self, update: Update):
+        """Run the handlers on one update (the unit of work of a worker)."""
+        await self.application.process_update(update)
+
+    async def _work(self):
+        while True:
+            update = await self.queue.get()
+            self._in_flight += 1
+            try:
+                async with self._in_order(update):
+                    await self.process_update(update)
+            except Exception as e:
+                logger.error(f"Failed to process update {update.update_id}: {e}")
+            finally:
+                self._in_flight -= 1
+                self.queue.task_done()
+
+    @asynccontextmanager
+    async def _in_order(self, update: Update):
+        """Hold back an update while an earlier one of the same chat is being processed."""
+        chat = update.effective_chat
+        if chat is None:
+            yield
+            return
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while not self._draining:
+                self._idle.add(writer)
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                finally:
+                    self._idle.discard(writer)
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                status, payload = self._respond(method, path, headers, body)
+                keep_alive = keep_alive and not self._draining
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n"
+                             b"Connection: %s\r\n\r\n%s" % (status, HTTPStatus(status).phrase.encode(), len(payload),
+                                                            b"keep-alive" if keep_alive else b"close", payload))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes, bool]]:
+        """Method, path, lowercase headers, body and keep-alive of the next request; None once the client is gone."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, target, version = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            raise ValueError(f"request body of {length} bytes")
+        body = await reader.readexactly(length) if length else b""
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return method, target.split("?")[0], headers, body, keep_alive
+
+    def _respond(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        if path == HEALTH_PATH and method == "GET":
+            return (200, b"ok\n") if self.ready and not self._draining else (503, b"not ready\n")
+        if path != self.path:
+            return 404, b"not found\n"
+        if method != "POST":
+            return 405, b"method not allowed\n"
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret_token.encode()):
+            logger.warning("Rejected a webhook request with a wrong secret token")
+            return 403, b"forbidden\n"
+        if not self.ready or self._draining:
+            return 503, b"not ready\n"
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Rejected a malformed update: {e}")
+            return 400, b"bad request\n"
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning("Webhook queue full, Telegram will retry update %s", update.update_id)
+            return 503, b"busy\n"
+        return 200, b""
@@ -1,18 +1,49 @@
 import os
-from groq import Groq
-from typing import Optional
+from groq import Groq, AsyncGroq
+import logging
+from typing import AsyncIterator, Hashable, Optional
 from rag.pipeline import RAGPipeline
+from rag.models import DEFAULT_EMBEDDING_MODEL
+from rag.context_builder import ContextBuilder, BuiltContext
+from rag.language import LANGUAGE_NAMES, resolve_language
+from .answer_cache import SemanticAnswerCache, is_standalone
+from .gateway import GatewayConfig, LLMGateway, LLMUnavailable
+from telemetry.metrics import cache_lookup, stage
+from telemetry.tracing import annotate
+
+# Shown instead of an answer when no model could be reached
+UNAVAILABLE_MESSAGES = {
+    "en": "I'm receiving a lot of questions right now, please try again in a minute.",
+    "es": "Estoy recibiendo muchas preguntas ahora mismo, por favor inténtalo de nuevo en un minuto.",
+    "it": "Sto ricevendo molte domande in questo momento, riprova tra un minuto.",
+}
+
+logger = logging.getLogger(__name__)
+
 
 class GroqClient:
-    def __init__(self, model: str = "llama-3.1-8b-instant"):
+    def __init__(self,
+                 model: str = "llama-3.1-8b-instant",
+                 rag: Optional[RAGPipeline] = None,
+                 answer_cache: Optional[SemanticAnswerCache] = None,
+                 context_builder: Optional[ContextBuilder] = None,
+                 gateway_config: Optional[GatewayConfig] = None):
         self.model = model
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        # Retries are done by the gateway, which knows about rate limits and fallbacks
+        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+        self.async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+        self.gateway = LLMGateway(self.client, self.async_client, model, gateway_config)
         self.language = "en"  # Default language
-        self.rag =  RAGPipeline("hyppo-data", "sentence-transformers/all-MiniLM-L6-v2", recreate_collection=False)
+        # Reuse the process-wide pipeline when given, building one is expensive
+        self.rag = rag or RAGPipeline("hyppo-data", DEFAULT_EMBEDDING_MODEL, recreate_collection=False)
+        self.answer_cache = answer_cache
+        self.context_builder = context_builder or ContextBuilder()
+        if answer_cache is not None:
+            self.rag.add_removal_listener(answer_cache.invalidate_chunks)
 
     def set_language(self, language: str):
-        if language == "es":
-            self.language = "es"
+        if language in LANGUAGE_NAMES:
+            self.language = language
         else:
             self.language = "en"
 
@@ -35,11 +66,47 @@ class GroqClient:
 
                     Answer the student's question directly:"""
                         
-    def _get_info(self, user_prompt):
+    def _get_info(self, user_prompt, query_embedding=None, language=None) -> BuiltContext:
+        """
+        Activates rag pipeline to get info, over-retrieving and packing it into the context budget
+        """
+        with stage('retrieval'):
+            results = self.rag.search(user_prompt, self.context_builder.candidates, query_embedding=query_embedding,
+                                      language=language)
+        with stage('prompt_build'):
+            return self.context_builder.build(user_prompt, results, language)
+
+    async def _aget_info(self, user_prompt, query_embedding=None, language=None) -> BuiltContext:
+        """
+        Activates rag pipeline to get info without blocking the event loop
+        """
+        with stage('retrieval'):
+            results = await self.rag.asearch(user_prompt, self.context_builder.candidates,
+                                             query_embedding=query_embedding, language=language)
+        with stage('prompt_build'):
+            return await self.context_builder.abuild(user_prompt, results, language)
+
+    def _lookup_answer(self, prompt: str, query_embedding, language: str, message_history) -> Optional[str]:
+        """
+        Cached answer to a similar question, if any.
+        Lookup and storage follow the same rule: only standalone questions (see is_standalone) use the cache.
+        """
+        if self.answer_cache is None or not is_standalone(prompt, message_history):
+            return None
+        answer = self.answer_cache.lookup(query_embedding, language)
+        cache_lookup('answer', answer is not None)
+        annotate(answer_cache_hit=answer is not None, language=language)
+        return answer
+
+    def _remember_answer(self, prompt: str, query_embedding, language: str, answer: str, information: BuiltContext,
+                         message_history):
         """
-        Activates rag pipeline to get info
+        Store a generated answer in the semantic cache.
+        Answers to follow-up questions depend on the chat history, so only standalone ones are cached.
         """
-        return self.rag.search(user_prompt)
+        if self.answer_cache is None or not is_standalone(prompt, message_history):
+            return
+        self.answer_cache.store(query_embedding, language, answer, information.chunk_ids)
     
     def _turn_message_into_chat_format(self, messages: list[(str,str)]) -> list[dict]:
         chat = []
@@ -48,40 +115,112 @@ class GroqClient:
             chat.append({"role": "system", "content": message[1]})
         return chat
 
-    def generate(self, prompt: str, message_history: Optional[list[(str,str)]]) -> str:
+    def _build_chat(self, prompt: str, information: BuiltContext, message_history: Optional[list[(str,str)]], language: Optional[str]) -> list[dict]:
+        sys_prompt = self.system_prompt(information.text)
+        language = language or self.language
+        if language != "en":
+            sys_prompt += f" You must answer in {LANGUAGE_NAMES.get(language, 'English')}."
+
+        chat = [{"role": "system", "content": sys_prompt}]
+
+        if message_history:
+            chat.extend(self._turn_message_into_chat_format(message_history))
+
+        chat.append({"role": "user", "content": prompt})
+        return chat
+
+    def generate(self, prompt: str, message_history: Optional[list[(str,str)]], language: Optional[str] = None) -> str:
         """
         Generate a response from the Groq model
         Args:
             prompt: The user's prompt
             message_history: the previous messages in the chat (if there are)
+            language: preferred language of the user, used when the message's language is not detected
         Returns:
             Generated response from the model
         """
+        # A confidently detected language wins over the preference, so retrieval and answer match what was asked
+        language = resolve_language(prompt, language or self.language)
+        query_embedding = self.rag.embedding_manager.embed_query(prompt)
+        cached = self._lookup_answer(prompt, query_embedding, language, message_history)
+        if cached is not None:
+            return cached
 
-        sys_prompt = self.system_prompt(self._get_info(prompt))
-        if self.language == "es":
-            sys_prompt += " You must answer in Spanish."
+        information = self._get_info(prompt, query_embedding, language)
+        chat = self._build_chat(prompt, information, message_history, language)
+        logger.debug("Prompt of %d messages with %d context chunks", len(chat), len(information.chunk_ids),
+                     extra={'context_tokens': information.tokens})
+        try:
+            answer = self.gateway.complete_sync(chat, temperature=0.5, max_tokens=400)
+        except LLMUnavailable as e:
+            logger.error(f"LLM request failed: {e}")
+            return UNAVAILABLE_MESSAGES.get(language, UNAVAILABLE_MESSAGES["en"])
 
-        chat = [{"role": "system", "content": sys_prompt}]
+        self._remember_answer(prompt, query_embedding, language, answer, information, message_history)
+        return answer
 
-        if message_history:
-            chat.extend(self._turn_message_into_chat_format(message_history))
+    async def agenerate(self, prompt: str, message_history: Optional[list[(str,str)]], language: Optional[str] = None,
+                        user: Optional[Hashable] = None) -> str:
+        """
+        Async version of generate, safe to await from the bot handlers
+        Args:
+            prompt: The user's prompt
+            message_history: the previous messages in the chat (if there are)
+            language: preferred language of the user, used when the message's language is not detected
+            user: key of the user (e.g. chat id), LLM capacity is shared fairly between users
+        Returns:
+            Generated response from the model
+        """
+        language = resolve_language(prompt, language or self.language)
+        query_embedding = await self.rag.embedding_manager.aembed_query(prompt)
+        cached = self._lookup_answer(prompt, query_embedding, language, message_history)
+        if cached is not None:
+            return cached
 
-        chat.append({"role": "user", "content": prompt})
-        print(chat)
+        information = await self._aget_info(prompt, query_embedding, language)
+        chat = self._build_chat(prompt, information, message_history, language)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=chat,
-                temperature=0.5,
-                max_tokens=400
-            )
-            return response.choices[0].message.content
+            answer = await self.gateway.complete(chat, user, temperature=0.5, max_tokens=400)
+        except LLMUnavailable as e:
+            logger.error(f"LLM request failed: {e}")
+            return UNAVAILABLE_MESSAGES.get(language, UNAVAILABLE_MESSAGES["en"])
 
-        except Exception as e:
-            return f"Error connecting to Groq: {e}"
+        self._remember_answer(prompt, query_embedding, language, answer, information, message_history)
+        return answer
 
-    
+    async def astream(self, prompt: str, message_history: Optional[list[(str,str)]], language: Optional[str] = None,
+                      user: Optional[Hashable] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the Groq model as it is generated
+        Args:
+            prompt: The user's prompt
+            message_history: the previous messages in the chat (if there are)
+            language: preferred language of the user, used when the message's language is not detected
+            user: key of the user (e.g. chat id), LLM capacity is shared fairly between users
+        Yields:
+            Pieces of the response text, in order
+        """
+        language = resolve_language(prompt, language or self.language)
+        query_embedding = await self.rag.embedding_manager.aembed_query(prompt)
+        cached = self._lookup_answer(prompt, query_embedding, language, message_history)
+        if cached is not None:
+            yield cached
+            return
+
+        information = await self._aget_info(prompt, query_embedding, language)
+        chat = self._build_chat(prompt, information, message_history, language)
+        parts = []
+        try:
+            async for delta in self.gateway.stream(chat, user, temperature=0.5, max_tokens=400):
+                parts.append(delta)
+                yield delta
+        except LLMUnavailable as e:
+            logger.error(f"LLM request failed: {e}")
+            # Keep what was already delivered, a partial answer is never cached
+            yield ("\n\n" if parts else "") + UNAVAILABLE_MESSAGES.get(language, UNAVAILABLE_MESSAGES["en"])
+            return
+
+        self._remember_answer(prompt, query_embedding, language, "".join(parts), information, message_history)
 
     def is_available(self) -> bool:
         """
@@ -90,13 +229,16 @@ class GroqClient:
         Returns:
             True if Groq is available, False otherwise
         """
-        try:
-            # Test with a minimal request to check API availability
-            test_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
-            return True
-        except:
-            return False
\ No newline at end of file
+        # A model lookup spends no tokens and no completion request budget
+        return self.gateway.is_available()
+
+    def close(self):
+        """Close the underlying HTTP client."""
+        self.client.close()
+        self.context_builder.close()
+
+    async def aclose(self):
+        """Close both the sync and the async HTTP clients."""
+        self.client.close()
+        await self.async_client.close()
+        self.context_builder.close()
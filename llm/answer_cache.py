@@ -0,0 +1,187 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words that make a question lean on the previous turns ("and on Sundays?", "how much is it?")
+FOLLOW_UP_WORDS = {
+    'and', 'also', 'but', 'it', 'its', 'that', 'this', 'these', 'those', 'they', 'them', 'there', 'then',
+    'y', 'también', 'pero', 'eso', 'esto', 'ese', 'esa', 'allí', 'ahí', 'entonces',
+    'e', 'anche', 'ma', 'quello', 'quella', 'questo', 'questa', 'lì', 'allora',
+}
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+
+def is_standalone(question: str, history: Optional[Sequence] = None, min_words: int = 4) -> bool:
+    """
+    Whether a question can be answered without the chat history, and so served from and stored in the cache.
+
+    The first question of a chat always is. Later ones are when they are long
+    enough to carry their own subject and have no word pointing back at the
+    previous turns.
+
+    Args:
+        question: User message
+        history: Previous (question, answer) turns of the chat
+        min_words: Words a question with history needs to count as standalone
+    """
+    if not history:
+        return True
+    words = WORD_RE.findall(question.lower())
+    return len(words) >= min_words and not any(word in FOLLOW_UP_WORDS for word in words)
+
+
+class SemanticAnswerCache:
+    def __init__(self,
+                 similarity_threshold: float = 0.92,
+                 max_entries: int = 1000,
+                 ttl: float = 24 * 60 * 60):
+        """
+        Cache of generated answers looked up by question embedding similarity.
+
+        Each entry remembers the ids of the chunks its answer was built from, so
+        entries are dropped as soon as one of those chunks is re-ingested or removed.
+
+        Args:
+            similarity_threshold: Minimum cosine similarity for a cached question to match
+            max_entries: Maximum number of answers kept, least recently used are evicted
+            ttl: Seconds after which an answer is considered stale
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors: Optional[np.ndarray] = None
+        self._active = np.zeros(max_entries, dtype=bool)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._languages: List[Optional[str]] = [None] * max_entries
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._chunks: List[Set[str]] = [set() for _ in range(max_entries)]
+        self._slots_by_chunk: Dict[str, Set[int]] = {}
+        # Slot usage order, least recently used first
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, query_vector, language: str) -> Optional[str]:
+        """
+        Find a cached answer for a question.
+
+        Args:
+            query_vector: Embedding of the question
+            language: Language the answer must be in
+
+        Returns:
+            The cached answer, or None if no similar enough question was answered
+        """
+        with self._lock:
+            if self._vectors is None or not self._lru:
+                self.misses += 1
+                return None
+
+            query = self._normalize(query_vector)
+            for slot in np.flatnonzero(self._active & (self._expires <= time.monotonic())):
+                self._release(int(slot))
+            candidates = np.flatnonzero(self._active)
+            candidates = [slot for slot in candidates if self._languages[slot] == language]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            scores = self._vectors[candidates] @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            slot = int(candidates[best])
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._answers[slot]
+
+    def store(self, query_vector, language: str, answer: str, chunk_ids: Iterable[str]):
+        """
+        Remember an answer.
+
+        Args:
+            query_vector: Embedding of the question
+            language: Language of the answer
+            answer: Generated answer
+            chunk_ids: Ids of the chunks the answer was built from
+        """
+        query = self._normalize(query_vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+            slot = self._free_slot()
+            self._vectors[slot] = query
+            self._active[slot] = True
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._languages[slot] = language
+            self._answers[slot] = answer
+            self._chunks[slot] = set(str(chunk_id) for chunk_id in chunk_ids)
+            for chunk_id in self._chunks[slot]:
+                self._slots_by_chunk.setdefault(chunk_id, set()).add(slot)
+            self._lru[slot] = None
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Drop every answer built from one of the given chunks.
+
+        Args:
+            chunk_ids: Ids of chunks that changed or were removed
+
+        Returns:
+            Number of answers dropped
+        """
+        dropped = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                for slot in list(self._slots_by_chunk.get(str(chunk_id), ())):
+                    self._release(slot)
+                    dropped += 1
+        if dropped:
+            logger.info(f"Invalidated {dropped} cached answers")
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._lru):
+                self._release(slot)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._lru)}
+
+    def _free_slot(self) -> int:
+        if len(self._lru) >= self.max_entries:
+            slot = next(iter(self._lru))
+            self._release(slot)
+            return slot
+        used = self._lru.keys()
+        return next(slot for slot in range(self.max_entries) if slot not in used)
+
+    def _release(self, slot: int):
+        self._active[slot] = False
+        self._answers[slot] = None
+        for chunk_id in self._chunks[slot]:
+            slots = self._slots_by_chunk.get(chunk_id)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._slots_by_chunk[chunk_id]
+        self._chunks[slot] = set()
+        self._lru.pop(slot, None)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
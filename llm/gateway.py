@@ -0,0 +1,502 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, List, Mapping, Optional, Tuple
+
+from groq import APIConnectionError, APIStatusError, APITimeoutError, AsyncGroq, Groq, RateLimitError
+from rag.chunking import approximate_tokens
+from telemetry.metrics import IN_FLIGHT, LLM_REQUESTS, QUEUE_DEPTH, observe_stage, stage
+
+logger = logging.getLogger(__name__)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+class LLMUnavailable(Exception):
+    """No model could answer: all of them are failing, rate limited beyond the wait budget, or the request is invalid."""
+
+
+class GatewayOverloaded(LLMUnavailable):
+    """The request queue is full; the request was rejected without calling the API."""
+
+
+@dataclass
+class GatewayConfig:
+    """
+    Limits of the LLM gateway.
+
+    requests_per_minute and tokens_per_minute are the per-model limits of the
+    Groq plan; the buckets are also corrected from the rate limit headers of
+    every response. Requests that would wait more than max_wait for capacity go
+    to the next fallback model instead.
+    """
+    max_concurrency: int = 8
+    max_queued: int = 256
+    max_queued_per_user: int = 3
+    requests_per_minute: float = 30
+    tokens_per_minute: float = 6000
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 20.0
+    max_wait: float = 20.0
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 30.0
+    fallback_models: Tuple[str, ...] = ("llama-3.3-70b-versatile",)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a Groq reset header ("2m59.56s", "7.66s", "120ms") or a plain retry-after number."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """
+        Thread-safe token bucket that hands out waits instead of blocking.
+
+        reserve() takes the capacity right away, possibly going into debt, and
+        returns how long the caller must sleep; this works the same for threads
+        and coroutines and keeps reservations in arrival order.
+
+        Args:
+            per_minute: Capacity, refilled evenly over a minute
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds a reservation of `amount` would wait, without taking it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            deficit = min(amount, self.capacity) - self.level
+            return max(deficit / self.rate if deficit > 0 else 0.0, self.blocked_until - now)
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+            return max(-self.level / self.rate if self.level < 0 else 0.0, self.blocked_until - now)
+
+    def refund(self, amount: float):
+        """Give back `amount` of a reservation that was not used; a negative amount takes what was used beyond it."""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining: Optional[float], reset: Optional[float]):
+        """Never be more optimistic than the server: clamp to its remaining budget, block until its reset when empty."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining is not None:
+                self.level = min(self.level, remaining)
+                if remaining <= 0 and reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+    def block(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        """
+        Stop calling a model after consecutive failures.
+
+        After `threshold` failures the circuit opens and calls are refused for
+        `cooldown` seconds; then one probe call is let through (half-open) and its
+        outcome closes or re-opens the circuit.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon_probe(self):
+        """Let another call probe when this one ended without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+
+class FairQueue:
+    def __init__(self, slots: int, max_queued: int = 256, max_queued_per_user: int = 3):
+        """
+        Concurrency limit whose free slots are handed to waiting users round-robin.
+
+        A user sending many messages at once only gets one slot per turn, so a
+        burst from one chat does not delay everybody else.
+
+        Args:
+            slots: Requests allowed in flight at once
+            max_queued: Waiting requests above which new ones are rejected
+            max_queued_per_user: Waiting requests of a single user above which theirs are rejected
+        """
+        self.slots = slots
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self._free = slots
+        self._waiting: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        return self.slots - self._free
+
+    async def acquire(self, user: Hashable = None):
+        if self._free > 0 and not self._waiting:
+            self._free -= 1
+            return
+        waiters = self._waiting.get(user)
+        if self._queued >= self.max_queued or (waiters and len(waiters) >= self.max_queued_per_user):
+            raise GatewayOverloaded(f"LLM request queue is full ({self._queued} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user, deque()).append(future)
+        self._queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the waiter was cancelled, pass it on
+                self.release()
+            else:
+                self._discard(user, future)
+            raise
+
+    def _discard(self, user: Hashable, future: asyncio.Future):
+        waiters = self._waiting.get(user)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[user]
+
+    def release(self):
+        while self._waiting:
+            user, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self._queued -= 1
+            # The user goes to the back of the rotation
+            del self._waiting[user]
+            if waiters:
+                self._waiting[user] = waiters
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+
+class _ModelLimits:
+    def __init__(self, config: GatewayConfig):
+        self.requests = TokenBucket(config.requests_per_minute)
+        self.tokens = TokenBucket(config.tokens_per_minute)
+        self.breaker = CircuitBreaker(config.breaker_threshold, config.breaker_cooldown)
+
+
+class LLMGateway:
+    def __init__(self,
+                 client: Groq,
+                 async_client: AsyncGroq,
+                 model: str,
+                 config: Optional[GatewayConfig] = None):
+        """
+        Single entry point for chat completions, shared by every request of the process.
+
+        Bounds concurrency with a per-user fair queue, paces requests and tokens
+        per model with buckets kept in step with Groq's rate limit headers, retries
+        transient failures with jittered exponential backoff and moves to the
+        fallback models when the primary is rate limited or its circuit is open.
+
+        Args:
+            client: Sync Groq client, should be built with max_retries=0
+            async_client: Async Groq client, should be built with max_retries=0
+            model: Primary model
+            config: Limits, defaults to GatewayConfig()
+        """
+        self.client = client
+        self.async_client = async_client
+        self.config = config or GatewayConfig()
+        self.models = [model, *[fallback for fallback in self.config.fallback_models if fallback != model]]
+        self.limits: Dict[str, _ModelLimits] = {name: _ModelLimits(self.config) for name in self.models}
+        self.queue = FairQueue(self.config.max_concurrency, self.config.max_queued, self.config.max_queued_per_user)
+        self._sync_slots = threading.BoundedSemaphore(self.config.max_concurrency)
+        self.stats: Counter = Counter()
+        QUEUE_DEPTH.set_function(lambda: self.queue.queued, queue='llm')
+        IN_FLIGHT.set_function(lambda: self.queue.in_flight, queue='llm')
+
+    def _count(self, event: str, model: str):
+        self.stats[event] += 1
+        LLM_REQUESTS.inc(model=model, outcome=event)
+
+    @property
+    def model(self) -> str:
+        return self.models[0]
+
+    def _estimate_tokens(self, messages: List[Dict[str, str]], params: Mapping[str, Any]) -> int:
+        return sum(approximate_tokens(message.get('content') or '') for message in messages) + params.get('max_tokens', 400)
+
+    def _select_model(self, tokens: int) -> Tuple[str, float]:
+        """First model whose circuit is closed and whose buckets have capacity within max_wait."""
+        for model in self.models:
+            limits = self.limits[model]
+            wait = max(limits.requests.wait_time(1), limits.tokens.wait_time(tokens))
+            if wait > self.config.max_wait or not limits.breaker.allow():
+                continue
+            wait = max(limits.requests.reserve(1), limits.tokens.reserve(tokens))
+            if model != self.model:
+                self._count('fallbacks', model)
+                logger.info("Routing LLM request to fallback model %s", model)
+            return model, wait
+        self._count('rejected', self.model)
+        raise LLMUnavailable("Every model is rate limited or failing")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries of a burst from arriving together
+        return random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2 ** attempt))
+
+    def _on_headers(self, model: str, headers: Mapping[str, str]):
+        limits = self.limits[model]
+        limits.requests.sync(_number(headers.get('x-ratelimit-remaining-requests')),
+                             parse_duration(headers.get('x-ratelimit-reset-requests')))
+        limits.tokens.sync(_number(headers.get('x-ratelimit-remaining-tokens')),
+                           parse_duration(headers.get('x-ratelimit-reset-tokens')))
+
+    def _on_error(self, model: str, error: Exception, attempt: int) -> float:
+        """Record a failed call; returns the delay before retrying, raises if the error is not transient."""
+        limits = self.limits[model]
+        if isinstance(error, RateLimitError):
+            self._count('rate_limited', model)
+            # A rate limit means the service is up, it must not count towards (or leave open) the circuit
+            limits.breaker.record_success()
+            headers = error.response.headers
+            retry_after = parse_duration(headers.get('retry-after')) or self._backoff(attempt)
+            limits.requests.block(retry_after)
+            self._on_headers(model, headers)
+            logger.warning("Groq rate limited %s, retry after %.1fs", model, retry_after)
+            # The blocked bucket makes the next attempt wait or fall back, only de-synchronise here
+            return random.uniform(0, self.config.backoff_base)
+        if isinstance(error, (APIConnectionError, APITimeoutError)) or \
+                (isinstance(error, APIStatusError) and error.status_code >= 500):
+            limits.breaker.record_failure()
+            self._count('retries', model)
+            logger.warning("Groq call to %s failed (attempt %d): %s", model, attempt + 1, error)
+            return self._backoff(attempt)
+        limits.breaker.record_success()
+        raise LLMUnavailable(f"Groq rejected the request: {error}") from error
+
+    def _on_success(self, model: str, headers: Mapping[str, str]):
+        self.limits[model].breaker.record_success()
+        self._on_headers(model, headers)
+        self._count('requests', model)
+
+    def _on_abandoned(self, model: str, tokens: int):
+        """A call cancelled before its outcome is known frees its tokens and the half-open probe."""
+        limits = self.limits[model]
+        limits.tokens.refund(tokens)
+        limits.breaker.abandon_probe()
+
+    def _reconcile(self, model: str, tokens: int, usage: Any):
+        """Correct the estimated token reservation with the usage reported by Groq."""
+        used = getattr(usage, 'total_tokens', None)
+        if used is not None:
+            self.limits[model].tokens.refund(tokens - used)
+
+    async def _acreate(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[str, Any]:
+        tokens = self._estimate_tokens(messages, params)
+        last_error = None
+        for attempt in range(self.config.max_retries + 1):
+            model, wait = self._select_model(tokens)
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                raw = await self.async_client.chat.completions.with_raw_response.create(
+                    model=model, messages=messages, **params
+                )
+            except Exception as e:
+                last_error = e
+                # A failed attempt consumes no tokens, the server's own count arrives with the next headers
+                self.limits[model].tokens.refund(tokens)
+                await asyncio.sleep(self._on_error(model, e, attempt))
+                continue
+            except BaseException:
+                self._on_abandoned(model, tokens)
+                raise
+            response = await raw.parse()
+            if not params.get('stream'):
+                self._reconcile(model, tokens, response.usage)
+            # After the reconciliation, so the remaining budget in the headers has the last word
+            self._on_success(model, raw.headers)
+            return model, response
+        raise LLMUnavailable(f"Groq failed after {self.config.max_retries + 1} attempts: {last_error}") from last_error
+
+    async def complete(self, messages: List[Dict[str, str]], user: Hashable = None, **params) -> str:
+        """
+        Chat completion text.
+
+        Args:
+            messages: Chat messages
+            user: Key of the requesting user (e.g. the chat id) for fair queueing
+            **params: Completion parameters (temperature, max_tokens, ...)
+
+        Returns:
+            The generated text
+
+        Raises:
+            LLMUnavailable: No model could answer
+        """
+        with stage('llm_queue_wait'):
+            await self.queue.acquire(user)
+        try:
+            with stage('llm_total'):
+                _, response = await self._acreate(messages, params)
+            return response.choices[0].message.content
+        finally:
+            self.queue.release()
+
+    async def stream(self, messages: List[Dict[str, str]], user: Hashable = None, **params) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text pieces.
+
+        Failures before the first piece are retried like complete(); once text
+        was delivered a failure raises LLMUnavailable, since a retry would repeat it.
+        """
+        with stage('llm_queue_wait'):
+            await self.queue.acquire(user)
+        start = time.perf_counter()
+        first = True
+        try:
+            model, stream = await self._acreate(messages, {**params, 'stream': True})
+            try:
+                async for chunk in stream:
+                    # Groq reports the usage of a stream in its last chunk
+                    x_groq = getattr(chunk, 'x_groq', None)
+                    if x_groq is not None and getattr(x_groq, 'usage', None) is not None:
+                        self._reconcile(model, self._estimate_tokens(messages, params), x_groq.usage)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if first:
+                            observe_stage('llm_first_token', start)
+                            first = False
+                        yield delta
+            except (APIConnectionError, APITimeoutError, APIStatusError) as e:
+                self.limits[model].breaker.record_failure()
+                raise LLMUnavailable(f"Groq stream from {model} broke off: {e}") from e
+        finally:
+            observe_stage('llm_total', start)
+            self.queue.release()
+
+    def complete_sync(self, messages: List[Dict[str, str]], **params) -> str:
+        """Blocking version of complete(), for scripts; bounded by its own concurrency limit instead of the fair queue."""
+        tokens = self._estimate_tokens(messages, params)
+        last_error = None
+        with self._sync_slots:
+            for attempt in range(self.config.max_retries + 1):
+                model, wait = self._select_model(tokens)
+                try:
+                    if wait > 0:
+                        time.sleep(wait)
+                    raw = self.client.chat.completions.with_raw_response.create(model=model, messages=messages, **params)
+                except Exception as e:
+                    last_error = e
+                    self.limits[model].tokens.refund(tokens)
+                    time.sleep(self._on_error(model, e, attempt))
+                    continue
+                except BaseException:
+                    self._on_abandoned(model, tokens)
+                    raise
+                response = raw.parse()
+                self._reconcile(model, tokens, response.usage)
+                self._on_success(model, raw.headers)
+                return response.choices[0].message.content
+        raise LLMUnavailable(f"Groq failed after {self.config.max_retries + 1} attempts: {last_error}") from last_error
+
+    def is_available(self) -> bool:
+        """True if some model's circuit is not open and the API answers a model lookup (no tokens are spent)."""
+        for model in self.models:
+            if self.limits[model].breaker.state == "open":
+                continue
+            try:
+                self.client.models.retrieve(model)
+                return True
+            except Exception as e:
+                logger.warning(f"Groq model {model} is not available: {e}")
+        return False
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.queue.in_flight,
+            'queued': self.queue.queued,
+            'circuits': {model: limits.breaker.state for model, limits in self.limits.items()},
+            **self.stats
+        }
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
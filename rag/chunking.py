@@ -0,0 +1,185 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=\S)')
+WHITESPACE_RE = re.compile(r'[ \t\f\v]+')
+
+# Separators placed before a unit when it is joined to the previous one in a chunk
+PARAGRAPH_SEP = "\n\n"
+LINE_SEP = "\n"
+WORD_SEP = " "
+
+
+def approximate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class TextChunk:
+    """A chunk of a document together with the headings it sits under."""
+    text: str
+    heading_path: Tuple[str, ...]
+    tokens: int
+
+
+@dataclass
+class _Unit:
+    text: str
+    sep: str
+    tokens: int
+
+
+class MarkdownChunker:
+    def __init__(self,
+                 max_tokens: int = 256,
+                 overlap_tokens: int = 32,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        Split markdown-ish text into chunks that follow the document structure.
+
+        Sections are delimited by headings, sections are split on paragraphs and
+        oversized paragraphs fall back to sentences and then words. Each piece of
+        text is measured once, so chunking a document is a single linear pass.
+
+        Args:
+            max_tokens: Maximum size of each chunk, in tokens of count_tokens
+            overlap_tokens: Trailing context carried over between chunks of the same section
+            count_tokens: Token counter of the embedding model, defaults to an estimate
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens or approximate_tokens
+
+    def split(self, text: str) -> List[TextChunk]:
+        """
+        Chunk a document.
+
+        Args:
+            text: Raw document text
+
+        Returns:
+            Chunks in document order, never crossing a heading
+        """
+        chunks = []
+        for heading_path, units in self._sections(text):
+            chunks.extend(self._pack(units, heading_path))
+        return chunks
+
+    def _sections(self, text: str) -> Iterator[Tuple[Tuple[str, ...], List[_Unit]]]:
+        """Yield (heading path, units) for every section, scanning the lines once."""
+        headings: List[Tuple[int, str]] = []
+        units: List[_Unit] = []
+        paragraph: List[str] = []
+        after_heading = False
+        has_body = False
+
+        def flush_paragraph():
+            nonlocal after_heading, has_body
+            if paragraph:
+                sep = "" if not units else LINE_SEP if after_heading else PARAGRAPH_SEP
+                units.extend(self._split_paragraph(" ".join(paragraph), sep))
+                paragraph.clear()
+                after_heading = False
+                has_body = True
+
+        for line in text.splitlines():
+            line = WHITESPACE_RE.sub(" ", line).strip()
+            heading = HEADING_RE.match(line)
+            if heading:
+                flush_paragraph()
+                # A heading with no text of its own (e.g. the document title) stays with the next section
+                if has_body:
+                    yield tuple(title for _, title in headings), units
+                    units = []
+                    has_body = False
+                level = len(heading.group(1))
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, heading.group(2)))
+                # The heading line opens the section so the first chunk reads like the source
+                units.append(_Unit(line, LINE_SEP if units else "", self.count_tokens(line)))
+                after_heading = True
+            elif line:
+                paragraph.append(line)
+            else:
+                flush_paragraph()
+
+        flush_paragraph()
+        if units:
+            yield tuple(title for _, title in headings), units
+
+    def _split_paragraph(self, paragraph: str, sep: str) -> List[_Unit]:
+        """A paragraph as one unit, or as sentences (then word windows) if it is too long."""
+        tokens = self.count_tokens(paragraph)
+        if tokens <= self.max_tokens:
+            return [_Unit(paragraph, sep, tokens)]
+
+        units = []
+        for sentence in SENTENCE_RE.split(paragraph):
+            sentence_sep = sep if not units else WORD_SEP
+            sentence_tokens = self.count_tokens(sentence)
+            if sentence_tokens <= self.max_tokens:
+                units.append(_Unit(sentence, sentence_sep, sentence_tokens))
+            else:
+                units.extend(self._split_words(sentence, sentence_tokens, sentence_sep))
+        return units
+
+    def _split_words(self, sentence: str, tokens: int, sep: str) -> List[_Unit]:
+        """Cut an oversized sentence into evenly sized word windows, splitting again those that still don't fit."""
+        words = sentence.split(" ")
+        pieces = -(-tokens // self.max_tokens)
+        if len(words) > 1:
+            step = -(-len(words) // pieces)
+            windows = [(" ".join(words[start:start + step]), WORD_SEP) for start in range(0, len(words), step)]
+        elif len(sentence) > 1:
+            # A single overlong word (a URL, an identifier) is cut by characters
+            step = -(-len(sentence) // pieces)
+            windows = [(sentence[start:start + step], "") for start in range(0, len(sentence), step)]
+        else:
+            return [_Unit(sentence, sep, tokens)]
+
+        units = []
+        for piece, piece_sep in windows:
+            piece_sep = sep if not units else piece_sep
+            piece_tokens = self.count_tokens(piece)
+            # Windows are sized proportionally, tokens are not spread evenly over the words
+            if piece_tokens > self.max_tokens:
+                units.extend(self._split_words(piece, piece_tokens, piece_sep))
+            else:
+                units.append(_Unit(piece, piece_sep, piece_tokens))
+        return units
+
+    def _pack(self, units: List[_Unit], heading_path: Tuple[str, ...]) -> Iterator[TextChunk]:
+        """Greedily pack the units of one section into chunks with a bounded overlap."""
+        current: List[_Unit] = []
+        size = 0
+        for unit in units:
+            if current and size + unit.tokens > self.max_tokens:
+                yield self._emit(current, heading_path, size)
+                current, size = self._overlap(current, unit.tokens)
+            current.append(unit)
+            size += unit.tokens
+        if current:
+            yield self._emit(current, heading_path, size)
+
+    def _overlap(self, previous: List[_Unit], incoming: int) -> Tuple[List[_Unit], int]:
+        """Trailing units of the previous chunk to repeat, never the whole chunk."""
+        carried: List[_Unit] = []
+        size = 0
+        for unit in reversed(previous[1:]):
+            if size + unit.tokens > self.overlap_tokens or size + unit.tokens + incoming > self.max_tokens:
+                break
+            carried.append(unit)
+            size += unit.tokens
+        carried.reverse()
+        return carried, size
+
+    @staticmethod
+    def _emit(units: List[_Unit], heading_path: Tuple[str, ...], size: int) -> TextChunk:
+        text = units[0].text + "".join(unit.sep + unit.text for unit in units[1:])
+        return TextChunk(text, heading_path, size)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .chunking import approximate_tokens
+from .models import MODEL_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANKER_MODEL = "Xenova/ms-marco-MiniLM-L-6-v2"
+
+# Cross-encoders trained beyond English; the others are only used on English questions
+MULTILINGUAL_RERANKERS = {
+    "jinaai/jina-reranker-v2-base-multilingual",
+    "BAAI/bge-reranker-v2-m3",
+    "BAAI/bge-reranker-v2-m3-int8",
+}
+
+
+@dataclass
+class BuiltContext:
+    """Context text ready for the prompt and the ids of the chunks it contains."""
+    text: str
+    chunk_ids: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+class ContextBuilder:
+    def __init__(self,
+                 reranker_model: Optional[str] = DEFAULT_RERANKER_MODEL,
+                 token_budget: int = 1200,
+                 candidates: int = 12,
+                 duplicate_threshold: float = 0.8,
+                 count_tokens: Callable[[str], int] = approximate_tokens,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 max_workers: int = 2,
+                 cache_dir: Optional[str] = MODEL_CACHE_DIR):
+        """
+        Turn over-retrieved search results into a compact prompt context.
+
+        Results are reranked with a local ONNX cross-encoder, near-duplicates are
+        dropped, adjacent chunks of the same source are merged back together and
+        the best passages are packed into a token budget.
+
+        Args:
+            reranker_model: FastEmbed cross-encoder name, None keeps the retrieval order. The default
+                is English-only and skipped for other languages; one of MULTILINGUAL_RERANKERS reranks all
+            token_budget: Maximum number of context tokens
+            candidates: Number of results to retrieve before reranking
+            duplicate_threshold: Word-shingle Jaccard similarity above which a chunk is a duplicate
+            count_tokens: Function measuring the token length of a text
+            executor: Thread pool for reranking in the async path
+            max_workers: Size of the reranking thread pool when no executor is given
+            cache_dir: Directory of the downloaded ONNX models, None uses FastEmbed's temporary one
+        """
+        self.reranker_model = reranker_model
+        self.token_budget = token_budget
+        self.candidates = candidates
+        self.duplicate_threshold = duplicate_threshold
+        self.count_tokens = count_tokens
+        # ONNX inference releases the GIL and a session runs concurrently, so chats rerank in parallel
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self.cache_dir = cache_dir
+        self._reranker = None
+        self._reranker_failed = False
+        # Startup warms the reranker on its own thread while the first questions may already need it
+        self._reranker_lock = threading.Lock()
+
+    @property
+    def reranker(self):
+        """Cross-encoder loaded on first use; None if disabled or unavailable."""
+        if self._reranker is None and self.reranker_model and not self._reranker_failed:
+            with self._reranker_lock:
+                if self._reranker is None and not self._reranker_failed:
+                    try:
+                        from fastembed.rerank.cross_encoder import TextCrossEncoder
+                        self._reranker = TextCrossEncoder(model_name=self.reranker_model, cache_dir=self.cache_dir)
+                        logger.info(f"Initialized reranker: {self.reranker_model}")
+                    except Exception as e:
+                        logger.error(f"Failed to load reranker {self.reranker_model}, keeping retrieval order: {e}")
+                        self._reranker_failed = True
+        return self._reranker
+
+    def reranks(self, language: Optional[str] = None) -> bool:
+        """Whether the reranker applies to questions in `language` (None when unknown)."""
+        if not self.reranker_model:
+            return False
+        return language in (None, 'en') or self.reranker_model in MULTILINGUAL_RERANKERS
+
+    def build(self, query: str, results: List[Dict[str, Any]], language: Optional[str] = None) -> BuiltContext:
+        """
+        Rerank, deduplicate, merge and pack search results.
+
+        Args:
+            query: User question
+            results: Search results (id, score, content, source, metadata)
+            language: Language of the question, an English-only reranker keeps the retrieval order otherwise
+
+        Returns:
+            The packed context and the ids of the chunks it uses
+        """
+        if not results:
+            return BuiltContext(text="No relevant context found.")
+        ranked = self.rerank(query, results) if self.reranks(language) else list(results)
+        ranked = self.deduplicate(ranked)
+        return self.pack(self.merge_adjacent(ranked))
+
+    async def abuild(self, query: str, results: List[Dict[str, Any]], language: Optional[str] = None) -> BuiltContext:
+        """Async version of build, reranking on the builder's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.build, query, results, language)
+
+    def rerank(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Order results by cross-encoder relevance, or keep them as they are without a reranker."""
+        reranker = self.reranker
+        if reranker is None or len(results) < 2:
+            return list(results)
+        try:
+            scores = list(reranker.rerank(query, [result['content'] for result in results]))
+        except Exception as e:
+            logger.error(f"Reranking failed, keeping retrieval order: {e}")
+            return list(results)
+        ranked = [{**result, 'rerank_score': float(score)} for result, score in zip(results, scores)]
+        ranked.sort(key=lambda result: result['rerank_score'], reverse=True)
+        return ranked
+
+    def deduplicate(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop results whose content mostly repeats a better ranked one."""
+        kept, kept_shingles = [], []
+        for result in results:
+            shingles = self._shingles(result['content'])
+            if any(self._jaccard(shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            kept.append(result)
+            kept_shingles.append(shingles)
+        return kept
+
+    def merge_adjacent(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merge consecutive chunks of the same source into one passage.
+
+        The merged passage takes the rank of its best chunk and its chunks are
+        joined in document order with their overlap removed. Chunk indexes restart
+        in every document a file is loaded as (JSONL record, PDF page, part of a
+        large file), so chunks are only adjacent within the same one.
+        """
+        groups: List[List[Dict[str, Any]]] = []
+        position: Dict[tuple, int] = {}
+        for result in results:
+            metadata = result.get('metadata', {})
+            index = metadata.get('chunk_index')
+            if index is None:
+                groups.append([result])
+                continue
+            document = (result.get('source'), metadata.get('part'), metadata.get('page'), metadata.get('record'))
+            group = position.get((document, index - 1), position.get((document, index + 1)))
+            if group is None:
+                group = len(groups)
+                groups.append([])
+            groups[group].append(result)
+            position[(document, index)] = group
+
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.append({**group[0], 'chunk_ids': [str(group[0]['id'])]})
+                continue
+            ordered = sorted(group, key=lambda result: result['metadata']['chunk_index'])
+            content = ordered[0]['content']
+            for result in ordered[1:]:
+                content = self._join_overlapping(content, result['content'])
+            merged.append({
+                **group[0],
+                'content': content,
+                'chunk_ids': [str(result['id']) for result in ordered]
+            })
+        return merged
+
+    def pack(self, results: List[Dict[str, Any]]) -> BuiltContext:
+        """Greedily add passages in rank order while they fit in the token budget."""
+        parts, chunk_ids, used = [], [], 0
+        for result in results:
+            category = result.get('metadata', {}).get('category') or result.get('source', 'unknown')
+            part = f"[{category}]\n{result['content'].strip()}"
+            tokens = self.count_tokens(part)
+            if used + tokens > self.token_budget:
+                continue
+            parts.append(part)
+            chunk_ids.extend(result.get('chunk_ids', [str(result['id'])]))
+            used += tokens
+        if not parts:
+            return BuiltContext(text="No relevant context found.")
+        return BuiltContext(text="\n\n".join(parts), chunk_ids=chunk_ids, tokens=used)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    @staticmethod
+    def _shingles(text: str, size: int = 3) -> set:
+        words = re.findall(r'\w+', text.lower())
+        if len(words) < size:
+            return {tuple(words)}
+        return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    @staticmethod
+    def _jaccard(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    @staticmethod
+    def _join_overlapping(first: str, second: str, max_overlap: int = 300, min_overlap: int = 10) -> str:
+        for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+            if first.endswith(second[:size]):
+                return first + second[size:]
+        return f"{first} {second}"
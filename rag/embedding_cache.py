@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 32
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivially different inputs share a cache entry."""
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, directory: Optional[str] = None, memory_size: int = 4096,
+                 read_only: bool = False, max_disk_entries: int = 100_000):
+        """
+        Content-addressed embedding cache keyed by (model name, normalized text hash).
+
+        The memory tier is an LRU of recently used vectors. The optional disk tier
+        appends float32 vectors contiguously to a file that is memory-mapped, so
+        lookups return views into the page cache and survive restarts. Only vectors
+        stored with persist=True (document chunks) reach the disk tier; once it
+        holds max_disk_entries vectors it is compacted to half of that, dropping
+        the rows not used since the process started, oldest first.
+
+        Args:
+            model_name: Embedding model the vectors come from
+            directory: Directory for the disk tier, None keeps the cache in memory only
+            memory_size: Maximum number of vectors kept in the memory tier
+            read_only: Map the disk tier without ever writing it, new vectors stay in memory; for
+                processes sharing the files with the one that fills them
+            max_disk_entries: Size cap of the disk tier, in vectors
+        """
+        self.model_name = model_name
+        self.read_only = read_only
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._rows: Dict[bytes, int] = {}
+        # Disk rows read or written by this process, kept by compaction
+        self._used: Set[bytes] = set()
+        # Keys being appended by another put, so they are not written twice
+        self._writing: Set[bytes] = set()
+        self._mmap: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self._lock = threading.Lock()
+        # Serializes file writes, which run outside _lock so lookups never wait on the disk
+        self._disk_lock = threading.Lock()
+
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+            self._vectors_path = os.path.join(directory, f"{slug}.f32")
+            self._index_path = os.path.join(directory, f"{slug}.idx")
+            self._meta_path = os.path.join(directory, f"{slug}.json")
+            self._load_disk_tier()
+
+    def key(self, text: str) -> bytes:
+        """Binary digest identifying a text for this model."""
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Look up the vector of a text.
+
+        Args:
+            text: Input text
+
+        Returns:
+            The cached float32 vector, or None on a miss
+        """
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up the vectors of several texts.
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            One entry per text: the cached vector or None on a miss
+        """
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                else:
+                    row = self._rows.get(key)
+                    if row is not None:
+                        vector = self._row(row)
+                        self._remember(key, vector)
+                        self._used.add(key)
+                        self.disk_hits += 1
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts: List[str], vectors, persist: bool = True) -> None:
+        """
+        Store vectors for several texts.
+
+        Args:
+            texts: Input texts
+            vectors: Matching vectors, one per text
+            persist: Also append them to the disk tier; False keeps them in the memory LRU only
+        """
+        persist = persist and self.directory and not self.read_only
+        with self._lock:
+            new_keys, new_vectors = [], []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                if persist and key not in self._rows and key not in self._writing:
+                    new_keys.append(key)
+                    new_vectors.append(vector)
+            self._writing.update(new_keys)
+        if new_keys:
+            try:
+                self._append_to_disk(new_keys, np.stack(new_vectors))
+            finally:
+                with self._lock:
+                    self._writing.difference_update(new_keys)
+
+    def put(self, text: str, vector, persist: bool = True) -> None:
+        self.put_many([text], [vector], persist)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'memory_entries': len(self._memory),
+            'disk_entries': len(self._rows)
+        }
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _row(self, row: int) -> np.ndarray:
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            self._remap()
+        return self._mmap[row]
+
+    def _remap(self):
+        rows = len(self._rows)
+        if rows == 0 or self._dim is None:
+            self._mmap = None
+            return
+        self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(rows, self._dim))
+
+    def _load_disk_tier(self):
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                self._dim = json.load(f)['dim']
+            with open(self._index_path, 'rb') as f:
+                index = f.read()
+            vector_rows = os.path.getsize(self._vectors_path) // (4 * self._dim)
+            # An interrupted append can leave the two files with different lengths
+            rows = min(len(index) // DIGEST_SIZE, vector_rows)
+            self._rows = {index[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]: i for i in range(rows)}
+            if not self.read_only:
+                self._truncate(rows)
+            self._remap()
+            logger.info(f"Loaded {rows} cached embeddings from {self.directory}")
+        except Exception as e:
+            logger.error(f"Failed to load embedding cache from {self.directory}, starting empty: {e}")
+            self._rows = {}
+            self._dim = None
+            if self.read_only:
+                return
+            for path in (self._vectors_path, self._index_path, self._meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _truncate(self, rows: int):
+        with open(self._index_path, 'r+b') as f:
+            f.truncate(rows * DIGEST_SIZE)
+        with open(self._vectors_path, 'r+b') as f:
+            f.truncate(rows * self._dim * 4)
+
+    def _append_to_disk(self, keys: List[bytes], vectors: np.ndarray):
+        with self._disk_lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with open(self._meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model_name': self.model_name, 'dim': self._dim}, f)
+            elif vectors.shape[1] != self._dim:
+                logger.error(f"Refusing to cache vectors of dimension {vectors.shape[1]}, expected {self._dim}")
+                return
+
+            if self._rows and len(self._rows) + len(keys) > self.max_disk_entries:
+                self._compact(max(self.max_disk_entries // 2 - len(keys), 0))
+
+            try:
+                # Vectors first: a row only becomes visible once its key is in the index
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                with open(self._index_path, 'ab') as f:
+                    f.write(b''.join(keys))
+            except Exception as e:
+                logger.error(f"Failed to write embedding cache: {e}")
+                return
+
+            with self._lock:
+                start = len(self._rows)
+                for offset, key in enumerate(keys):
+                    self._rows[key] = start + offset
+                    self._used.add(key)
+
+    def _compact(self, keep: int):
+        """Rewrite the disk tier with at most `keep` rows, preferring used ones, then the newest."""
+        with self._lock:
+            newest_first = sorted(self._rows.items(), key=lambda item: -item[1])
+            kept = [item for item in newest_first if item[0] in self._used]
+            kept = (kept + [item for item in newest_first if item[0] not in self._used])[:keep]
+            kept.sort(key=lambda item: item[1])
+            if self._mmap is None or self._mmap.shape[0] < len(self._rows):
+                self._remap()
+            mmap = self._mmap
+        # Rows are copied outside the lookup lock: only this thread (holding _disk_lock) changes the file
+        if kept:
+            vectors = np.ascontiguousarray(mmap[[row for _, row in kept]], dtype=np.float32)
+        else:
+            vectors = np.zeros((0, self._dim), dtype=np.float32)
+        try:
+            with open(f"{self._vectors_path}.tmp", 'wb') as f:
+                f.write(vectors.tobytes())
+            with open(f"{self._index_path}.tmp", 'wb') as f:
+                f.write(b''.join(key for key, _ in kept))
+            # Without an index the files are discarded on load, so a crash here only loses the cache
+            os.remove(self._index_path)
+            os.replace(f"{self._vectors_path}.tmp", self._vectors_path)
+            os.replace(f"{self._index_path}.tmp", self._index_path)
+        except Exception as e:
+            logger.error(f"Failed to compact embedding cache: {e}")
+            return
+        with self._lock:
+            self._rows = {key: row for row, (key, _) in enumerate(kept)}
+            self._used &= self._rows.keys()
+            self._remap()
+        logger.info(f"Compacted embedding cache to {len(kept)} vectors")
@@ -1,40 +1,105 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import json
 import logging
-from fastembed import TextEmbedding
+import os
 import re
 import uuid
+import warnings
+import numpy as np
+from .manifest import IngestionManifest
+from .embedding_cache import EmbeddingCache
+from .ingestion_engine import IngestionConfig, StreamingIngestion
+from .chunking import MarkdownChunker, approximate_tokens
+from .loaders import file_metadata, load_documents, load_file
+from .models import DEFAULT_EMBEDDING_MODEL, MODEL_CACHE_DIR, get_model_spec
+from telemetry.metrics import cache_lookup, stage
 
 logger = logging.getLogger(__name__)
 
+# Namespace for deterministic chunk ids, must never change or every chunk gets re-embedded
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b7e-3d5a-4c8e-9b1f-2a7d4e6c8b90")
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 hex digest of a file, read in blocks so large files are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, chunk_hash: str, ordinal: int = 0) -> str:
+    """
+    Deterministic point id of a chunk.
+
+    Only the source, the content and the ordinal of identical chunks within the
+    source make up the id: edits elsewhere in the file, position shifts and
+    metadata changes keep it, so syncs re-embed only chunks whose text changed.
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\n{chunk_hash}\n{ordinal}"))
+
+
+def payload_digest(chunk: Dict[str, Any]) -> str:
+    """Digest of what a store keeps as the payload of a chunk (content, source and metadata)."""
+    return content_hash(json.dumps([chunk['content'], chunk['source'], chunk['metadata']], sort_keys=True, default=str))
+
 
 class EmbeddingManager:
-    def __init__(self, model_name: str = "BAAI/bge-small-en-v1.5"):
+    def __init__(self,
+                 model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 max_workers: int = 2,
+                 cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = 256,
+                 threads: Optional[int] = None,
+                 parallel: Optional[int] = None,
+                 cache_dir: Optional[str] = MODEL_CACHE_DIR):
         """
         Initialize the embedding model.
 
         Args:
             model_name: Name of the FastEmbed model to use
+            max_workers: Size of the thread pool used by the async embedding methods
+            cache: Optional embedding cache consulted before running the model
+            batch_size: Number of texts per ONNX inference batch
+            threads: ONNX intra-op threads, None lets onnxruntime decide
+            parallel: FastEmbed data-parallel workers for large inputs, None disables them
+            cache_dir: Directory of the downloaded ONNX models, None uses FastEmbed's temporary one
         """
-        self.model = TextEmbedding(model_name=model_name)
+        # Imported here so the heavy onnxruntime import happens on the thread loading the model
+        from fastembed import TextEmbedding
+        self.model = TextEmbedding(model_name=model_name, cache_dir=cache_dir, threads=threads)
         self.model_name = model_name
+        self.spec = get_model_spec(model_name)
+        self.cache = cache
+        self.batch_size = batch_size
+        self.parallel = parallel
+        self._tokenizer_available = True
+        self._counter = None
+        # ONNX inference releases the GIL, so a small pool keeps the event loop free
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
         logger.info(f"Initialized embedding model: {model_name}")
 
-    def embed_text(self, text: str) -> List[float]:
+    def embed_text(self, text: str, persist: bool = True) -> List[float]:
         """
         Generate embedding for a single text.
 
         Args:
             text: Input text to embed
+            persist: Write a new vector to the disk tier of the cache, not only to memory
 
         Returns:
             Embedding vector as list of floats
         """
-        try:
-            embedding = list(self.model.embed([text]))[0]
-            return embedding.tolist()
-        except Exception as e:
-            logger.error(f"Failed to embed text: {e}")
-            raise
+        return self.embed_array([text], persist)[0].tolist()
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """
@@ -46,13 +111,71 @@ class EmbeddingManager:
         Returns:
             List of embedding vectors
         """
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """
+        Generate embeddings for multiple texts as one contiguous matrix.
+
+        Args:
+            texts: List of input texts to embed
+            persist: Write new vectors to the disk tier of the cache; queries only stay in memory
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
         try:
-            embeddings = list(self.model.embed(texts))
-            return [emb.tolist() for emb in embeddings]
+            if self.cache is None or not texts:
+                return self._run_model(texts)
+
+            cached = self.cache.get_many(texts)
+            missing = [i for i, emb in enumerate(cached) if emb is None]
+            cache_lookup('embedding', True, len(texts) - len(missing))
+            cache_lookup('embedding', False, len(missing))
+            computed = self._run_model([texts[i] for i in missing]) if missing else None
+            if computed is not None:
+                self.cache.put_many([texts[i] for i in missing], computed, persist)
+
+            dim = computed.shape[1] if computed is not None else cached[0].shape[0]
+            embeddings = np.empty((len(texts), dim), dtype=np.float32)
+            for i, emb in enumerate(cached):
+                if emb is not None:
+                    embeddings[i] = emb
+            if missing:
+                embeddings[missing] = computed
+            return embeddings
         except Exception as e:
             logger.error(f"Failed to embed texts: {e}")
             raise
 
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed knowledge base chunks, with the passage prefix of the model.
+
+        Args:
+            texts: Chunk contents
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        prefix = self.spec.passage_prefix
+        return self.embed_array([prefix + text for text in texts] if prefix else texts)
+
+    def _query_texts(self, queries: List[str]) -> List[str]:
+        prefix = self.spec.query_prefix
+        return [prefix + query for query in queries] if prefix else queries
+
+    def _run_model(self, texts: List[str]) -> np.ndarray:
+        """Run FastEmbed and write the vectors straight into a preallocated matrix."""
+        embeddings = None
+        for i, emb in enumerate(self.model.embed(texts, batch_size=self.batch_size, parallel=self.parallel)):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), emb.shape[0]), dtype=np.float32)
+            embeddings[i] = emb
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return embeddings
+
     def embed_query(self, query: str) -> List[float]:
         """
         Generate embedding for a search query.
@@ -63,20 +186,97 @@ class EmbeddingManager:
         Returns:
             Query embedding vector
         """
-        return self.embed_text(query)
+        with stage('embed'):
+            return self.embed_text(self._query_texts([query])[0], persist=False)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed several search queries in a single model call.
+
+        Args:
+            queries: Search query texts
+
+        Returns:
+            float32 array of shape (len(queries), dim)
+        """
+        return self.embed_array(self._query_texts(queries), persist=False)
+
+    async def aembed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several search queries on the embedding thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.embed_queries, queries)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """
+        Generate a query embedding on the embedding thread pool.
+
+        Args:
+            query: Search query text
+
+        Returns:
+            Query embedding vector
+        """
+        loop = asyncio.get_running_loop()
+        with stage('embed'):
+            return await loop.run_in_executor(self.executor, self.embed_text, self._query_texts([query])[0], False)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Length of a text in tokens of the model's own tokenizer.
+
+        The model's tokenizer truncates at the length the model accepts, which
+        would hide oversized chunks, so a copy of it without truncation counts.
+        Falls back to an estimate when the model does not expose its tokenizer.
+        """
+        if self._tokenizer_available:
+            try:
+                if self._counter is None:
+                    self._counter = self._untruncated_tokenizer()
+                return len(self._counter.encode(text).ids)
+            except Exception as e:
+                logger.warning(f"Tokenizer of {self.model_name} unavailable, estimating token counts: {e}")
+                self._tokenizer_available = False
+        return approximate_tokens(text)
+
+    def _untruncated_tokenizer(self):
+        from tokenizers import Tokenizer
+        # Counting once loads FastEmbed's tokenizer without building the ONNX session
+        self.model.token_count("")
+        counter = Tokenizer.from_str(self.model.model.tokenizer.to_str())
+        counter.no_truncation()
+        counter.no_padding()
+        return counter
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counters of the embedding cache (empty when caching is disabled)."""
+        return self.cache.stats() if self.cache else {}
+
+    def close(self):
+        """Shut down the embedding thread pool."""
+        self.executor.shutdown(wait=False)
 
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(self, chunk_size: int = 256, chunk_overlap: int = 32,
+                 count_tokens: Optional[Callable[[str], int]] = None):
         """
         Initialize document processor for chunking and preparing documents.
 
         Args:
-            chunk_size: Maximum size of each text chunk
-            chunk_overlap: Number of characters to overlap between chunks
+            chunk_size: Maximum size of each text chunk, in tokens
+            chunk_overlap: Number of tokens to overlap between chunks of the same section
+            count_tokens: Tokenizer-backed token counter, e.g. EmbeddingManager.count_tokens
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.chunker = MarkdownChunker(chunk_size, chunk_overlap, count_tokens)
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the chunking and tagging settings; files chunked differently must be re-ingested."""
+        # v2: chunks carry a detected language instead of a hardcoded "en"
+        # v3: chunk ids no longer depend on the position and metadata of the chunk
+        return f"markdown-v4:{self.chunk_size}:{self.chunk_overlap}"
 
     def clean_text(self, text: str) -> str:
         """
@@ -95,7 +295,7 @@ class DocumentProcessor:
 
     def chunk_text(self, text: str) -> List[str]:
         """
-        Split text into overlapping chunks.
+        Split text into chunks along headings, paragraphs and sentences.
 
         Args:
             text: Text to chunk
@@ -103,41 +303,11 @@ class DocumentProcessor:
         Returns:
             List of text chunks
         """
-        text = self.clean_text(text)
-
-        if len(text) <= self.chunk_size:
-            return [text]
-
-        chunks = []
-        start = 0
-
-        while start < len(text):
-            end = start + self.chunk_size
-
-            # Try to end at a sentence boundary
-            if end < len(text):
-                # Look for sentence endings within the last 100 characters
-                sentence_end = text.rfind('.', start, end)
-                if sentence_end > start + self.chunk_size // 2:
-                    end = sentence_end + 1
-                else:
-                    # Look for word boundaries
-                    space_pos = text.rfind(' ', start, end)
-                    if space_pos > start:
-                        end = space_pos
-
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-
-            # Move start position with overlap
-            start = end - self.chunk_overlap
-            if start >= len(text):
-                break
-
-        return chunks
+        return [chunk.text for chunk in self.chunker.split(text)]
 
-    def process_document(self, content: str, source: str, metadata: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def process_document(self, content: str, source: str, metadata: Optional[Dict] = None,
+                         id_source: Optional[str] = None,
+                         occurrences: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
         """
         Process a document into chunks with metadata.
 
@@ -145,17 +315,25 @@ class DocumentProcessor:
             content: Document content
             source: Source identifier (e.g., filename, URL)
             metadata: Additional metadata
+            id_source: Identity of the source in chunk ids, defaults to `source`
+            occurrences: Count of each chunk hash seen so far in the source, shared by the
+                documents of one file (pages, records, parts) so identical chunks get distinct ids
 
         Returns:
             List of document chunks with metadata
         """
-        chunks = self.chunk_text(content)
+        chunks = self.chunker.split(content)
         documents = []
 
         base_metadata = metadata or {}
-
-        for i, chunk in enumerate(chunks):
-            point_id = str(uuid.uuid4())
+        occurrences = {} if occurrences is None else occurrences
+
+        for i, text_chunk in enumerate(chunks):
+            chunk = text_chunk.text
+            chunk_hash = content_hash(chunk)
+            ordinal = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = ordinal + 1
+            point_id = chunk_id(id_source or source, chunk_hash, ordinal)
             doc = {
                 'id': point_id,
                 'content': chunk,
@@ -164,7 +342,13 @@ class DocumentProcessor:
                 'total_chunks': len(chunks),
                 'metadata': {
                     **base_metadata,
-                    'chunk_size': len(chunk)
+                    'chunk_size': len(chunk),
+                    'token_count': text_chunk.tokens,
+                    'heading_path': " > ".join(text_chunk.heading_path),
+                    'section': text_chunk.heading_path[-1] if text_chunk.heading_path else "",
+                    'content_hash': chunk_hash,
+                    'chunk_index': i,
+                    'total_chunks': len(chunks)
                 }
             }
             documents.append(doc)
@@ -196,63 +380,244 @@ class DocumentProcessor:
 
 
 class DataIngestion:
-    def __init__(self, qdrant_manager, embedding_manager: Optional[EmbeddingManager] = None):
+    def __init__(self,
+                 qdrant_manager,
+                 embedding_manager: Optional[EmbeddingManager] = None,
+                 config: Optional[IngestionConfig] = None):
         """
         Initialize data ingestion pipeline.
 
         Args:
             qdrant_manager: QdrantManager instance
             embedding_manager: EmbeddingManager instance
+            config: Streaming ingestion tuning (batch sizes, workers, wait semantics)
         """
         self.qdrant_manager = qdrant_manager
         self.embedding_manager = embedding_manager or EmbeddingManager()
-        self.processor = DocumentProcessor()
-
-    def ingest_documents(self, documents: List[Dict[str, str]]):
+        # Chunks never exceed what the embedding model was trained on
+        self.processor = DocumentProcessor(min(256, self.embedding_manager.spec.max_tokens),
+                                           count_tokens=self.embedding_manager.count_tokens)
+        self.engine = StreamingIngestion(
+            self.qdrant_manager, self.embedding_manager, self.processor, config, on_upload=self._notify_upload
+        )
+        # Called with the chunks stored by an ingestion, e.g. to update the lexical index
+        self.upload_listeners = []
+        # Called with the ids of chunks removed by a sync, e.g. to invalidate cached answers
+        self.removal_listeners = []
+
+    def _notify_upload(self, chunks: List[Dict[str, Any]]):
+        for listener in self.upload_listeners:
+            listener(chunks)
+
+    def ingest_documents(self, documents: Iterable[Dict[str, str]]) -> Dict[str, Any]:
         """
         Complete pipeline to ingest documents into vector database.
 
+        Documents are consumed lazily and flow through the streaming ingestion
+        engine, so chunking, embedding and uploading overlap.
+
         Args:
-            documents: List of documents with 'content', 'source', and optional 'metadata'
-        """
-        logger.info(f"Starting ingestion of {len(documents)} documents")
+            documents: Documents with 'content', 'source', and optional 'metadata'
 
-        # Process documents into chunks
-        processed_docs = self.processor.process_multiple_documents(documents)
+        Returns:
+            Per-stage throughput report
+        """
+        logger.info("Starting streaming ingestion")
+        return self.engine.run(documents)
 
-        # Generate embeddings
-        contents = [doc['content'] for doc in processed_docs]
-        embeddings = self.embedding_manager.embed_texts(contents)
+    def ingest_files(self, file_paths: List[str]) -> Dict[str, Any]:
+        """
+        Ingest knowledge base files of any registered format.
 
-        # Add to vector database
-        self.qdrant_manager.add_documents(processed_docs, embeddings)
+        Args:
+            file_paths: List of file paths to ingest
 
-        logger.info(f"Successfully ingested {len(processed_docs)} document chunks")
+        Returns:
+            Per-stage throughput report
+        """
+        return self.ingest_documents(load_documents(file_paths))
 
-    def ingest_text_files(self, file_paths: List[str]):
+    def ingest_text_files(self, file_paths: List[str]) -> Dict[str, Any]:
         """
         Ingest text files from file paths.
 
+        Deprecated: use ingest_files, which picks the loader from the file extension.
+
         Args:
             file_paths: List of file paths to ingest
         """
-        documents = []
+        warnings.warn("DataIngestion.ingest_text_files is deprecated, use ingest_files", DeprecationWarning,
+                      stacklevel=2)
+        return self.ingest_files(file_paths)
+
+    @staticmethod
+    def file_metadata(file_path: str) -> Dict[str, Any]:
+        """Filterable metadata of a knowledge base file; the category is the file name (e.g. "housing")."""
+        return file_metadata(file_path)
+
+    def _chunk_file(self, file_path: str, id_source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily chunk a file, one loaded document (page, record, part) at a time."""
+        occurrences: Dict[str, int] = {}
+        for document in load_file(file_path):
+            yield from self.processor.process_document(document['content'], document['source'], document['metadata'],
+                                                       id_source, occurrences)
+
+    @staticmethod
+    def _id_source(file_path: str, root: Optional[str]) -> str:
+        """Path of a file relative to the knowledge base directory, so moving the directory keeps chunk ids."""
+        if root is None:
+            return file_path
+        return os.path.relpath(file_path, root).replace(os.sep, '/')
+
+    def _fit_reducer(self, file_paths: List[str], sample_size: int = 4096):
+        """
+        Fit the store's dimension reduction on a sample of the corpus before anything is stored.
 
+        The sample embeddings land in the embedding cache, so ingesting them right after is cheap.
+        """
+        texts = []
         for file_path in file_paths:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                documents.append({
-                    'content': content,
-                    'source': file_path,
-                    'metadata': {
-                        'file_type': 'text',
-                        'file_path': file_path
-                    }
-                })
+                texts.extend(chunk['content'] for chunk in self._chunk_file(file_path))
+            except Exception as e:
+                logger.error(f"Failed to load file {file_path}: {e}")
+            if len(texts) >= sample_size:
+                break
+        self.qdrant_manager.fit_reducer(self.embedding_manager.embed_documents(texts[:sample_size]))
+
+    def sync_files(self, file_paths: List[str], manifest: IngestionManifest, root: Optional[str] = None) -> Dict[str, int]:
+        """
+        Incrementally synchronise knowledge base files with the vector database.
+
+        Files whose size and mtime (or content hash) match the manifest and that were
+        chunked with the current settings are skipped.
+        Changed files are re-chunked, only chunks whose deterministic id is not already
+        stored are embedded and upserted through the streaming ingestion engine, stored chunks whose position or metadata changed
+        only get their payload updated, and stale chunks are deleted afterwards so the
+        collection is never empty while syncing.
+
+        Args:
+            file_paths: Files that make up the knowledge base
+            manifest: Manifest of previously ingested files, updated in place and saved
+            root: Directory the files come from; stored sources under it that no longer
+                exist are deleted
+
+        Returns:
+            Counters for unchanged files, changed files, embedded, updated and deleted chunks
+        """
+        stats = {'unchanged_files': 0, 'changed_files': 0, 'embedded_chunks': 0, 'updated_chunks': 0,
+                 'deleted_chunks': 0}
+
+        # A manifest that disagrees with the collection (e.g. a new Qdrant cluster) can't be trusted
+        if manifest.total_chunks() != self.qdrant_manager.count():
+            logger.info("Manifest out of sync with collection, reconciling every file")
+            manifest.clear()
+
+        changed = []
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+                entry = manifest.get(file_path)
+                if entry and entry.get('chunker') != self.processor.fingerprint:
+                    entry = None
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    stats['unchanged_files'] += 1
+                    continue
+
+                file_hash = file_digest(file_path)
+                if entry and entry['sha256'] == file_hash:
+                    manifest.update(file_path, file_hash, stat.st_mtime, stat.st_size, entry['chunk_ids'],
+                                    self.processor.fingerprint, entry.get('payloads'))
+                    stats['unchanged_files'] += 1
+                    continue
+
+                changed.append((file_path, file_hash, stat, (entry or {}).get('payloads', {})))
             except Exception as e:
                 logger.error(f"Failed to read file {file_path}: {e}")
 
-        if documents:
-            self.ingest_documents(documents)
\ No newline at end of file
+        current_sources = set(file_paths)
+        removed_sources = [source for source in manifest.sources() if source not in current_sources]
+
+        if changed or removed_sources or not manifest.sources():
+            ids_by_source = self.qdrant_manager.get_ids_by_source()
+        else:
+            ids_by_source = {}
+
+        if changed and self.qdrant_manager.needs_reducer_fit:
+            self._fit_reducer([file_path for file_path, _, _, _ in changed])
+
+        # Ids are independent of the data directory, so a moved file finds its chunks under its old source
+        stored_ids = set().union(*ids_by_source.values())
+        synced: Dict[str, Dict[str, Any]] = {}
+
+        def update_payloads(chunks: List[Dict[str, Any]]):
+            self.qdrant_manager.update_payloads(chunks)
+            self._notify_upload(chunks)
+
+        def chunk_changed_file(item) -> Iterator[Dict[str, Any]]:
+            # Runs on the engine's chunk workers and feeds its bounded queue with the chunks that
+            # need embedding; only the ids and payload digests of the file are kept for the manifest
+            file_path, file_hash, stat, stored_payloads = item
+            payloads: Dict[str, str] = {}
+            to_update: List[Dict[str, Any]] = []
+            embedded = updated = 0
+            try:
+                for chunk in self._chunk_file(file_path, self._id_source(file_path, root)):
+                    digest = payloads[chunk['id']] = payload_digest(chunk)
+                    if chunk['id'] not in stored_ids:
+                        embedded += 1
+                        yield chunk
+                    elif stored_payloads.get(chunk['id']) != digest:
+                        to_update.append(chunk)
+                        if len(to_update) >= self.engine.config.upload_batch_size:
+                            updated += len(to_update)
+                            update_payloads(to_update)
+                            to_update = []
+            except Exception as e:
+                # The file keeps its manifest entry and stored chunks, the next sync tries it again
+                logger.error(f"Failed to load file {file_path}: {e}")
+                return
+            if to_update:
+                updated += len(to_update)
+                update_payloads(to_update)
+            synced[file_path] = {'hash': file_hash, 'stat': stat, 'payloads': payloads,
+                                 'embedded': embedded, 'updated': updated}
+
+        if changed:
+            self.engine.run(changed, chunk_changed_file)
+
+        kept_ids = set()
+        stale_ids = []
+        for file_path, result in synced.items():
+            new_ids = set(result['payloads'])
+            kept_ids |= new_ids
+            stale_ids.extend(ids_by_source.get(file_path, set()) - new_ids)
+            manifest.update(file_path, result['hash'], result['stat'].st_mtime, result['stat'].st_size,
+                            sorted(new_ids), self.processor.fingerprint, result['payloads'])
+            stats['changed_files'] += 1
+            stats['embedded_chunks'] += result['embedded']
+            stats['updated_chunks'] += result['updated']
+
+        if root is not None:
+            root_path = os.path.abspath(root)
+            for source in ids_by_source:
+                if source in current_sources or source in removed_sources:
+                    continue
+                if os.path.commonpath([root_path, os.path.abspath(source)]) == root_path:
+                    removed_sources.append(source)
+
+        for source in removed_sources:
+            stale_ids.extend(ids_by_source.get(source, set()))
+            manifest.remove(source)
+        stale_ids = [point_id for point_id in dict.fromkeys(stale_ids) if point_id not in kept_ids]
+
+        self.qdrant_manager.delete_points(stale_ids)
+        stats['deleted_chunks'] = len(stale_ids)
+        if stale_ids:
+            for listener in self.removal_listeners:
+                listener(stale_ids)
+
+        self.qdrant_manager.flush()
+        manifest.save()
+        logger.info(f"Knowledge base sync finished: {stats}")
+        return stats
\ No newline at end of file
@@ -0,0 +1,175 @@
+import heapq
+import math
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class HNSWIndex:
+    def __init__(self, m: int = 16, ef_construction: int = 100, seed: int = 42):
+        """
+        Hierarchical Navigable Small World graph over the rows of a vector matrix.
+
+        The index only stores the graph; vectors are read from the matrix passed to
+        add and search, so it can sit on top of a memory-mapped file. Similarity is
+        the inner product (higher is better), matching the DOT distance used for
+        normalized embeddings.
+
+        Args:
+            m: Neighbours per node on upper layers (2 * m on layer 0)
+            ef_construction: Candidate list size while inserting
+            seed: Seed of the level generator, for reproducible graphs
+        """
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.level_multiplier = 1 / math.log(m)
+        self.random = random.Random(seed)
+        # neighbours[node][level] -> list of neighbour rows
+        self.neighbours: List[List[List[int]]] = []
+        self.entry_point: Optional[int] = None
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return len(self.neighbours)
+
+    def add(self, vectors: np.ndarray, row: int):
+        """
+        Insert a row of the matrix into the graph. Rows must be added in order.
+
+        Args:
+            vectors: The full vector matrix
+            row: Row to insert, equal to the current number of nodes
+        """
+        if row != len(self.neighbours):
+            raise ValueError(f"Rows must be inserted in order, expected {len(self.neighbours)} got {row}")
+
+        level = int(-math.log(1.0 - self.random.random()) * self.level_multiplier)
+        self.neighbours.append([[] for _ in range(level + 1)])
+        if self.entry_point is None:
+            self.entry_point = row
+            self.max_level = level
+            return
+
+        query = vectors[row]
+        entry = self.entry_point
+        for layer in range(self.max_level, level, -1):
+            entry = self._search_layer(vectors, query, [entry], 1, layer)[0][1]
+
+        entries = [entry]
+        for layer in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(vectors, query, entries, self.ef_construction, layer)
+            max_links = self.m0 if layer == 0 else self.m
+            selected = [node for _, node in candidates[:max_links]]
+            self.neighbours[row][layer] = selected
+            for node in selected:
+                links = self.neighbours[node][layer]
+                links.append(row)
+                if len(links) > max_links:
+                    scores = vectors[links] @ vectors[node]
+                    keep = np.argsort(-scores)[:max_links]
+                    self.neighbours[node][layer] = [links[i] for i in keep]
+            entries = [node for _, node in candidates]
+
+        if level > self.max_level:
+            self.entry_point = row
+            self.max_level = level
+
+    def search(self,
+               vectors: np.ndarray,
+               query: np.ndarray,
+               k: int,
+               ef: int = 64,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k search.
+
+        Args:
+            vectors: The full vector matrix
+            query: Query vector
+            k: Number of results
+            ef: Candidate list size on layer 0, higher is slower but more accurate
+            allowed: Optional boolean mask of rows that may be returned (deleted or
+                filtered rows are still traversed)
+
+        Returns:
+            (row, score) pairs, best first
+        """
+        if self.entry_point is None:
+            return []
+        entry = self.entry_point
+        for layer in range(self.max_level, 0, -1):
+            entry = self._search_layer(vectors, query, [entry], 1, layer)[0][1]
+        candidates = self._search_layer(vectors, query, [entry], max(ef, k), 0)
+        results = [(node, float(score)) for score, node in candidates
+                   if allowed is None or allowed[node]]
+        return results[:k]
+
+    def _search_layer(self, vectors: np.ndarray, query: np.ndarray, entries: List[int], ef: int, layer: int):
+        """Best-first search on one layer, returns (score, node) sorted best first."""
+        visited = set(entries)
+        entry_scores = vectors[entries] @ query
+        # Max-heap of candidates to expand and min-heap of the current best ef results
+        candidates = [(-float(score), node) for score, node in zip(entry_scores, entries)]
+        heapq.heapify(candidates)
+        best = [(float(score), node) for score, node in zip(entry_scores, entries)]
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if -negative_score < best[0][0] and len(best) >= ef:
+                break
+            links = self.neighbours[node][layer] if layer < len(self.neighbours[node]) else []
+            fresh = [link for link in links if link not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for score, link in zip(vectors[fresh] @ query, fresh):
+                score = float(score)
+                if len(best) < ef or score > best[0][0]:
+                    heapq.heappush(candidates, (-score, link))
+                    heapq.heappush(best, (score, link))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+
+        return sorted(best, reverse=True)
+
+    def save(self, path: str):
+        """Write the graph to an .npz file."""
+        levels = np.array([len(node) for node in self.neighbours], dtype=np.int32)
+        lengths, data = [], []
+        for node in self.neighbours:
+            for links in node:
+                lengths.append(len(links))
+                data.extend(links)
+        np.savez(
+            path,
+            levels=levels,
+            lengths=np.array(lengths, dtype=np.int32),
+            data=np.array(data, dtype=np.int32),
+            header=np.array([self.m, self.ef_construction, -1 if self.entry_point is None else self.entry_point,
+                             self.max_level], dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "HNSWIndex":
+        """Read a graph written by save."""
+        with np.load(path) as archive:
+            m, ef_construction, entry_point, max_level = (int(value) for value in archive['header'])
+            index = cls(m=m, ef_construction=ef_construction)
+            lengths = iter(archive['lengths'].tolist())
+            data = archive['data'].tolist()
+            position = 0
+            for level_count in archive['levels'].tolist():
+                node = []
+                for _ in range(level_count):
+                    length = next(lengths)
+                    node.append(data[position:position + length])
+                    position += length
+                index.neighbours.append(node)
+        index.entry_point = None if entry_point < 0 else entry_point
+        index.max_level = max_level
+        return index
@@ -0,0 +1,229 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class IngestionConfig:
+    """Tuning knobs of the streaming ingestion pipeline."""
+    embed_batch_size: int = 256
+    upload_batch_size: int = 256
+    queue_size: int = 8
+    chunk_workers: int = 2
+    upload_workers: int = 2
+    wait: bool = False
+
+
+class StageStats:
+    def __init__(self, name: str):
+        """Counters of one pipeline stage: items processed and time spent working."""
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def as_dict(self, wall_seconds: float) -> Dict[str, float]:
+        return {
+            'items': self.items,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(self.items / wall_seconds, 1) if wall_seconds else 0.0
+        }
+
+
+class StreamingIngestion:
+    def __init__(self,
+                 qdrant_manager,
+                 embedding_manager,
+                 processor,
+                 config: Optional[IngestionConfig] = None,
+                 on_upload: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        """
+        Pipelined ingestion: reader -> chunkers -> batched embedder -> uploaders.
+
+        Stages run in their own threads connected by bounded queues, so memory stays
+        bounded by queue_size batches whatever the corpus size, and a slow stage
+        applies backpressure to the ones before it. Embedding runs in a single
+        thread because ONNX already uses every core (or FastEmbed's worker
+        processes when the EmbeddingManager is configured with parallel).
+
+        Args:
+            qdrant_manager: QdrantManager instance
+            embedding_manager: EmbeddingManager instance
+            processor: DocumentProcessor used to chunk documents
+            config: Pipeline tuning, defaults to IngestionConfig()
+            on_upload: Called with every batch of chunks once it is stored
+        """
+        self.qdrant_manager = qdrant_manager
+        self.embedding_manager = embedding_manager
+        self.processor = processor
+        self.config = config or IngestionConfig()
+        self.on_upload = on_upload
+
+    def run(self, documents: Iterable[Any],
+            chunk: Optional[Callable[[Any], Iterable[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """
+        Ingest documents lazily produced by an iterable.
+
+        Args:
+            documents: Documents with 'content', 'source', and optional 'metadata', or
+                any items `chunk` knows how to turn into chunks (e.g. file paths)
+            chunk: Turns one item into the chunks to embed and upload, by default the
+                processor's chunking of a document; a generator is consumed as the queue
+                makes room, so a large file is never held in memory whole
+
+        Returns:
+            Per-stage throughput report
+        """
+        if chunk is None:
+            chunk = self._chunk_document
+        config = self.config
+        stats = {name: StageStats(name) for name in ('read', 'chunk', 'embed', 'upload')}
+        documents_queue = queue.Queue(maxsize=config.queue_size * config.chunk_workers)
+        chunks_queue = queue.Queue(maxsize=config.queue_size * config.embed_batch_size)
+        upload_queue = queue.Queue(maxsize=config.queue_size)
+        errors: List[BaseException] = []
+        stop = threading.Event()
+
+        def put(target: queue.Queue, item) -> bool:
+            # Blocking put that gives up once another stage failed
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def guarded(stage: Callable[[], None]) -> Callable[[], None]:
+            def target():
+                try:
+                    stage()
+                except BaseException as e:
+                    logger.error(f"Ingestion stage failed: {e}")
+                    errors.append(e)
+                    stop.set()
+            return target
+
+        def read():
+            iterator = iter(documents)
+            while True:
+                start = time.perf_counter()
+                document = next(iterator, _DONE)
+                if document is _DONE:
+                    break
+                stats['read'].record(1, time.perf_counter() - start)
+                if not put(documents_queue, document):
+                    return
+            for _ in range(config.chunk_workers):
+                put(documents_queue, _DONE)
+
+        def chunker():
+            while True:
+                document = get(documents_queue)
+                if document is _DONE:
+                    break
+                chunks = iter(chunk(document))
+                count, busy = 0, 0.0
+                while True:
+                    start = time.perf_counter()
+                    item = next(chunks, _DONE)
+                    busy += time.perf_counter() - start
+                    if item is _DONE:
+                        break
+                    count += 1
+                    if not put(chunks_queue, item):
+                        return
+                stats['chunk'].record(count, busy)
+            put(chunks_queue, _DONE)
+
+        def embed():
+            finished_chunkers = 0
+            batch = []
+            while finished_chunkers < config.chunk_workers:
+                item = get(chunks_queue)
+                if item is _DONE:
+                    if stop.is_set():
+                        return
+                    finished_chunkers += 1
+                    continue
+                batch.append(item)
+                if len(batch) >= config.embed_batch_size:
+                    if not embed_batch(batch):
+                        return
+                    batch = []
+            if batch and not embed_batch(batch):
+                return
+            for _ in range(config.upload_workers):
+                put(upload_queue, _DONE)
+
+        def embed_batch(batch) -> bool:
+            start = time.perf_counter()
+            vectors = self.embedding_manager.embed_documents([item['content'] for item in batch])
+            stats['embed'].record(len(batch), time.perf_counter() - start)
+            for offset in range(0, len(batch), config.upload_batch_size):
+                end = offset + config.upload_batch_size
+                if not put(upload_queue, (batch[offset:end], vectors[offset:end])):
+                    return False
+            return True
+
+        def upload():
+            while True:
+                item = get(upload_queue)
+                if item is _DONE:
+                    break
+                batch, vectors = item
+                start = time.perf_counter()
+                self.qdrant_manager.add_documents(
+                    batch, vectors, batch_size=config.upload_batch_size, wait=config.wait
+                )
+                stats['upload'].record(len(batch), time.perf_counter() - start)
+                if self.on_upload is not None:
+                    self.on_upload(batch)
+
+        threads = [threading.Thread(target=guarded(read), name="ingest-read", daemon=True)]
+        threads += [threading.Thread(target=guarded(chunker), name=f"ingest-chunk-{i}", daemon=True)
+                    for i in range(config.chunk_workers)]
+        threads.append(threading.Thread(target=guarded(embed), name="ingest-embed", daemon=True))
+        threads += [threading.Thread(target=guarded(upload), name=f"ingest-upload-{i}", daemon=True)
+                    for i in range(config.upload_workers)]
+
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - wall_start
+
+        if errors:
+            raise errors[0]
+        self.qdrant_manager.flush()
+
+        report = {
+            'wall_seconds': round(wall_seconds, 3),
+            'stages': {name: stage.as_dict(wall_seconds) for name, stage in stats.items()}
+        }
+        logger.info(f"Streaming ingestion finished: {report}")
+        return report
+
+    def _chunk_document(self, document: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self.processor.process_document(document['content'], document['source'], document.get('metadata', {}))
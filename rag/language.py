@@ -0,0 +1,138 @@
+import os
+import re
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .vector_store import Filters
+
+LANGUAGE_KEY = 'metadata.language'
+
+LANGUAGE_NAMES = {'en': 'English', 'es': 'Spanish', 'it': 'Italian'}
+
+# Frequent function words that are (mostly) exclusive to one language
+FUNCTION_WORDS: Dict[str, Set[str]] = {
+    'en': {
+        'the', 'and', 'is', 'are', 'of', 'to', 'in', 'what', 'where', 'when', 'how', 'which', 'who', 'can',
+        'do', 'does', 'i', 'you', 'my', 'for', 'with', 'there', 'this', 'that', 'any', 'near', 'best', 'find',
+    },
+    'es': {
+        'el', 'los', 'las', 'es', 'son', 'que', 'qué', 'dónde', 'donde', 'cuándo', 'cómo', 'como', 'cuál',
+        'hay', 'para', 'por', 'con', 'una', 'del', 'y', 'en', 'mi', 'puedo', 'quiero', 'busco', 'está',
+        'están', 'estoy', 'tengo', 'necesito', 'alquiler', 'piso', 'muy', 'pero', 'también', 'algún',
+    },
+    'it': {
+        'il', 'lo', 'gli', 'della', 'delle', 'dei', 'di', 'che', 'è', 'sono', 'dove', 'quando', 'come',
+        'quale', 'ci', 'per', 'con', 'una', 'e', 'in', 'mi', 'posso', 'voglio', 'cerco', 'sto', 'ho',
+        'bisogno', 'affitto', 'casa', 'molto', 'ma', 'anche', 'qualche', 'nel', 'nella', 'al', 'alla',
+    },
+}
+
+# Characters that only occur in one of the supported languages
+CHARACTER_HINTS: Dict[str, str] = {'ñ': 'es', '¿': 'es', '¡': 'es', 'á': 'es', 'í': 'es', 'ú': 'es',
+                                   'à': 'it', 'è': 'it', 'ì': 'it', 'ò': 'it', 'ù': 'it'}
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+
+def detect_language(text: str, languages: Iterable[str] = ('en', 'es', 'it'), min_margin: int = 1) -> Optional[str]:
+    """
+    Guess the language of a short text from function words and language-specific characters.
+
+    Runs in microseconds and needs no model. Returns None when the evidence is too
+    weak (e.g. a single proper noun), so callers can fall back to a preference.
+
+    Args:
+        text: Text to classify, only the first few hundred words are looked at
+        languages: Candidate languages
+        min_margin: Lead the best language needs over the runner-up
+
+    Returns:
+        ISO 639-1 code of the detected language, or None
+    """
+    scores = {language: 0 for language in languages}
+    lowered = text.lower()
+    for word in WORD_RE.findall(lowered)[:400]:
+        for language in scores:
+            if word in FUNCTION_WORDS.get(language, ()):
+                scores[language] += 1
+    for character, language in CHARACTER_HINTS.items():
+        if language in scores and character in lowered:
+            scores[language] += 2
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if not ranked or ranked[0][1] == 0:
+        return None
+    if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < min_margin:
+        return None
+    return ranked[0][0]
+
+
+def path_language(file_path: str) -> Optional[str]:
+    """
+    Language declared by the location of a knowledge base file.
+
+    Either a suffix before the extension ("housing.es.md") or a directory named
+    after the language ("data/it/housing.md").
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    suffix = os.path.splitext(stem)[1].lstrip('.').lower()
+    if suffix in LANGUAGE_NAMES:
+        return suffix
+    for part in reversed(os.path.normpath(os.path.dirname(file_path)).split(os.sep)):
+        if part.lower() in LANGUAGE_NAMES:
+            return part.lower()
+    return None
+
+
+def resolve_language(text: str, preference: Optional[str] = None, default: str = 'en',
+                     min_words: int = 4, min_margin: int = 2) -> str:
+    """
+    Language to answer a message in.
+
+    The detected language only overrides the user's preference when the evidence
+    is strong: a message of at least `min_words` words whose best language leads
+    by `min_margin`. Short or ambiguous messages ("ok", a street name, a mixed
+    sentence) keep the preference, and without one the loose detection is used.
+
+    Args:
+        text: User message
+        preference: Language chosen by the user, if any
+        default: Language used when neither detection nor preference give one
+        min_words: Words a message needs before its detected language beats the preference
+        min_margin: Lead the detected language needs over the runner-up to beat the preference
+
+    Returns:
+        ISO 639-1 code of the language
+    """
+    if preference is None:
+        return detect_language(text) or default
+    if len(WORD_RE.findall(text)) < min_words:
+        return preference
+    return detect_language(text, min_margin=min_margin) or preference
+
+
+def route_filters(language: Optional[str],
+                  available: Set[str],
+                  multilingual: bool,
+                  filters: Optional[Filters] = None) -> Tuple[Optional[Filters], Optional[Filters]]:
+    """
+    Per-language filters for the dense and the lexical ranker.
+
+    Lexical matching only works within a language, so BM25 is restricted to
+    chunks in the query language when there are any. A multilingual model
+    retrieves across languages, so dense search stays unrestricted; an
+    English-only model is restricted to chunks in the query language when the
+    knowledge base has some, since its cross-lingual scores are unreliable.
+
+    Args:
+        language: Language of the query
+        available: Languages present in the knowledge base
+        multilingual: Whether the embedding model is multilingual
+        filters: Caller filters, combined with the language condition
+
+    Returns:
+        (dense filters, lexical filters)
+    """
+    if not language or language not in available or (filters and LANGUAGE_KEY in filters):
+        return filters, filters
+    routed = {**(filters or {}), LANGUAGE_KEY: language}
+    return (filters if multilingual else routed), routed
@@ -0,0 +1,184 @@
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .vector_store import Filters, payload_matches
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    # English
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'me', 'my', 'of', 'on', 'or', 'the', 'to', 'what', 'when', 'where', 'which', 'who', 'with', 'you',
+    # Spanish / Italian
+    'de', 'del', 'di', 'el', 'en', 'es', 'il', 'la', 'las', 'le', 'lo', 'los', 'que', 'un', 'una', 'uno', 'y', 'e',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents and split into word tokens, dropping stopwords."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [token for token in re.findall(r'\w+', text) if token not in STOPWORDS]
+
+
+def _language(payload: Dict[str, Any]) -> Optional[str]:
+    return (payload.get('metadata') or {}).get('language')
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        In-memory inverted index with Okapi BM25 scoring over chunk contents.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalisation
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._languages: Counter = Counter()
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def build(self, documents: Iterable[Tuple[str, Dict[str, Any]]]):
+        """
+        Replace the index content.
+
+        Args:
+            documents: (point id, payload) pairs, payloads as stored in the vector store
+        """
+        with self._lock:
+            self._postings, self._lengths, self._terms, self._payloads = {}, {}, {}, {}
+            self._languages = Counter()
+            self._total_length = 0
+            for point_id, payload in documents:
+                self._add(str(point_id), payload)
+        logger.info(f"Built BM25 index over {len(self)} chunks")
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """
+        Index processed document chunks (dicts with id, content, source and metadata).
+
+        Args:
+            documents: Chunks as produced by DocumentProcessor
+        """
+        with self._lock:
+            for doc in documents:
+                self._add(str(doc['id']), {
+                    'content': doc.get('content', ''),
+                    'source': doc.get('source', 'unknown'),
+                    'metadata': doc.get('metadata', {})
+                })
+
+    def languages(self) -> Set[str]:
+        """Languages of the indexed chunks."""
+        with self._lock:
+            return {language for language, count in self._languages.items() if count > 0}
+
+    def remove(self, point_ids: Iterable[str]):
+        with self._lock:
+            for point_id in point_ids:
+                self._remove(str(point_id))
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Rank chunks by BM25 score for a query.
+
+        Args:
+            query: Query text
+            limit: Maximum number of results
+            filters: Payload filters, same format as the vector stores
+
+        Returns:
+            Result dictionaries (id, score, content, source, metadata), best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._lengths:
+                return []
+            documents = len(self._lengths)
+            average_length = self._total_length / documents
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for point_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[point_id] / average_length)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results = []
+            for point_id, score in ranked:
+                payload = self._payloads[point_id]
+                if filters and not all(payload_matches(payload, key, expected) for key, expected in filters.items()):
+                    continue
+                results.append({
+                    'id': point_id,
+                    'score': score,
+                    'content': payload.get('content', ''),
+                    'source': payload.get('source', 'unknown'),
+                    'metadata': payload.get('metadata', {})
+                })
+                if len(results) >= limit:
+                    break
+            return results
+
+    def _add(self, point_id: str, payload: Dict[str, Any]):
+        if point_id in self._lengths:
+            self._remove(point_id)
+        terms = tokenize(payload.get('content', ''))
+        counts = Counter(terms)
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[point_id] = frequency
+        self._terms[point_id] = list(counts)
+        self._lengths[point_id] = len(terms)
+        self._payloads[point_id] = payload
+        self._languages[_language(payload)] += 1
+        self._total_length += len(terms)
+
+    def _remove(self, point_id: str):
+        if point_id not in self._lengths:
+            return
+        for term in self._terms.pop(point_id):
+            postings = self._postings[term]
+            postings.pop(point_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(point_id)
+        self._languages[_language(self._payloads.pop(point_id))] -= 1
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], limit: int = 5, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion.
+
+    Args:
+        result_lists: Ranked lists of result dictionaries with an 'id'
+        limit: Number of fused results to return
+        k: RRF damping constant
+
+    Returns:
+        Fused results, the 'score' replaced by the RRF score
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            key = str(result['id'])
+            if key not in fused:
+                fused[key] = {**result, 'score': 0.0}
+            fused[key]['score'] += 1.0 / (k + rank + 1)
+    return sorted(fused.values(), key=lambda result: result['score'], reverse=True)[:limit]
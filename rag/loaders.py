@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .language import detect_language, path_language
+
+logger = logging.getLogger(__name__)
+
+# Characters of a document looked at when detecting its language
+LANGUAGE_SAMPLE_CHARS = 4000
+# Documents larger than this are yielded in parts, cut at a heading or paragraph boundary
+MAX_PART_CHARS = 1_000_000
+READ_BLOCK_SIZE = 1 << 16
+
+Loader = Callable[[str], Iterator[Dict[str, Any]]]
+
+LOADERS: Dict[str, Loader] = {}
+FILE_TYPES: Dict[str, str] = {}
+
+
+def register_loader(file_type: str, *extensions: str):
+    """Register a loader function for one or more file extensions (e.g. ".md")."""
+    def decorator(loader: Loader) -> Loader:
+        for extension in extensions:
+            LOADERS[extension.lower()] = loader
+            FILE_TYPES[extension.lower()] = file_type
+        return loader
+    return decorator
+
+
+def supported_extensions() -> List[str]:
+    return sorted(LOADERS)
+
+
+def file_metadata(file_path: str) -> Dict[str, Any]:
+    """
+    Filterable metadata of a knowledge base file; the category is the file name (e.g. "housing").
+
+    The language comes from the path ("housing.es.md" or "es/housing.md") and is
+    None when the path does not declare one.
+    """
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    language = path_language(file_path)
+    if language and stem.lower().endswith(f'.{language}'):
+        stem = stem[:-len(language) - 1]
+    return {
+        'file_type': FILE_TYPES.get(extension.lower(), 'text'),
+        'file_path': file_path,
+        'category': stem,
+        'language': language
+    }
+
+
+def discover_files(directory: str, recursive: bool = True) -> List[str]:
+    """
+    List the files of a directory that have a registered loader.
+
+    Hidden files and directories are skipped. Paths are sorted so ingestion order is stable.
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.')) if recursive else []
+        for filename in sorted(files):
+            if filename.startswith('.'):
+                continue
+            if os.path.splitext(filename)[1].lower() in LOADERS:
+                file_paths.append(os.path.join(root, filename))
+    return file_paths
+
+
+def load_file(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily load one file as documents with 'content', 'source' and 'metadata'.
+
+    Large files come out as several documents whose metadata carries a 'part' number.
+    """
+    loader = LOADERS.get(os.path.splitext(file_path)[1].lower())
+    if loader is None:
+        raise ValueError(f"No loader registered for {file_path}")
+    return loader(file_path)
+
+
+def load_documents(file_paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Lazily load many files, logging and skipping the ones that fail."""
+    for file_path in file_paths:
+        try:
+            yield from load_file(file_path)
+        except Exception as e:
+            logger.error(f"Failed to load file {file_path}: {e}")
+
+
+def _document(file_path: str, content: str, part: Optional[int] = None,
+              extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    metadata = file_metadata(file_path)
+    if part is not None:
+        metadata['part'] = part
+    metadata.update(extra or {})
+    if not metadata.get('language'):
+        metadata['language'] = detect_language(content[:LANGUAGE_SAMPLE_CHARS]) or 'en'
+    return {'content': content, 'source': file_path, 'metadata': metadata}
+
+
+def _split_parts(lines: Iterable[str], file_path: str) -> Iterator[Dict[str, Any]]:
+    """Group lines into documents, starting a new part at a heading or blank line once one is large."""
+    buffer: List[str] = []
+    size = 0
+    part = 0
+    for line in lines:
+        at_boundary = line.startswith('#') or not line.strip()
+        if size >= MAX_PART_CHARS and at_boundary:
+            yield _document(file_path, ''.join(buffer), part)
+            buffer, size, part = [], 0, part + 1
+        buffer.append(line)
+        size += len(line)
+    if buffer:
+        # Files that fit in one part keep the plain metadata (and chunk ids) of a whole file
+        yield _document(file_path, ''.join(buffer), part if part else None)
+
+
+@register_loader('text', '.txt')
+def load_text(file_path: str) -> Iterator[Dict[str, Any]]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from _split_parts(f, file_path)
+
+
+@register_loader('markdown', '.md', '.markdown')
+def load_markdown(file_path: str) -> Iterator[Dict[str, Any]]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from _split_parts(f, file_path)
+
+
+@register_loader('jsonl', '.jsonl')
+def load_jsonl(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    One document per record. The text comes from 'content' or 'text', other scalar
+    fields (title, category, language, ...) become metadata.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid JSON at {file_path}:{line_number}: {e}")
+                continue
+            content = record.get('content') or record.get('text')
+            if not content:
+                continue
+            if record.get('title'):
+                content = f"# {record['title']}\n{content}"
+            fields = {
+                key: value for key, value in record.items()
+                if key not in ('content', 'text') and isinstance(value, (str, int, float, bool))
+            }
+            fields['record'] = line_number
+            yield _document(file_path, content, extra=fields)
+
+
+class _HTMLText(HTMLParser):
+    """Incremental HTML to markdown-ish text: headings become '#' lines, blocks become paragraphs."""
+
+    BLOCK_TAGS = {'p', 'div', 'li', 'tr', 'br', 'section', 'article', 'table', 'ul', 'ol', 'blockquote'}
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+    HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._text: List[str] = []
+        self._skip = 0
+
+    def _flush(self, prefix: str = ''):
+        text = ' '.join(''.join(self._text).split())
+        self._text = []
+        if text:
+            self.lines.append(f"{prefix}{text}\n")
+            self.lines.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.HEADING_TAGS or tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.HEADING_TAGS:
+            self._flush('#' * self.HEADING_TAGS[tag] + ' ')
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._text.append(data)
+
+    def drain(self) -> List[str]:
+        lines, self.lines = self.lines, []
+        return lines
+
+
+@register_loader('html', '.html', '.htm')
+def load_html(file_path: str) -> Iterator[Dict[str, Any]]:
+    def lines() -> Iterator[str]:
+        parser = _HTMLText()
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                parser.feed(block)
+                yield from parser.drain()
+        parser.close()
+        parser._flush()
+        yield from parser.drain()
+
+    yield from _split_parts(lines(), file_path)
+
+
+@register_loader('pdf', '.pdf')
+def load_pdf(file_path: str) -> Iterator[Dict[str, Any]]:
+    """One document per page. Needs the optional pypdf package."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("pypdf is required to ingest PDF files: pip install pypdf")
+
+    reader = PdfReader(file_path)
+    for page_number, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ''
+        if text.strip():
+            yield _document(file_path, text, extra={'page': page_number})
@@ -0,0 +1,686 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from .hnsw import HNSWIndex
+from .quantization import VectorCompression, make_quantizer, make_reducer
+from .models import CollectionSchema, EmbeddingModelSpec, EmbeddingModelMismatch
+from .vector_store import (ScoredDocument, VectorStore, Filters, TextMatch, INDEXED_PAYLOAD_KEYS,
+                           payload_matches, payload_value)
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self,
+                 collection_name: str = "chatbot_knowledge",
+                 recreate: bool = False,
+                 directory: str = os.path.join(".hyppo", "index"),
+                 vector_size: int = 384,
+                 hnsw_threshold: int = 20000,
+                 ef_search: int = 64,
+                 compression: Optional[VectorCompression] = None,
+                 model: Optional[EmbeddingModelSpec] = None,
+                 on_mismatch: str = "refuse"):
+        """
+        In-process vector store persisted to a memory-mapped file.
+
+        Small collections are searched exactly with a single matrix-vector product;
+        once a collection grows past hnsw_threshold points an HNSW graph is built
+        and used for approximate search. With quantization the exact scan runs over
+        compact int8 or binary codes and only the best candidates are rescored with
+        the original vectors, which on_disk leaves in the memory-mapped file.
+
+        Args:
+            collection_name: Name of the collection, used as sub-directory
+            recreate: Drop any stored data on startup
+            directory: Base directory of the local collections
+            vector_size: Dimension of the stored vectors
+            hnsw_threshold: Number of points from which the HNSW index is used
+            ef_search: HNSW candidate list size at query time
+            compression: Quantization, on-disk storage and dimension reduction settings
+            model: Embedding model spec, sets the vector size and whether vectors are normalized
+            on_mismatch: "refuse" (raise EmbeddingModelMismatch) or "migrate" to rebuild the
+                collection next to the old one and swap directories in finish_migration()
+        """
+        if on_mismatch not in ("refuse", "migrate"):
+            raise ValueError(f"Unknown model mismatch policy: {on_mismatch}")
+        self.collection_name = collection_name
+        self.path = os.path.join(directory, collection_name)
+        self.final_path = self.path
+        self.on_mismatch = on_mismatch
+        self.compression = compression or VectorCompression()
+        self.vector_size = self.compression.dimensions or (model.dimensions if model else vector_size)
+        # Scores are dot products, so vectors of unnormalized models are normalized to rank by cosine
+        self.normalize = model is not None and not model.normalized
+        self.schema = CollectionSchema(model.name if model else None, self.vector_size,
+                                       "Dot" if model is None or model.normalized else "Cosine")
+        self.hnsw_threshold = hnsw_threshold
+        self.ef_search = ef_search
+        self._quantizer = make_quantizer(self.compression)
+        self._code_size = self._quantizer.code_size(self.vector_size) if self._quantizer else 0
+
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, self.vector_size), dtype=np.float32)
+        self._size = 0
+        # Rows of _vectors already written to the vectors file, which only grows until a compaction
+        self._persisted = 0
+        # Compactions write a new vectors file, committed by the points.json that names it
+        self._vectors_file = "vectors.f32"
+        self._generation = 0
+        # Point changes since the last snapshot of points.json, appended to a log on flush
+        self._log_file: Optional[str] = None
+        self._log_entries = 0
+        self._pending_log: List[list] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        # Inverted payload indexes: key -> value -> rows, used to resolve filters without scanning
+        self._payload_index: Dict[str, Dict[Any, Set[int]]] = {key: {} for key in INDEXED_PAYLOAD_KEYS}
+        self._hnsw: Optional[HNSWIndex] = None
+        self._codes = np.zeros((0, self._code_size), dtype=np.uint8)
+        self._quantizer_rows = 0
+        self._dirty = False
+
+        if recreate:
+            self.clear_db()
+        self.ensure_collection()
+        self.reducer = make_reducer(self.compression, os.path.join(self.path, "pca.npz"))
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, self._vectors_file)
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "points.json")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, self._log_file)
+
+    @property
+    def _hnsw_path(self) -> str:
+        return os.path.join(self.path, "hnsw.npz")
+
+    def ensure_collection(self) -> bool:
+        with self._lock:
+            if os.path.exists(self._meta_path):
+                differences = self.schema.differences(self._stored_schema())
+                if not differences:
+                    self._load()
+                    return False
+                self._handle_mismatch(differences)
+            os.makedirs(self.path, exist_ok=True)
+            self._dirty = True
+            self.flush()
+            logger.info(f"Created local collection: {self.collection_name}")
+            return True
+
+    def _stored_schema(self) -> CollectionSchema:
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Collections written before the schema was recorded only know their vector size
+        return CollectionSchema.from_metadata(meta.get('schema')) or CollectionSchema(None, meta['vector_size'], "Dot")
+
+    def _handle_mismatch(self, differences: List[str]):
+        message = f"Local collection {self.collection_name} was built with a different schema: {', '.join(differences)}"
+        if self.on_mismatch == "refuse":
+            raise EmbeddingModelMismatch(
+                f"{message}. Re-ingest with on_mismatch='migrate' (EMBEDDING_MODEL_MISMATCH=migrate) or use the original model"
+            )
+        self.path = f"{self.final_path}.next"
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.migrating = True
+        logger.warning(f"{message}; rebuilding it in {self.path}, the old one is kept until the swap")
+
+    def finish_migration(self):
+        """Replace the old collection directory with the rebuilt one."""
+        with self._lock:
+            if not self.migrating:
+                return
+            self._dirty = True
+            self.flush()
+            retired = f"{self.final_path}.old"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(self.final_path, retired)
+            os.replace(self.path, self.final_path)
+            shutil.rmtree(retired, ignore_errors=True)
+            self.path = self.final_path
+            self.migrating = False
+            if self.reducer is not None and hasattr(self.reducer, 'path'):
+                self.reducer.path = os.path.join(self.path, "pca.npz")
+            logger.info(f"Swapped rebuilt local collection {self.collection_name} in place")
+
+    def abort_migration(self):
+        """Drop the partly rebuilt collection directory; the old one is left untouched."""
+        with self._lock:
+            if not self.migrating:
+                return
+            self.clear_db()
+            self.path = self.final_path
+            self.migrating = False
+            if self.reducer is not None and hasattr(self.reducer, 'path'):
+                self.reducer.path = os.path.join(self.path, "pca.npz")
+            logger.warning(f"Abandoned the rebuild of local collection {self.collection_name}")
+
+    def add_documents(self,
+                      documents: List[Dict[str, Any]],
+                      embeddings: Union[np.ndarray, List[List[float]]],
+                      batch_size: int = 256,
+                      wait: bool = True):
+        """
+        Add documents with embeddings, replacing points that have the same id.
+
+        Args:
+            documents: List of document dictionaries with content and metadata
+            embeddings: (n, dim) matrix or list of embedding vectors
+            batch_size: Unused, kept for interface compatibility
+            wait: Persist to disk before returning, otherwise on the next flush
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError("Number of documents must match number of embeddings")
+        if not documents:
+            return
+        embeddings = self._prepare(embeddings)
+        if embeddings.shape[1] != self.vector_size:
+            raise ValueError(f"Expected vectors of size {self.vector_size}, got {embeddings.shape[1]}")
+
+        with self._lock:
+            file_backed = self._file_backed()
+            self._reserve(self._size + len(documents))
+            first_row = self._size
+            if file_backed:
+                # The file is the matrix: new rows are appended to it and mapped, never copied into RAM
+                self._write_rows(first_row, embeddings)
+                self._map_vectors(first_row + len(documents))
+            for i, (doc, vector) in enumerate(zip(documents, embeddings)):
+                point_id = str(doc.get('id', i))
+                old_row = self._row_by_id.get(point_id)
+                if old_row is not None:
+                    self._kill(old_row)
+
+                row = self._size
+                if not file_backed:
+                    self._vectors[row] = vector
+                self._alive[row] = True
+                self._ids.append(point_id)
+                self._payloads.append(self._payload(doc))
+                self._row_by_id[point_id] = row
+                self._index_row(row)
+                self._pending_log.append(["add", point_id, self._payloads[row]])
+                self._size += 1
+                if self._hnsw is not None:
+                    self._hnsw.add(self._vectors, row)
+
+            self._encode(first_row)
+            if self._hnsw is None and self._size >= self.hnsw_threshold:
+                self._build_hnsw()
+            self._dirty = True
+            if wait:
+                self.flush()
+        logger.debug(f"Added {len(documents)} documents to local collection")
+
+    def update_payloads(self, documents: List[Dict[str, Any]]):
+        """
+        Replace the payload of stored points, keeping their vectors.
+
+        Persisted by the next flush, which a sync runs once at its end.
+
+        Args:
+            documents: Chunks whose id is already stored, with their new content, source and metadata
+        """
+        with self._lock:
+            updated = 0
+            for doc in documents:
+                row = self._row_by_id.get(str(doc['id']))
+                if row is None:
+                    continue
+                self._unindex_row(row)
+                self._payloads[row] = self._payload(doc)
+                self._index_row(row)
+                self._pending_log.append(["set", row, self._payloads[row]])
+                updated += 1
+            if updated:
+                self._dirty = True
+        logger.debug(f"Updated the payload of {updated} points of the local collection")
+
+    @staticmethod
+    def _payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'content': doc.get('content', ''),
+            'source': doc.get('source', 'unknown'),
+            'metadata': doc.get('metadata', {})
+        }
+
+    def query(self, query_embedding: List[float], limit: int = 5, filters: Optional[Filters] = None) -> List[ScoredDocument]:
+        """
+        Return the closest live points by dot product.
+
+        Args:
+            query_embedding: Embedding vector of the query
+            limit: Maximum number of results to return
+            filters: Payload conditions, resolved through the payload indexes before ranking
+
+        Returns:
+            Scored documents, best first
+        """
+        query = self._prepare(query_embedding)[0]
+        with self._lock:
+            allowed = self._filter_mask(filters) if filters else self._alive[:self._size]
+            rows_and_scores = self._top_k(query, limit, allowed)
+            return [ScoredDocument(id=self._ids[row], score=score, payload=self._payloads[row])
+                    for row, score in rows_and_scores]
+
+    def query_batch(self, query_embeddings, limit: int = 5, filters: Optional[Filters] = None) -> List[List[ScoredDocument]]:
+        """
+        Answer several queries with one matrix-matrix product (or one HNSW search each).
+
+        Args:
+            query_embeddings: (n, dim) matrix or list of query vectors
+            limit: Maximum number of results per query
+            filters: Payload conditions shared by all queries
+
+        Returns:
+            One list of scored documents per query
+        """
+        if len(query_embeddings) == 0:
+            return []
+        queries = self._prepare(query_embeddings)
+        with self._lock:
+            allowed = self._filter_mask(filters) if filters else self._alive[:self._size]
+            candidates = int(allowed.sum())
+            if candidates == 0:
+                return [[] for _ in queries]
+            if self._quantizer is not None or (self._hnsw is not None and candidates >= self.hnsw_threshold):
+                batch = [self._top_k(query, limit, allowed) for query in queries]
+            else:
+                scores = queries @ self._vectors[:self._size].T
+                scores[:, ~allowed] = -np.inf
+                k = min(limit, candidates)
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                batch = []
+                for query_scores, rows in zip(scores, top):
+                    rows = rows[np.argsort(-query_scores[rows])]
+                    batch.append([(int(row), float(query_scores[row])) for row in rows])
+            return [[ScoredDocument(id=self._ids[row], score=score, payload=self._payloads[row])
+                     for row, score in rows_and_scores] for rows_and_scores in batch]
+
+    def _top_k(self, query: np.ndarray, limit: int, allowed: np.ndarray):
+        candidates = int(allowed.sum())
+        if candidates == 0:
+            return []
+        if self._hnsw is not None and candidates >= self.hnsw_threshold:
+            results = self._hnsw.search(self._vectors, query, limit, self.ef_search, allowed)
+            if len(results) >= min(limit, candidates):
+                return results
+
+        if self._quantizer is not None:
+            return self._quantized_top_k(query, limit, allowed, candidates)
+
+        scores = self._vectors[:self._size] @ query
+        scores[~allowed] = -np.inf
+        limit = min(limit, candidates)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _quantized_top_k(self, query: np.ndarray, limit: int, allowed: np.ndarray, candidates: int):
+        """Rank by approximate scores over the codes, then rescore the best candidates exactly."""
+        scores = self._quantizer.scores(self._codes[:self._size], query)
+        scores[~allowed] = -np.inf
+        if self.compression.rescore:
+            k = min(max(limit, int(np.ceil(limit * self.compression.oversampling))), candidates)
+        else:
+            k = min(limit, candidates)
+        top = np.argpartition(-scores, k - 1)[:k]
+        if self.compression.rescore:
+            top = np.sort(top)
+            scores = np.full(self._size, -np.inf, dtype=np.float32)
+            scores[top] = self._vectors[top] @ query
+        top = top[np.argsort(-scores[top])][:min(limit, candidates)]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _encode(self, first_row: int):
+        """Quantize rows from first_row on, refitting the quantizer whenever the collection doubled."""
+        if self._quantizer is None or self._size == 0:
+            return
+        if self._size >= 2 * self._quantizer_rows:
+            alive = np.flatnonzero(self._alive[:self._size])
+            self._quantizer.fit(self._vectors[alive] if len(alive) else self._vectors[:self._size])
+            self._quantizer_rows = self._size
+            first_row = 0
+        if self._codes.shape[0] < self._size:
+            codes = np.zeros((max(self._size, 2 * self._codes.shape[0]), self._code_size), dtype=np.uint8)
+            codes[:first_row] = self._codes[:first_row]
+            self._codes = codes
+        for start in range(first_row, self._size, 16384):
+            end = min(start + 16384, self._size)
+            self._codes[start:end] = self._quantizer.encode(self._vectors[start:end])
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._alive[:self._size].sum())
+
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        with self._lock:
+            ids_by_source: Dict[str, Set[str]] = {}
+            for row in np.flatnonzero(self._alive[:self._size]):
+                ids_by_source.setdefault(self._payloads[row].get('source', 'unknown'), set()).add(self._ids[row])
+            return ids_by_source
+
+    def iter_documents(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            documents = [(self._ids[row], self._payloads[row]) for row in rows]
+        return iter(documents)
+
+    def delete_points(self, point_ids: List[str]):
+        if not point_ids:
+            return
+        with self._lock:
+            for point_id in point_ids:
+                row = self._row_by_id.pop(str(point_id), None)
+                if row is not None:
+                    self._kill(row)
+            self._dirty = True
+            self.flush()
+        logger.info(f"Deleted {len(point_ids)} points from local collection")
+
+    def delete_by_source(self, source: str):
+        with self._lock:
+            rows = np.flatnonzero(self._filter_mask({'source': source}))
+            self.delete_points([self._ids[row] for row in rows])
+
+    def _filter_mask(self, filters: Filters) -> np.ndarray:
+        """Boolean mask of live rows whose payload matches every filter."""
+        mask = self._alive[:self._size].copy()
+        scanned = []
+        for key, expected in filters.items():
+            index = self._payload_index.get(key)
+            if index is None or isinstance(expected, TextMatch):
+                scanned.append((key, expected))
+                continue
+            values = expected if isinstance(expected, (list, tuple, set)) else [expected]
+            rows = set()
+            for value in values:
+                rows |= index.get(value, set())
+            selected = np.zeros(self._size, dtype=bool)
+            if rows:
+                selected[list(rows)] = True
+            mask &= selected
+        # Conditions without an index are only checked on rows the indexed ones let through
+        for key, expected in scanned:
+            for row in np.flatnonzero(mask):
+                if not payload_matches(self._payloads[row], key, expected):
+                    mask[row] = False
+        return mask
+
+    def _index_row(self, row: int):
+        for key, index in self._payload_index.items():
+            value = payload_value(self._payloads[row], key)
+            if value is not None and not isinstance(value, (dict, list)):
+                index.setdefault(value, set()).add(row)
+
+    def _kill(self, row: int):
+        self._alive[row] = False
+        self._unindex_row(row)
+        self._pending_log.append(["kill", row])
+
+    def _unindex_row(self, row: int):
+        for key, index in self._payload_index.items():
+            value = payload_value(self._payloads[row], key)
+            if value is None or isinstance(value, (dict, list)):
+                continue
+            rows = index.get(value)
+            if rows is not None:
+                rows.discard(row)
+
+    def _rebuild_payload_index(self):
+        self._payload_index = {key: {} for key in INDEXED_PAYLOAD_KEYS}
+        for row in np.flatnonzero(self._alive[:self._size]):
+            self._index_row(int(row))
+
+    def clear_db(self):
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._vectors = np.zeros((0, self.vector_size), dtype=np.float32)
+            self._size = 0
+            self._alive = np.zeros(0, dtype=bool)
+            self._ids, self._payloads, self._row_by_id = [], [], {}
+            self._payload_index = {key: {} for key in INDEXED_PAYLOAD_KEYS}
+            self._hnsw = None
+            self._codes = np.zeros((0, self._code_size), dtype=np.uint8)
+            self._quantizer_rows = 0
+            self._persisted = 0
+            self._vectors_file = "vectors.f32"
+            self._generation = 0
+            self._log_file = None
+            self._log_entries = 0
+            self._pending_log = []
+            logger.info(f"Deleted local collection: {self.collection_name}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'total_documents': self.count(),
+            'vector_size': self.vector_size,
+            'distance_metric': self.schema.distance,
+            'embedding_model': self.schema.embedding_model,
+            'index': 'hnsw' if self._hnsw is not None else 'exact',
+            'quantization': self.compression.mode,
+            'on_disk': self.compression.on_disk,
+            'resident_vector_bytes': self._resident_bytes()
+        }
+
+    def _resident_bytes(self) -> int:
+        """Bytes of vector data held in RAM (memory-mapped vectors are left to the page cache)."""
+        with self._lock:
+            vector_bytes = 0 if isinstance(self._vectors, np.memmap) else self._size * self.vector_size * 4
+            return vector_bytes + self._size * self._code_size
+
+    def flush(self):
+        """
+        Persist pending changes.
+
+        New rows are appended to the vectors file and the point changes (adds,
+        deletes, payload updates) to the log next to points.json, so a flush
+        costs the size of what changed. points.json, the HNSW graph and, when
+        deleted points make up a quarter of it, the vectors file are only
+        rewritten by a snapshot, once the log holds more entries than points.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            retired = []
+            dead = self._size - int(self._alive[:self._size].sum())
+            compact = dead and dead * 4 >= self._size
+            if compact:
+                self._compact()
+                retired.append(self._vectors_path)
+                self._generation += 1
+                self._vectors_file = f"vectors.{self._generation}.f32"
+                self._persisted = 0
+            # Rows go first, the point changes refer to them
+            if self._persisted < self._size or not os.path.exists(self._vectors_path):
+                self._write_rows(self._persisted, self._vectors[self._persisted:self._size])
+                if self.compression.on_disk and self._size:
+                    # Serve the originals from the file; only the codes stay resident
+                    self._map_vectors(self._size)
+
+            if compact or self._log_file is None or \
+                    self._log_entries + len(self._pending_log) > max(self._size, 1024):
+                if self._log_file is not None:
+                    retired.append(self._log_path)
+                self._snapshot(bump=not compact)
+            else:
+                with open(self._log_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record) + "\n" for record in self._pending_log)
+                self._log_entries += len(self._pending_log)
+            self._pending_log = []
+            for path in retired:
+                if path not in (self._vectors_path, self._log_path) and os.path.exists(path):
+                    os.remove(path)
+            self._dirty = False
+
+    def _snapshot(self, bump: bool):
+        """Write points.json and the HNSW graph in full and start an empty log."""
+        if bump:
+            self._generation += 1
+        self._log_file = f"points.{self._generation}.log"
+        open(self._log_path, 'w').close()
+        self._log_entries = 0
+        if self._hnsw is not None:
+            tmp_hnsw = f"{self._hnsw_path}.tmp.npz"
+            self._hnsw.save(tmp_hnsw)
+            os.replace(tmp_hnsw, self._hnsw_path)
+        elif os.path.exists(self._hnsw_path):
+            os.remove(self._hnsw_path)
+
+        tmp_meta = f"{self._meta_path}.tmp"
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({
+                'vector_size': self.vector_size,
+                'schema': self.schema.to_metadata(),
+                'vectors_file': self._vectors_file,
+                'log_file': self._log_file,
+                'generation': self._generation,
+                'ids': self._ids,
+                'alive': self._alive[:self._size].tolist(),
+                'payloads': self._payloads
+            }, f)
+        os.replace(tmp_meta, self._meta_path)
+
+    def _write_rows(self, first_row: int, vectors: np.ndarray):
+        """Write rows from first_row on at the end of the vectors file."""
+        row_bytes = self.vector_size * 4
+        with open(self._vectors_path, 'r+b' if os.path.exists(self._vectors_path) else 'wb') as f:
+            # Drops whatever an append interrupted before its point map was written left behind
+            f.truncate(first_row * row_bytes)
+            f.seek(first_row * row_bytes)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._persisted = first_row + len(vectors)
+
+    def _map_vectors(self, rows: int):
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(rows, self.vector_size))
+
+    def _file_backed(self) -> bool:
+        """True when the vectors are served from the file (on_disk) rather than from RAM."""
+        return self.compression.on_disk and isinstance(self._vectors, np.memmap)
+
+    def close(self):
+        self.flush()
+
+    def _load(self):
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self._ids = meta['ids']
+        self._payloads = meta['payloads']
+        self._vectors_file = meta.get('vectors_file', "vectors.f32")
+        self._generation = meta.get('generation', 0)
+        # Collections written before the log was used get a snapshot, and so a log, on their next flush
+        self._log_file = meta.get('log_file')
+        alive = meta['alive']
+        if self._log_file is not None and os.path.exists(self._log_path):
+            self._log_entries = self._replay_log(alive)
+        self._size = len(self._ids)
+        self._persisted = self._size
+        self._alive = np.array(alive, dtype=bool)
+        self._row_by_id = {point_id: row for row, point_id in enumerate(self._ids) if self._alive[row]}
+        self._rebuild_payload_index()
+        if self._size:
+            # Read-only view of the file, copied into memory only on the first write (unless on_disk)
+            self._map_vectors(self._size)
+        if os.path.exists(self._hnsw_path):
+            self._hnsw = HNSWIndex.load(self._hnsw_path)
+            if len(self._hnsw) > self._size:
+                self._build_hnsw()
+            else:
+                # The graph is saved with the snapshot, rows added since are linked in again
+                for row in range(len(self._hnsw), self._size):
+                    self._hnsw.add(self._vectors, row)
+        elif self._size >= self.hnsw_threshold:
+            self._build_hnsw()
+        self._encode(0)
+        logger.info(f"Loaded local collection {self.collection_name} with {self.count()} points")
+
+    def _replay_log(self, alive: List[bool]) -> int:
+        """
+        Apply the point changes logged since the snapshot, returns the number of entries.
+
+        The log is cut after the last complete entry whose rows made it to the
+        vectors file, dropping what an interrupted flush left behind.
+        """
+        row_bytes = self.vector_size * 4
+        stored_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        entries = valid = 0
+        with open(self._log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                if record[0] == "add":
+                    if len(self._ids) >= stored_rows:
+                        break
+                    self._ids.append(record[1])
+                    self._payloads.append(record[2])
+                    alive.append(True)
+                elif record[0] == "kill":
+                    alive[record[1]] = False
+                else:
+                    self._payloads[record[1]] = record[2]
+                entries += 1
+                valid += len(line)
+        if valid < os.path.getsize(self._log_path):
+            logger.warning(f"Dropping the incomplete end of the point log of {self.collection_name}")
+            with open(self._log_path, 'r+b') as f:
+                f.truncate(valid)
+        return entries
+
+    def _reserve(self, rows: int):
+        """Make the vector matrix writable with room for at least `rows` rows."""
+        if self._file_backed():
+            # Rows go to the file, only the liveness flags live in memory
+            if len(self._alive) < rows:
+                alive = np.zeros(max(rows, 2 * len(self._alive), 64), dtype=bool)
+                alive[:self._size] = self._alive[:self._size]
+                self._alive = alive
+            return
+        capacity = self._vectors.shape[0]
+        if rows <= capacity and not isinstance(self._vectors, np.memmap):
+            return
+        new_capacity = max(rows, 2 * capacity, 64)
+        vectors = np.zeros((new_capacity, self.vector_size), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = vectors, alive
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[row] for row in keep]
+        self._payloads = [self._payloads[row] for row in keep]
+        self._row_by_id = {point_id: row for row, point_id in enumerate(self._ids)}
+        self._size = len(keep)
+        self._rebuild_payload_index()
+        self._quantizer_rows = 0
+        self._encode(0)
+        if self._hnsw is not None:
+            self._build_hnsw()
+
+    def _build_hnsw(self):
+        logger.info(f"Building HNSW index over {self._size} points")
+        self._hnsw = HNSWIndex()
+        for row in range(self._size):
+            self._hnsw.add(self._vectors, row)
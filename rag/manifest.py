@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionManifest:
+    def __init__(self, path: str):
+        """
+        Record of the files already ingested: content hash, mtime, size, chunk ids, payload digests and chunker settings.
+
+        Args:
+            path: JSON file where the manifest is stored
+        """
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it is missing or unreadable."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read manifest {self.path}, starting from scratch: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(source)
+
+    def update(self, source: str, sha256: str, mtime: float, size: int, chunk_ids: List[str],
+               chunker: Optional[str] = None, payloads: Optional[Dict[str, str]] = None):
+        self.entries[source] = {
+            'sha256': sha256,
+            'mtime': mtime,
+            'size': size,
+            'chunk_ids': chunk_ids,
+            'chunker': chunker,
+            # chunk id -> digest of the stored payload, to tell payload-only changes apart
+            'payloads': payloads or {}
+        }
+
+    def remove(self, source: str):
+        self.entries.pop(source, None)
+
+    def sources(self) -> List[str]:
+        return list(self.entries)
+
+    def total_chunks(self) -> int:
+        return sum(len(entry['chunk_ids']) for entry in self.entries.values())
+
+    def clear(self):
+        self.entries = {}
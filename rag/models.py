@@ -0,0 +1,110 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Where FastEmbed keeps the ONNX models; inside the app directory so the files
+# fetched at build time by `python -m rag.prefetch` ship with the image
+MODEL_CACHE_DIR = os.getenv("FASTEMBED_CACHE_PATH", os.path.join(".hyppo", "models"))
+
+
+@dataclass(frozen=True)
+class EmbeddingModelSpec:
+    """
+    What the rest of the pipeline needs to know about an embedding model.
+
+    normalized models output unit vectors, so the cheaper dot product ranks like
+    cosine; the others are stored with cosine distance. max_tokens is the length
+    the model was trained on, longer chunks are truncated by the tokenizer.
+    Asymmetric models were trained with an instruction in front of the text:
+    query_prefix goes before search queries, passage_prefix before the
+    knowledge base chunks.
+    """
+    name: str
+    dimensions: int
+    normalized: bool
+    max_tokens: int
+    matryoshka: bool = False
+    multilingual: bool = False
+    query_prefix: str = ""
+    passage_prefix: str = ""
+
+    @property
+    def distance(self) -> str:
+        return "Dot" if self.normalized else "Cosine"
+
+
+EMBEDDING_MODELS: Dict[str, EmbeddingModelSpec] = {}
+
+
+def register_model(spec: EmbeddingModelSpec) -> EmbeddingModelSpec:
+    EMBEDDING_MODELS[spec.name] = spec
+    return spec
+
+
+register_model(EmbeddingModelSpec("sentence-transformers/all-MiniLM-L6-v2", 384, True, 256))
+register_model(EmbeddingModelSpec("BAAI/bge-small-en-v1.5", 384, True, 512))
+register_model(EmbeddingModelSpec("BAAI/bge-base-en-v1.5", 768, True, 512))
+register_model(EmbeddingModelSpec("snowflake/snowflake-arctic-embed-xs", 384, True, 512))
+register_model(EmbeddingModelSpec("nomic-ai/nomic-embed-text-v1.5", 768, False, 8192, matryoshka=True,
+                                  query_prefix="search_query: ", passage_prefix="search_document: "))
+register_model(EmbeddingModelSpec("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", 384, False, 128,
+                                  multilingual=True))
+register_model(EmbeddingModelSpec("sentence-transformers/paraphrase-multilingual-mpnet-base-v2", 768, False, 128,
+                                  multilingual=True))
+register_model(EmbeddingModelSpec("intfloat/multilingual-e5-large", 1024, False, 512, multilingual=True,
+                                  query_prefix="query: ", passage_prefix="passage: "))
+
+
+def get_model_spec(name: str) -> EmbeddingModelSpec:
+    """
+    Spec of a registered model, or one derived from FastEmbed's model list.
+
+    Unregistered models are assumed unnormalized (cosine distance) with 512 tokens.
+    """
+    spec = EMBEDDING_MODELS.get(name)
+    if spec is not None:
+        return spec
+
+    from fastembed import TextEmbedding
+    for description in TextEmbedding.list_supported_models():
+        if description['model'] == name:
+            logger.warning(f"Embedding model {name} is not registered, assuming cosine distance and 512 tokens")
+            return register_model(EmbeddingModelSpec(name, description['dim'], False, 512))
+    raise ValueError(f"Unknown embedding model: {name}")
+
+
+class EmbeddingModelMismatch(ValueError):
+    """The collection was built with a different embedding model or vector schema."""
+
+
+@dataclass(frozen=True)
+class CollectionSchema:
+    """Vector schema recorded in the collection metadata."""
+    embedding_model: Optional[str]
+    dimensions: int
+    distance: str
+
+    def to_metadata(self) -> Dict[str, Any]:
+        return {'embedding_model': self.embedding_model, 'dimensions': self.dimensions, 'distance': self.distance}
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[Dict[str, Any]]) -> Optional['CollectionSchema']:
+        if not metadata or 'dimensions' not in metadata:
+            return None
+        return cls(metadata.get('embedding_model'), int(metadata['dimensions']), metadata.get('distance', 'Dot'))
+
+    def differences(self, stored: 'CollectionSchema') -> List[str]:
+        """Human readable list of what differs from the stored schema (empty when compatible)."""
+        differences = []
+        if self.embedding_model and stored.embedding_model and self.embedding_model != stored.embedding_model:
+            differences.append(f"model {stored.embedding_model} -> {self.embedding_model}")
+        if self.dimensions != stored.dimensions:
+            differences.append(f"dimensions {stored.dimensions} -> {self.dimensions}")
+        if self.distance != stored.distance:
+            differences.append(f"distance {stored.distance} -> {self.distance}")
+        return differences
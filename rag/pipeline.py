@@ -1,65 +1,233 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable
 import logging
-from .qdrant_client import QdrantManager
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from .local_index import LocalVectorStore
 from .embeddings import EmbeddingManager, DataIngestion
+from .manifest import IngestionManifest
+from .embedding_cache import EmbeddingCache
+from .ingestion_engine import IngestionConfig
 from .retrieval import DocumentRetriever, AdvancedRetriever
-from rag.utils import extract_text_files
+from .vector_store import Filters, VectorStore
+from .lexical import BM25Index
+from .quantization import VectorCompression
+from .models import DEFAULT_EMBEDDING_MODEL, get_model_spec
+from .loaders import discover_files
+from .watcher import DirectoryWatcher
+from .utils import extract_text_files
+from .language import route_filters
+from telemetry.startup import STARTUP
 logger = logging.getLogger(__name__)
 
 
 class RAGPipeline:
     def __init__(self,
                 collection_name: str = "chatbot_knowledge",
-                embedding_model: str = "BAAI/bge-small-en-v1.5",
+                embedding_model: str = DEFAULT_EMBEDDING_MODEL,
                 recreate_collection: bool = True,
-                use_advanced_retrieval: bool = False):
+                use_advanced_retrieval: bool = False,
+                manifest_path: Optional[str] = None,
+                embedding_cache_dir: Optional[str] = os.path.join(".hyppo", "embeddings"),
+                ingestion_config: Optional[IngestionConfig] = None,
+                vector_backend: str = "qdrant",
+                index_directory: str = os.path.join(".hyppo", "index"),
+                use_hybrid_search: bool = False,
+                compression: Optional[VectorCompression] = None,
+                on_model_mismatch: str = "refuse",
+                embedding_threads: Optional[int] = None,
+                read_only: bool = False):
         """
         Initialize the complete RAG pipeline.
 
         Args:
             collection_name: Qdrant collection name
             embedding_model: FastEmbed model name
+            recreate_collection: Drop and recreate the collection on startup
             use_advanced_retrieval: Whether to use advanced retrieval features
+            manifest_path: Where the ingestion manifest is kept for incremental syncs
+            embedding_cache_dir: Directory of the persistent embedding cache, None keeps it in memory
+            ingestion_config: Batch sizes, worker counts and wait semantics of bulk ingestion
+            vector_backend: "qdrant" for the remote Qdrant service, "local" for the in-process index
+            index_directory: Where the local backend persists its collections
+            use_hybrid_search: Fuse dense results with a BM25 lexical index in search
+            compression: Vector quantization, on-disk storage and dimension reduction settings
+            on_model_mismatch: When the stored collection was built with another embedding model,
+                "refuse" to start or "migrate" it by rebuilding next to the old one and swapping
+            embedding_threads: ONNX intra-op threads of the embedding model, None uses every core
+            read_only: Only read the stored index and embedding cache, which another process
+                keeps in sync; the local backend's files are then shared through the page cache
         """
         self.collection_name = collection_name
+        self.read_only = read_only
+        self.manifest_path = manifest_path or os.path.join(".hyppo", f"manifest-{collection_name}.json")
 
-        # Initialize components
-        self.qdrant_manager = QdrantManager(collection_name, recreate_collection)
-        self.embedding_manager = EmbeddingManager(embedding_model)
-        self.data_ingestion = DataIngestion(self.qdrant_manager, self.embedding_manager)
+        # Initialize components (the vector store keeps its historical attribute name)
+        model = get_model_spec(embedding_model)
+        self.model = model
+        self._warned_languages = set()
+        if vector_backend not in ("local", "qdrant"):
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
+        # Connecting to the vector store and loading the ONNX model are independent and
+        # both slow, the startup time is the longer of the two rather than their sum
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-init") as pool:
+            store = pool.submit(self._open_vector_store, vector_backend, recreate_collection, index_directory,
+                                compression, on_model_mismatch)
+            embedding_manager = pool.submit(self._load_embedding_model, embedding_model, embedding_cache_dir,
+                                            embedding_threads)
+            self.qdrant_manager = store.result()
+            self.embedding_manager = embedding_manager.result()
+        self.data_ingestion = DataIngestion(self.qdrant_manager, self.embedding_manager, ingestion_config)
+        # Syncs from startup and from the directory watcher must not interleave
+        self._sync_lock = threading.Lock()
+        # Set when a rebuild of the collection failed, so the next sync starts it again
+        self._retry_migration = False
+        self.watcher: Optional[DirectoryWatcher] = None
+
+        # Lexical index kept in step with the vector store by ingestion and syncs
+        self.use_hybrid_search = use_hybrid_search
+        self.lexical_index = BM25Index()
+        self.data_ingestion.upload_listeners.append(self.lexical_index.add_documents)
+        self.data_ingestion.removal_listeners.append(self.lexical_index.remove)
 
         # Initialize retriever
-        if use_advanced_retrieval:
-            self.retriever = AdvancedRetriever(self.qdrant_manager, self.embedding_manager)
+        if use_advanced_retrieval or use_hybrid_search:
+            self.retriever = AdvancedRetriever(self.qdrant_manager, self.embedding_manager, self.lexical_index)
         else:
             self.retriever = DocumentRetriever(self.qdrant_manager, self.embedding_manager)
 
         logger.info(f"RAG Pipeline initialized with collection: {collection_name}")
 
-    def add_documents(self, documents: List[Dict[str, str]]):
+    def _open_vector_store(self,
+                           vector_backend: str,
+                           recreate_collection: bool,
+                           index_directory: str,
+                           compression: Optional[VectorCompression],
+                           on_model_mismatch: str) -> VectorStore:
+        with STARTUP.phase("vector_store"):
+            if vector_backend == "local":
+                return LocalVectorStore(self.collection_name, recreate_collection, index_directory,
+                                        compression=compression, model=self.model, on_mismatch=on_model_mismatch)
+            # qdrant_client takes about a second to import, only pay for it when the backend is used
+            from .qdrant_client import QdrantManager
+            return QdrantManager(self.collection_name, recreate_collection, compression=compression,
+                                 model=self.model, on_mismatch=on_model_mismatch)
+
+    def _load_embedding_model(self, embedding_model: str, embedding_cache_dir: Optional[str],
+                              threads: Optional[int]) -> EmbeddingManager:
+        with STARTUP.phase("embedding_model"):
+            cache = EmbeddingCache(embedding_model, embedding_cache_dir, read_only=self.read_only)
+            return EmbeddingManager(embedding_model, cache=cache, threads=threads)
+
+    def add_documents(self, documents: Iterable[Dict[str, str]]) -> Dict[str, Any]:
         """
         Add documents to the knowledge base.
 
         Args:
-            documents: List of documents with 'content', 'source', and optional 'metadata'
+            documents: Documents with 'content', 'source', and optional 'metadata'
+
+        Returns:
+            Per-stage throughput report of the ingestion
+        """
+        return self.data_ingestion.ingest_documents(documents)
+
+    def add_files(self, directory: str, recursive: bool = True) -> Dict[str, Any]:
+        """
+        Add every supported file of a directory (txt, md, html, pdf, jsonl) to the knowledge base.
+
+        Args:
+            directory: Directory containing the knowledge base files
+            recursive: Whether to include subdirectories
+
+        Returns:
+            Per-stage throughput report of the ingestion
+        """
+        file_paths = discover_files(directory, recursive)
+
+        return self.data_ingestion.ingest_files(file_paths)
+
+    def add_text_files(self, directory: str) -> Dict[str, Any]:
+        """
+        Add the .txt files of a directory, without its subdirectories, to the knowledge base.
+
+        Deprecated: use add_files, which also reads md, html, pdf and jsonl files.
+
+        Args:
+            directory: Directory containing the knowledge base files
+        """
+        warnings.warn("RAGPipeline.add_text_files is deprecated, use add_files", DeprecationWarning, stacklevel=2)
+        return self.data_ingestion.ingest_files(extract_text_files(directory))
+
+    def sync_directory(self, directory: str, recursive: bool = True) -> Dict[str, int]:
+        """
+        Incrementally synchronise the knowledge base with the files of a directory.
+
+        Only new or changed chunks are embedded, stale chunks are removed.
+
+        Args:
+            directory: Directory containing the knowledge base files
+            recursive: Whether to include subdirectories
+
+        Returns:
+            Sync counters (unchanged/changed files, embedded/deleted chunks)
         """
-        self.data_ingestion.ingest_documents(documents)
+        if self.read_only:
+            raise RuntimeError("A read-only pipeline can't sync the knowledge base")
+        with self._sync_lock:
+            file_paths = discover_files(directory, recursive)
+            if self._retry_migration:
+                # A failed rebuild left the old collection in place, check its schema again to restart it
+                self._retry_migration = False
+                self.qdrant_manager.ensure_collection()
+            migrating = self.qdrant_manager.migrating
+            if migrating:
+                # The rebuilt collection starts empty and gets a manifest of its own, which
+                # replaces the served collection's one only once the swap is done
+                manifest = IngestionManifest(f"{self.manifest_path}.migrating")
+                manifest.clear()
+            else:
+                manifest = IngestionManifest(self.manifest_path)
+            try:
+                stats = self.data_ingestion.sync_files(file_paths, manifest, root=directory)
+            except Exception:
+                if migrating:
+                    logger.error("Rebuilding the collection failed, keeping the old one")
+                    self.qdrant_manager.abort_migration()
+                    self._retry_migration = True
+                    if os.path.exists(manifest.path):
+                        os.remove(manifest.path)
+                raise
+            if migrating:
+                self.qdrant_manager.finish_migration()
+                os.replace(manifest.path, self.manifest_path)
+            return stats
 
-    def add_text_files(self, directory: str):
+    def watch_directory(self, directory: str, interval: float = 10.0, recursive: bool = True) -> DirectoryWatcher:
         """
-        Add text files to the knowledge base.
+        Keep the knowledge base in sync with a directory while the process runs.
 
         Args:
-            file_paths: List of file paths to ingest
+            directory: Directory containing the knowledge base files
+            interval: Seconds between two scans of the directory
+            recursive: Whether to include subdirectories
+
+        Returns:
+            The started watcher, also stopped by close()
         """
-        file_paths = extract_text_files(directory)
-        
-        self.data_ingestion.ingest_text_files(file_paths)
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.watcher = DirectoryWatcher(directory, lambda: self.sync_directory(directory, recursive), interval, recursive)
+        self.watcher.start()
+        return self.watcher
 
     def search(self,
                query: str,
                limit: int = 5,
-               score_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+               score_threshold: Optional[float] = None,
+               query_embedding: Optional[List[float]] = None,
+               filters: Optional[Filters] = None,
+               language: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents.
 
@@ -67,21 +235,79 @@ class RAGPipeline:
             query: Search query
             limit: Maximum number of results
             score_threshold: Minimum similarity score
+            query_embedding: Precomputed query embedding to reuse
+            filters: Payload filters pushed down to the vector store
+            language: Language of the query, routes the search to chunks in that language
 
         Returns:
             List of relevant documents
         """
-        return self.retriever.search(query, limit, score_threshold)
+        dense_filters, lexical_filters = self._route(language, filters)
+        if self.use_hybrid_search:
+            return self.retriever.hybrid_search(query, None, limit, dense_filters, score_threshold, query_embedding,
+                                                lexical_filters)
+        return self.retriever.search(query, limit, score_threshold, query_embedding, dense_filters)
+
+    async def asearch(self,
+                      query: str,
+                      limit: int = 5,
+                      score_threshold: Optional[float] = None,
+                      query_embedding: Optional[List[float]] = None,
+                      filters: Optional[Filters] = None,
+                      language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Search for relevant documents without blocking the event loop.
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+            score_threshold: Minimum similarity score
+            query_embedding: Precomputed query embedding to reuse
+            filters: Payload filters pushed down to the vector store
+            language: Language of the query, routes the search to chunks in that language
+
+        Returns:
+            List of relevant documents
+        """
+        dense_filters, lexical_filters = self._route(language, filters)
+        if self.use_hybrid_search:
+            return await self.retriever.ahybrid_search(query, None, limit, dense_filters, score_threshold,
+                                                       query_embedding, lexical_filters)
+        return await self.retriever.asearch(query, limit, score_threshold, query_embedding, dense_filters)
+
+    def _route(self, language: Optional[str], filters: Optional[Filters]):
+        """Dense and lexical filters for a query in `language` (see language.route_filters)."""
+        if not language:
+            return filters, filters
+        available = self.lexical_index.languages()
+        if language != 'en' and not self.model.multilingual and language not in available \
+                and language not in self._warned_languages:
+            self._warned_languages.add(language)
+            logger.warning(f"Queries in '{language}' are matched against other languages by {self.model.name}, "
+                           f"which is English-only; set EMBEDDING_MODEL to a multilingual model such as "
+                           f"sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        return route_filters(language, available, self.model.multilingual, filters)
+
+    def build_lexical_index(self):
+        """Rebuild the BM25 index from every chunk currently stored in the vector store."""
+        self.lexical_index.build(self.qdrant_manager.iter_documents())
+
+    def add_removal_listener(self, listener: Callable[[List[str]], None]):
+        """
+        Register a callback called with the ids of chunks deleted by a sync.
+
+        Args:
+            listener: Callable receiving the list of removed chunk ids
+        """
+        self.data_ingestion.removal_listeners.append(listener)
 
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base."""
         try:
-            info = self.qdrant_manager.get_collection_info()
             return {
                 'collection_name': self.collection_name,
-                'total_documents': info.points_count if info else 0,
-                'vector_size': info.config.params.vectors.size if info else 0,
-                'distance_metric': info.config.params.vectors.distance if info else 'unknown'
+                **self.qdrant_manager.describe(),
+                'embedding_cache': self.embedding_manager.cache_stats()
             }
         except Exception as e:
             logger.error(f"Failed to get collection stats: {e}")
@@ -95,6 +321,24 @@ class RAGPipeline:
         except Exception as e:
             logger.error(f"Cleanup failed: {e}")
 
+    def stop_watching(self):
+        """Stop the directory watcher, if any."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def close(self):
+        """Release the vector database connection without touching the collection."""
+        self.stop_watching()
+        self.qdrant_manager.close()
+        self.embedding_manager.close()
+
+    async def aclose(self):
+        """Release sync and async connections without touching the collection."""
+        self.stop_watching()
+        await self.qdrant_manager.aclose()
+        self.embedding_manager.close()
+
     def __enter__(self):
         """Context manager entry."""
         return self
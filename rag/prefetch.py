@@ -0,0 +1,95 @@
+"""
+Fetch everything the bot would otherwise download or compute on its first start.
+
+Run at build time (Railway runs it as the build command, see railway.json) so
+the image ships with the FastEmbed models in MODEL_CACHE_DIR and, unless
+--no-data is given, with the embeddings of the knowledge base in the
+persistent embedding cache. A fresh process then loads the models from disk
+without touching the network and a sync into an empty collection only has to
+upload vectors, not compute them.
+
+    python -m rag.prefetch
+    python -m rag.prefetch --model sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2 --no-data
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from .context_builder import DEFAULT_RERANKER_MODEL
+from .models import DEFAULT_EMBEDDING_MODEL, MODEL_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def prefetch_models(embedding_model: str, reranker_model: str = DEFAULT_RERANKER_MODEL,
+                    cache_dir: str = MODEL_CACHE_DIR):
+    """
+    Download the embedding and reranker ONNX models into `cache_dir`.
+
+    Args:
+        embedding_model: FastEmbed embedding model name
+        reranker_model: FastEmbed cross-encoder name, empty to skip it
+        cache_dir: Directory the bot loads the models from
+    """
+    from fastembed import TextEmbedding
+    from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+    start = time.perf_counter()
+    TextEmbedding(model_name=embedding_model, cache_dir=cache_dir)
+    logger.info("Fetched embedding model %s in %.1fs", embedding_model, time.perf_counter() - start)
+    if reranker_model:
+        start = time.perf_counter()
+        TextCrossEncoder(model_name=reranker_model, cache_dir=cache_dir)
+        logger.info("Fetched reranker %s in %.1fs", reranker_model, time.perf_counter() - start)
+
+
+def prefetch_embeddings(data_directory: str, embedding_model: str,
+                        embedding_cache_dir: str = os.path.join(".hyppo", "embeddings")):
+    """
+    Embed the knowledge base into the persistent embedding cache.
+
+    The chunks go through a throwaway local index, so the result is exactly what
+    a sync would embed, whatever vector backend the bot uses at runtime.
+
+    Args:
+        data_directory: Directory with the knowledge base files
+        embedding_model: FastEmbed embedding model name
+        embedding_cache_dir: Directory of the embedding cache the bot reads
+    """
+    from .pipeline import RAGPipeline
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as scratch:
+        rag = RAGPipeline("prefetch", embedding_model, recreate_collection=True,
+                          manifest_path=os.path.join(scratch, "manifest.json"),
+                          embedding_cache_dir=embedding_cache_dir, vector_backend="local",
+                          index_directory=scratch)
+        try:
+            stats = rag.sync_directory(data_directory)
+        finally:
+            rag.close()
+    logger.info("Embedded %d chunks of %s in %.1fs", stats['embedded_chunks'], data_directory,
+                time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+                        help="embedding model, EMBEDDING_MODEL by default")
+    parser.add_argument("--reranker", default=os.getenv("RERANKER_MODEL", DEFAULT_RERANKER_MODEL),
+                        help="cross-encoder, RERANKER_MODEL by default, empty to skip it")
+    parser.add_argument("--data", default="data", help="knowledge base directory")
+    parser.add_argument("--no-data", action="store_true", help="only fetch the models")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO,
+                        force=True)
+
+    prefetch_models(args.model, args.reranker)
+    if not args.no_data:
+        prefetch_embeddings(args.data, args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,274 @@
 from dotenv import load_dotenv
+import asyncio
 import os
 from qdrant_client.models import Distance, VectorParams
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (PointStruct, Filter, FieldCondition, MatchValue, MatchAny, MatchText,
+                                  PointIdsList, FilterSelector, PayloadSchemaType, QueryRequest,
+                                  ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+                                  BinaryQuantization, BinaryQuantizationConfig, Disabled,
+                                  SearchParams, QuantizationSearchParams, VectorParamsDiff,
+                                  CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation,
+                                  OverwritePayloadOperation, SetPayload)
 import logging
-from typing import List, Dict, Any, Optional
+import uuid
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+from .vector_store import VectorStore, Filters, TextMatch, INDEXED_PAYLOAD_KEYS
+from .quantization import VectorCompression, make_reducer
+from .models import CollectionSchema, EmbeddingModelSpec, EmbeddingModelMismatch
+
+
+def build_filter(filters: Optional[Filters]) -> Optional[Filter]:
+    """
+    Translate a filters dictionary into a Qdrant Filter.
+
+    Args:
+        filters: Mapping of payload key to value, list of values or TextMatch
+
+    Returns:
+        Qdrant Filter with one must condition per key, or None without filters
+    """
+    if not filters:
+        return None
+    conditions = []
+    for key, expected in filters.items():
+        if isinstance(expected, TextMatch):
+            match = MatchText(text=expected.text)
+        elif isinstance(expected, (list, tuple, set)):
+            match = MatchAny(any=list(expected))
+        else:
+            match = MatchValue(value=expected)
+        conditions.append(FieldCondition(key=key, match=match))
+    return Filter(must=conditions)
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
 
-class QdrantManager:
-    def __init__(self, collection_name: str = "chatbot_knowledge", recreate: bool = True):
+class QdrantManager(VectorStore):
+    def __init__(self,
+                 collection_name: str = "chatbot_knowledge",
+                 recreate: bool = True,
+                 vector_size: int = 384,
+                 compression: Optional[VectorCompression] = None,
+                 model: Optional[EmbeddingModelSpec] = None,
+                 on_mismatch: str = "refuse"):
         """
         Initialize Qdrant client and create collection on startup.
-        Collection will be recreated fresh each time on startup, but during execution it will be kept the same.
+        With recreate the collection is dropped and created fresh, otherwise it is
+        only created when missing so existing points survive restarts.
+
+        collection_name is an alias of a versioned physical collection, and the
+        collection metadata records the embedding model and vector schema. When an
+        existing collection was built with another schema the store either refuses
+        to start or, with on_mismatch="migrate", fills a new collection that
+        finish_migration() swaps in under the alias. Searches keep reading the
+        alias while the writes of the rebuild go to write_collection.
+
+        Args:
+            collection_name: Qdrant collection name (alias)
+            recreate: Drop and recreate the collection on startup
+            vector_size: Dimension of the embeddings handed to the store, when no model is given
+            compression: Quantization, on-disk storage and dimension reduction settings
+            model: Embedding model spec, sets the vector size and distance
+            on_mismatch: "refuse" (raise EmbeddingModelMismatch) or "migrate"
         """
+        if on_mismatch not in ("refuse", "migrate"):
+            raise ValueError(f"Unknown model mismatch policy: {on_mismatch}")
         qdrant_url = os.getenv("QDRANT_URL")
         qdrant_api_key = os.getenv("QDRANT_API_KEY")
 
-        self.client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+        if qdrant_url == ":memory:":
+            # Embedded in-process Qdrant (tests, benchmarks). An async client would get its
+            # own empty storage, so async queries run the sync client on a worker thread.
+            self.client = QdrantClient(location=":memory:")
+            self.async_client = None
+        else:
+            self.client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+            self.async_client = AsyncQdrantClient(url=qdrant_url, api_key=qdrant_api_key)
 
         self.collection_name = collection_name
+        self.alias = collection_name
+        # Target of upserts, deletes and the sync's own reads: the collection being rebuilt while migrating
+        self.write_collection = collection_name
+        self.model = model
+        self.on_mismatch = on_mismatch
+        self.compression = compression or VectorCompression()
+        self.vector_size = self.compression.dimensions or (model.dimensions if model else vector_size)
+        self.distance = Distance.DOT if model is None or model.normalized else Distance.COSINE
+        self.schema = CollectionSchema(model.name if model else None, self.vector_size, self.distance.value)
+        self.search_params = None
+        if self.compression.quantized:
+            self.search_params = SearchParams(quantization=QuantizationSearchParams(
+                rescore=self.compression.rescore, oversampling=self.compression.oversampling
+            ))
 
         if recreate:
             # Delete collection if it exists, then create fresh
             self._recreate_collection()
+        else:
+            self.ensure_collection()
+        # A PCA projection belongs to one physical collection, a rebuilt one is fitted again
+        self.reducer = make_reducer(self.compression, os.path.join(".hyppo", f"pca-{self._physical_name()}.npz"))
+
+    def _physical_name(self) -> str:
+        """Collection the alias (or the collection being migrated to) currently points at."""
+        if self.migrating:
+            return self.write_collection
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.alias:
+                return alias.collection_name
+        return self.alias
+
+    def _new_physical_name(self) -> str:
+        return f"{self.alias}-{uuid.uuid4().hex[:8]}"
 
     def _recreate_collection(self):
         """Delete existing collection and create a new one."""
         try:
             # Try to delete existing collection
-            self.client.delete_collection(collection_name=self.collection_name)
+            self.client.delete_collection(collection_name=self._physical_name())
             logging.info(f"Deleted existing collection: {self.collection_name}")
         except Exception as e:
             logging.info(f"Collection {self.collection_name} didn't exist or couldn't be deleted: {e}")
 
-        # Create new collection
+        self._create_aliased_collection()
+        logging.info(f"Created fresh collection: {self.collection_name}")
+
+    def ensure_collection(self) -> bool:
+        """
+        Create the collection only if it does not exist yet, and check its schema.
+
+        Returns:
+            True if the collection was created, False if it already existed
+        """
+        if not self.client.collection_exists(self.collection_name):
+            self._create_aliased_collection()
+            logging.info(f"Created missing collection: {self.collection_name}")
+            return True
+
+        info = self.client.get_collection(self.collection_name)
+        stored = CollectionSchema.from_metadata(info.config.metadata)
+        if stored is None:
+            # Collections created before the schema was recorded only know their vector params
+            stored = CollectionSchema(None, info.config.params.vectors.size, info.config.params.vectors.distance.value)
+            if not self.schema.differences(stored):
+                self.client.update_collection(self.collection_name, metadata=self.schema.to_metadata())
+                logging.warning(f"Recorded schema {self.schema} on collection {self.collection_name}, "
+                                f"assuming it was built with this model")
+
+        differences = self.schema.differences(stored)
+        if differences:
+            self._handle_mismatch(differences)
+            return True
+
+        self._create_payload_indexes()
+        self._update_storage()
+        return False
+
+    def _handle_mismatch(self, differences: List[str]):
+        message = f"Collection {self.collection_name} was built with a different schema: {', '.join(differences)}"
+        if self.on_mismatch == "refuse":
+            raise EmbeddingModelMismatch(
+                f"{message}. Re-ingest with on_mismatch='migrate' (EMBEDDING_MODEL_MISMATCH=migrate) or use the original model"
+            )
+        target = self._new_physical_name()
+        logging.warning(f"{message}; rebuilding it as {target}, searches stay on {self.alias} until the swap")
+        self._create_collection(target)
+        self.write_collection = target
+        self.migrating = True
+
+    def finish_migration(self):
+        """Atomically point the alias at the rebuilt collection and drop the old one."""
+        if not self.migrating:
+            return
+        target = self.write_collection
+        self.write_collection = self.alias
+        self.migrating = False
+        old = self._physical_name()
+
+        operations = []
+        if old == self.alias:
+            # A plain collection (from before aliases were used) has to go before the alias can take its name
+            self.client.delete_collection(old)
+            old = None
+        else:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias)))
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=self.alias)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        if old is not None:
+            self.client.delete_collection(old)
+        logging.info(f"Collection {self.alias} now points to {target}")
+
+    def abort_migration(self):
+        """Drop a partly rebuilt collection and go back to writing under the alias."""
+        if not self.migrating:
+            return
+        target = self.write_collection
+        self.write_collection = self.alias
+        self.migrating = False
+        try:
+            self.client.delete_collection(target)
+        except Exception as e:
+            logging.error(f"Failed to drop the partly rebuilt collection {target}: {e}")
+        logging.warning(f"Abandoned the rebuild of {self.alias}, {target} was dropped")
+
+    def _create_aliased_collection(self):
+        target = self._new_physical_name()
+        self._create_collection(target)
+        if self.client.collection_exists(self.alias):
+            # The alias name is still taken by an aliased collection that was just deleted, or a plain one
+            self.client.delete_collection(self.alias)
+        self.client.update_collection_aliases(change_aliases_operations=[
+            CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=self.alias))
+        ])
+
+    def _create_collection(self, name: Optional[str] = None):
+        name = name or self.collection_name
         self.client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(size=self.vector_size, distance=self.distance, on_disk=self.compression.on_disk),
+            quantization_config=self._quantization_config(),
+            metadata=self.schema.to_metadata()
+        )
+        self._create_payload_indexes(name)
+
+    def _quantization_config(self):
+        # Quantized vectors stay in RAM, originals are only read to rescore the candidates
+        if self.compression.mode == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+        if self.compression.mode == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def _update_storage(self):
+        """Apply changed quantization or on-disk settings to an existing collection."""
+        config = self.client.get_collection(self.collection_name).config
+        quantization = self._quantization_config()
+        if config.quantization_config == quantization and bool(config.params.vectors.on_disk) == self.compression.on_disk:
+            return
+        self.client.update_collection(
             collection_name=self.collection_name,
-            vectors_config=VectorParams(size=384, distance=Distance.DOT),
+            vectors_config={"": VectorParamsDiff(on_disk=self.compression.on_disk)},
+            quantization_config=quantization or Disabled.DISABLED
+        )
+        logging.info(f"Updated storage of collection {self.collection_name} to {self.compression}")
+
+    def _create_payload_indexes(self, name: Optional[str] = None):
+        """Index the filterable payload fields and the content for full-text matches (idempotent)."""
+        name = name or self.collection_name
+        for key in INDEXED_PAYLOAD_KEYS:
+            self.client.create_payload_index(
+                collection_name=name,
+                field_name=key,
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+        self.client.create_payload_index(
+            collection_name=name,
+            field_name='content',
+            field_schema=PayloadSchemaType.TEXT
         )
-        logging.info(f"Created fresh collection: {self.collection_name}")
 
     def add_embeddings(self, embeddings: Dict[int, List[float]], metadata: Dict[str, Any]):
         """
@@ -62,102 +289,267 @@ class QdrantManager:
             )
 
         operation_info = self.client.upsert(
-            collection_name=self.collection_name,
+            collection_name=self.write_collection,
             wait=True,
             points=points,
         )
-        logging.info(f"Added {len(points)} embeddings to collection")
-        logging.info(operation_info)
+        logging.info("Added %d embeddings to collection", len(points))
+        logging.debug("Upsert result: %s", operation_info)
 
-    def add_documents(self, documents: List[Dict[str, Any]], embeddings: List[List[float]]):
+    def add_documents(self,
+                      documents: List[Dict[str, Any]],
+                      embeddings: Union[np.ndarray, List[List[float]]],
+                      batch_size: int = 256,
+                      wait: bool = True):
         """
         Add documents with embeddings to the vector database.
 
+        Vectors are uploaded straight from a float32 matrix in batches, so no
+        PointStruct or Python float list is built for the whole corpus at once.
+
         Args:
             documents: List of document dictionaries with content and metadata
-            embeddings: List of embedding vectors corresponding to documents
+            embeddings: (n, dim) matrix or list of embedding vectors, one per document
+            batch_size: Number of points per upsert request
+            wait: Wait for each batch to be applied before returning
         """
         if len(documents) != len(embeddings):
             raise ValueError("Number of documents must match number of embeddings")
+        if not documents:
+            return
+        embeddings = self._prepare(embeddings)
 
-        points = []
-        for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-            points.append(
-                PointStruct(
-                    id=doc.get('id', i),
-                    vector=embedding,
-                    payload={
-                        'content': doc.get('content', ''),
-                        'source': doc.get('source', 'unknown'),
-                        'metadata': doc.get('metadata', {})
-                    }
-                )
+        self.client.upload_collection(
+            collection_name=self.write_collection,
+            vectors=embeddings,
+            payload=(self._payload(doc) for doc in documents),
+            ids=[doc.get('id', i) for i, doc in enumerate(documents)],
+            batch_size=batch_size,
+            wait=wait
+        )
+        logging.info("Added %d documents to collection", len(documents))
+
+    def update_payloads(self, documents: List[Dict[str, Any]], batch_size: int = 256):
+        """
+        Overwrite the payload of existing points without re-uploading their vectors.
+
+        Args:
+            documents: Chunks whose id is already stored, with their new content, source and metadata
+            batch_size: Number of payload updates per request
+        """
+        for start in range(0, len(documents), batch_size):
+            self.client.batch_update_points(
+                collection_name=self.write_collection,
+                update_operations=[
+                    OverwritePayloadOperation(overwrite_payload=SetPayload(payload=self._payload(doc), points=[doc['id']]))
+                    for doc in documents[start:start + batch_size]
+                ],
+                wait=True
             )
+        if documents:
+            logging.info("Updated the payload of %d points", len(documents))
 
-        operation_info = self.client.upsert(
-            collection_name=self.collection_name,
-            wait=True,
-            points=points,
-        )
-        logging.info(f"Added {len(points)} documents to collection")
-        logging.info(operation_info)
+    @staticmethod
+    def _payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'content': doc.get('content', ''),
+            'source': doc.get('source', 'unknown'),
+            'metadata': doc.get('metadata', {})
+        }
 
-    def query(self, query_embedding: List[float], limit: int = 5):
+    def query(self, query_embedding: List[float], limit: int = 5, filters: Optional[Filters] = None):
         """
         Query the vector database for similar documents.
 
         Args:
             query_embedding: Embedding vector of the query
             limit: Maximum number of results to return
+            filters: Payload conditions evaluated by Qdrant using the payload indexes
 
         Returns:
             List of similar documents with scores and metadata
         """
         search_result = self.client.query_points(
             collection_name=self.collection_name,
-            query=query_embedding,
+            query=self._prepare(query_embedding)[0].tolist(),
+            query_filter=build_filter(filters),
+            search_params=self.search_params,
             with_payload=True,
-            with_vectors=True,
+            with_vectors=False,
             limit=limit
         ).points
 
         return search_result
 
-    def search_documents(self, query_embedding: List[float], limit: int = 5, score_threshold: Optional[float] = None):
+    async def aquery(self, query_embedding: List[float], limit: int = 5, filters: Optional[Filters] = None):
         """
-        Search for similar documents with optional score filtering.
+        Query the vector database without blocking the event loop.
 
         Args:
             query_embedding: Embedding vector of the query
             limit: Maximum number of results to return
-            score_threshold: Minimum similarity score threshold
+            filters: Payload conditions evaluated by Qdrant using the payload indexes
+
+        Returns:
+            List of similar documents with scores and metadata
+        """
+        if self.async_client is None:
+            return await asyncio.to_thread(self.query, query_embedding, limit, filters)
+        response = await self.async_client.query_points(
+            collection_name=self.collection_name,
+            query=self._prepare(query_embedding)[0].tolist(),
+            query_filter=build_filter(filters),
+            search_params=self.search_params,
+            with_payload=True,
+            with_vectors=False,
+            limit=limit
+        )
+        return response.points
+
+    def _batch_requests(self, query_embeddings, limit: int, filters: Optional[Filters]) -> List[QueryRequest]:
+        query_filter = build_filter(filters)
+        return [
+            QueryRequest(query=embedding.tolist(), filter=query_filter, params=self.search_params,
+                         limit=limit, with_payload=True, with_vector=False)
+            for embedding in self._prepare(query_embeddings)
+        ]
+
+    def query_batch(self, query_embeddings, limit: int = 5, filters: Optional[Filters] = None):
+        """
+        Run several queries in a single query_batch_points request.
+
+        Args:
+            query_embeddings: (n, dim) matrix or list of query vectors
+            limit: Maximum number of results per query
+            filters: Payload conditions shared by all queries
+
+        Returns:
+            One list of scored points per query
+        """
+        if len(query_embeddings) == 0:
+            return []
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(query_embeddings, limit, filters)
+        )
+        return [response.points for response in responses]
+
+    async def aquery_batch(self, query_embeddings, limit: int = 5, filters: Optional[Filters] = None):
+        """Async version of query_batch."""
+        if len(query_embeddings) == 0:
+            return []
+        if self.async_client is None:
+            return await asyncio.to_thread(self.query_batch, query_embeddings, limit, filters)
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=self._batch_requests(query_embeddings, limit, filters)
+        )
+        return [response.points for response in responses]
+
+    def count(self) -> int:
+        """Exact number of points in the collection (the one being rebuilt while migrating)."""
+        return self.client.count(collection_name=self.write_collection, exact=True).count
+
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        """
+        Scroll the collection (the one being rebuilt while migrating) and group point ids by their source.
 
         Returns:
-            List of search results with formatted output
+            Mapping of source to the set of point ids stored for it
         """
-        results = self.query(query_embedding, limit)
+        ids_by_source: Dict[str, Set[str]] = {}
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.write_collection,
+                with_payload=['source'],
+                with_vectors=False,
+                limit=1000,
+                offset=offset
+            )
+            for record in records:
+                source = (record.payload or {}).get('source', 'unknown')
+                ids_by_source.setdefault(source, set()).add(str(record.id))
+            if offset is None:
+                return ids_by_source
 
-        formatted_results = []
-        for result in results:
-            if score_threshold is None or result.score >= score_threshold:
-                formatted_results.append({
-                    'id': result.id,
-                    'score': result.score,
-                    'content': result.payload.get('content', ''),
-                    'source': result.payload.get('source', 'unknown'),
-                    'metadata': result.payload.get('metadata', {})
-                })
+    def iter_documents(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Scroll the whole collection, yielding (point id, payload)."""
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                with_payload=True,
+                with_vectors=False,
+                limit=1000,
+                offset=offset
+            )
+            for record in records:
+                yield str(record.id), record.payload or {}
+            if offset is None:
+                return
 
-        return formatted_results
+    def delete_points(self, point_ids: List[str]):
+        """
+        Delete points by id.
+
+        Args:
+            point_ids: Ids of the points to delete
+        """
+        if not point_ids:
+            return
+        self.client.delete(
+            collection_name=self.write_collection,
+            points_selector=PointIdsList(points=list(point_ids)),
+            wait=True
+        )
+        logging.info(f"Deleted {len(point_ids)} points from collection")
+
+    def delete_by_source(self, source: str):
+        """
+        Delete every point coming from a source.
+
+        Args:
+            source: Source identifier stored in the point payload
+        """
+        self.client.delete(
+            collection_name=self.write_collection,
+            points_selector=FilterSelector(
+                filter=build_filter({'source': source})
+            ),
+            wait=True
+        )
+        logging.info(f"Deleted points of source {source}")
 
     def clear_db(self):
         """Delete the collection and clean up."""
         try:
-            self.client.delete_collection(collection_name=self.collection_name)
+            self.client.delete_collection(collection_name=self._physical_name())
             logging.info(f"Deleted collection: {self.collection_name}")
         except Exception as e:
             logging.error(f"Failed to delete collection: {e}")
 
+    def close(self):
+        """Close the Qdrant client connection."""
+        self.client.close()
+
+    async def aclose(self):
+        """Close both the sync and the async Qdrant connections."""
+        self.client.close()
+        if self.async_client is not None:
+            await self.async_client.close()
+
+    def describe(self) -> Dict[str, Any]:
+        info = self.get_collection_info()
+        return {
+            'total_documents': info.points_count if info else 0,
+            'vector_size': info.config.params.vectors.size if info else 0,
+            'distance_metric': info.config.params.vectors.distance if info else 'unknown',
+            'embedding_model': (info.config.metadata or {}).get('embedding_model') if info else None,
+            'quantization': self.compression.mode,
+            'on_disk': self.compression.on_disk
+        }
+
     def get_collection_info(self):
         """Get information about the current collection."""
         try:
@@ -0,0 +1,203 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per block when decoding quantized vectors, bounds the temporary float matrix
+SCORE_BLOCK_ROWS = 16384
+
+
+@dataclass
+class VectorCompression:
+    """
+    How vectors are stored.
+
+    mode is "none" (float32), "scalar" (int8, 4x smaller) or "binary" (1 bit per
+    dimension, 32x smaller). Quantized scores are approximate, so with rescore the
+    best limit * oversampling candidates are re-ranked with the original vectors.
+    on_disk keeps the original vectors in a memory-mapped file instead of RAM.
+    dimensions reduces every vector before storage, either by truncation
+    ("matryoshka", for models trained for it) or with a PCA fitted on the corpus.
+    """
+    mode: str = "none"
+    rescore: bool = True
+    oversampling: float = 3.0
+    on_disk: bool = False
+    dimensions: Optional[int] = None
+    reduction: str = "matryoshka"
+
+    def __post_init__(self):
+        if self.mode not in ("none", "scalar", "binary"):
+            raise ValueError(f"Unknown quantization mode: {self.mode}")
+        if self.reduction not in ("matryoshka", "pca"):
+            raise ValueError(f"Unknown dimension reduction: {self.reduction}")
+
+    @property
+    def quantized(self) -> bool:
+        return self.mode != "none"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class MatryoshkaReducer:
+    def __init__(self, dimensions: int):
+        """Keep the first `dimensions` components and renormalize, for Matryoshka-trained models."""
+        self.dimensions = dimensions
+
+    @property
+    def fitted(self) -> bool:
+        return True
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return _normalize(vectors[:, :self.dimensions])
+
+
+class PCAReducer:
+    def __init__(self, dimensions: int, path: Optional[str] = None):
+        """
+        Project vectors on the principal components of the corpus and renormalize.
+
+        Args:
+            dimensions: Number of components kept
+            path: .npz file where the fitted projection is persisted and loaded from
+        """
+        self.dimensions = dimensions
+        self.path = path
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        if path and os.path.exists(path):
+            data = np.load(path)
+            self.mean, self.components = data['mean'], data['components']
+            if self.components.shape[0] != dimensions:
+                logger.warning(f"PCA projection in {path} has {self.components.shape[0]} components, refitting")
+                self.mean, self.components = None, None
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    def fit(self, vectors: np.ndarray):
+        """
+        Fit the projection on a sample of embeddings.
+
+        A sample smaller than `dimensions` only has that many principal components:
+        the missing ones are left at zero, so vectors keep the configured size
+        (and the collection its schema) while ranking like the smaller projection.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            logger.warning("No vectors to fit the PCA projection on, it will be fitted by the next sync")
+            return
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        kept = min(self.dimensions, len(vt))
+        if kept < self.dimensions:
+            logger.warning(f"Only {len(vectors)} vectors to fit a PCA to {self.dimensions} dimensions, keeping {kept} "
+                           f"components; delete {self.path or 'the projection'} and resync to refit on a larger corpus")
+        self.components = np.zeros((self.dimensions, vectors.shape[1]), dtype=np.float32)
+        self.components[:kept] = vt[:kept]
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            np.savez(self.path, mean=self.mean, components=self.components)
+        logger.info(f"Fitted PCA projection to {self.dimensions} dimensions on {len(vectors)} vectors")
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        if not self.fitted:
+            raise RuntimeError("PCA projection is not fitted, sync the knowledge base to fit it on the corpus")
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return _normalize((vectors - self.mean) @ self.components.T)
+
+
+def make_reducer(compression: VectorCompression, path: Optional[str] = None):
+    """Dimension reducer described by the compression settings, or None."""
+    if not compression.dimensions:
+        return None
+    if compression.reduction == "pca":
+        return PCAReducer(compression.dimensions, path)
+    return MatryoshkaReducer(compression.dimensions)
+
+
+class ScalarQuantizer:
+    def __init__(self, quantile: float = 0.99):
+        """
+        int8 codes with per-dimension bounds taken from quantiles of the data.
+
+        Args:
+            quantile: Fraction of values kept inside the bounds, outliers are clipped
+        """
+        self.quantile = quantile
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.low is not None
+
+    def code_size(self, dimensions: int) -> int:
+        return dimensions
+
+    def fit(self, vectors: np.ndarray):
+        tail = (1 - self.quantile) / 2
+        self.low = np.quantile(vectors, tail, axis=0).astype(np.float32)
+        high = np.quantile(vectors, 1 - tail, axis=0).astype(np.float32)
+        self.scale = np.maximum(high - self.low, 1e-12) / 255
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate dot products: q . (low + codes * scale)."""
+        weights = (query * self.scale).astype(np.float32)
+        offset = float(query @ self.low)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.float32) @ weights + offset
+        return out
+
+
+class BinaryQuantizer:
+    """Sign bits packed 8 per byte; the query stays in float (asymmetric scoring)."""
+
+    fitted = True
+
+    def code_size(self, dimensions: int) -> int:
+        return (dimensions + 7) // 8
+
+    def fit(self, vectors: np.ndarray):
+        pass
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate dot products: q . sign(x), computed as 2 * q . bits - sum(q)."""
+        query = query.astype(np.float32)
+        total = float(query.sum())
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS]
+            bits = np.unpackbits(block, axis=1, count=len(query))
+            out[start:start + len(block)] = 2 * (bits.astype(np.float32) @ query) - total
+        return out
+
+
+def make_quantizer(compression: VectorCompression):
+    """Local quantizer described by the compression settings, or None."""
+    if compression.mode == "scalar":
+        return ScalarQuantizer()
+    if compression.mode == "binary":
+        return BinaryQuantizer()
+    return None
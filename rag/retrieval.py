@@ -1,6 +1,10 @@
 from typing import List, Dict, Any, Optional
 import logging
+import time
 from .embeddings import EmbeddingManager
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .vector_store import Filters, TextMatch
+from telemetry.metrics import stage
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +24,9 @@ class DocumentRetriever:
     def search(self,
                query: str,
                limit: int = 5,
-               score_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+               score_threshold: Optional[float] = None,
+               query_embedding: Optional[List[float]] = None,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents based on a text query.
 
@@ -28,28 +34,106 @@ class DocumentRetriever:
             query: Search query text
             limit: Maximum number of results to return
             score_threshold: Minimum similarity score threshold
+            query_embedding: Precomputed query embedding, skips embedding the query again
+            filters: Payload filters applied by the vector store (e.g. {'source': ...})
 
         Returns:
             List of relevant documents with scores and metadata
         """
         try:
             # Generate embedding for query
-            query_embedding = self.embedding_manager.embed_query(query)
+            if query_embedding is None:
+                query_embedding = self.embedding_manager.embed_query(query)
 
             # Search in vector database
-            results = self.qdrant_manager.search_documents(
-                query_embedding=query_embedding,
-                limit=limit,
-                score_threshold=score_threshold
-            )
+            with stage('vector_search'):
+                results = self.qdrant_manager.search_documents(
+                    query_embedding=query_embedding,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    filters=filters
+                )
+
+            logger.debug("Found %d relevant documents for query %.50r", len(results), query,
+                         extra={'results': len(results), 'limit': limit})
+            return results
+
+        except Exception as e:
+            logger.error(f"Search failed for query '{query}': {e}")
+            raise
+
+    async def asearch(self,
+                      query: str,
+                      limit: int = 5,
+                      score_threshold: Optional[float] = None,
+                      query_embedding: Optional[List[float]] = None,
+                      filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Async version of search: embeds on the embedding thread pool and queries Qdrant asynchronously.
 
-            logger.info(f"Found {len(results)} relevant documents for query: '{query[:50]}...'")
+        Args:
+            query: Search query text
+            limit: Maximum number of results to return
+            score_threshold: Minimum similarity score threshold
+            query_embedding: Precomputed query embedding, skips embedding the query again
+            filters: Payload filters applied by the vector store (e.g. {'source': ...})
+
+        Returns:
+            List of relevant documents with scores and metadata
+        """
+        try:
+            if query_embedding is None:
+                query_embedding = await self.embedding_manager.aembed_query(query)
+
+            with stage('vector_search'):
+                results = await self.qdrant_manager.asearch_documents(
+                    query_embedding=query_embedding,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    filters=filters
+                )
+
+            logger.debug("Found %d relevant documents for query %.50r", len(results), query,
+                         extra={'results': len(results), 'limit': limit})
             return results
 
         except Exception as e:
             logger.error(f"Search failed for query '{query}': {e}")
             raise
 
+    def search_batch(self,
+                     queries: List[str],
+                     limit: int = 5,
+                     score_threshold: Optional[float] = None,
+                     filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries with one embedding pass and one vector store round trip.
+
+        Args:
+            queries: Search query texts
+            limit: Maximum number of results per query
+            score_threshold: Minimum similarity score threshold
+            filters: Payload filters shared by all queries
+
+        Returns:
+            One result list per query
+        """
+        if not queries:
+            return []
+        query_embeddings = self.embedding_manager.embed_queries(queries)
+        return self.qdrant_manager.search_documents_batch(query_embeddings, limit, score_threshold, filters)
+
+    async def asearch_batch(self,
+                            queries: List[str],
+                            limit: int = 5,
+                            score_threshold: Optional[float] = None,
+                            filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """Async version of search_batch."""
+        if not queries:
+            return []
+        query_embeddings = await self.embedding_manager.aembed_queries(queries)
+        return await self.qdrant_manager.asearch_documents_batch(query_embeddings, limit, score_threshold, filters)
+
     def get_context(self,
                     query: str,
                     limit: int = 3,
@@ -111,47 +195,106 @@ class DocumentRetriever:
         Returns:
             List of relevant documents from the specified source
         """
-        all_results = self.search(query, limit * 2)  # Get more results to filter
-        filtered_results = [
-            result for result in all_results
-            if result['source'] == source_filter
-        ]
-        return filtered_results[:limit]
+        return self.search(query, limit, filters={'source': source_filter})
 
 
 class AdvancedRetriever(DocumentRetriever):
     """Extended retriever with additional search strategies."""
 
+    def __init__(self,
+                 qdrant_manager,
+                 embedding_manager: Optional[EmbeddingManager] = None,
+                 lexical_index: Optional[BM25Index] = None,
+                 candidates: int = 20,
+                 rrf_k: int = 60):
+        """
+        Initialize advanced retriever.
+
+        Args:
+            qdrant_manager: QdrantManager instance
+            embedding_manager: EmbeddingManager instance for query embeddings
+            lexical_index: BM25 index fused with dense results in hybrid search
+            candidates: Results fetched from each ranker before fusion
+            rrf_k: Reciprocal rank fusion constant
+        """
+        super().__init__(qdrant_manager, embedding_manager)
+        self.lexical_index = lexical_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
     def hybrid_search(self,
                      query: str,
                      keywords: List[str] = None,
-                     limit: int = 5) -> List[Dict[str, Any]]:
+                     limit: int = 5,
+                     filters: Optional[Filters] = None,
+                     score_threshold: Optional[float] = None,
+                     query_embedding: Optional[List[float]] = None,
+                     lexical_filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
         """
-        Combine vector search with keyword-based filtering.
+        Combine dense vector search with BM25 lexical search using reciprocal rank fusion.
 
         Args:
             query: Main search query
             keywords: Additional keywords that must be present
             limit: Maximum number of results
+            filters: Payload filters applied to both rankers
+            score_threshold: Minimum similarity score of dense results
+            query_embedding: Precomputed query embedding to reuse
+            lexical_filters: Filters of the BM25 ranker when they differ from the dense ones
+                (e.g. restricted to the query language)
 
         Returns:
-            List of documents matching both vector similarity and keywords
+            Fused results, scored by RRF
         """
-        # Get initial vector search results
-        vector_results = self.search(query, limit * 2)
-
+        lexical_filters = self._keyword_filters(keywords, filters if lexical_filters is None else lexical_filters)
+        filters = self._keyword_filters(keywords, filters)
+        start = time.perf_counter()
+        dense_results = self.search(query, max(limit, self.candidates), score_threshold, query_embedding, filters)
+        return self._fuse(query, keywords, limit, lexical_filters, dense_results, start)
+
+    async def ahybrid_search(self,
+                             query: str,
+                             keywords: List[str] = None,
+                             limit: int = 5,
+                             filters: Optional[Filters] = None,
+                             score_threshold: Optional[float] = None,
+                             query_embedding: Optional[List[float]] = None,
+                             lexical_filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """Async version of hybrid_search."""
+        lexical_filters = self._keyword_filters(keywords, filters if lexical_filters is None else lexical_filters)
+        filters = self._keyword_filters(keywords, filters)
+        start = time.perf_counter()
+        dense_results = await self.asearch(query, max(limit, self.candidates), score_threshold, query_embedding, filters)
+        return self._fuse(query, keywords, limit, lexical_filters, dense_results, start)
+
+    @staticmethod
+    def _keyword_filters(keywords: Optional[List[str]], filters: Optional[Filters]) -> Optional[Filters]:
         if not keywords:
-            return vector_results[:limit]
-
-        # Filter by keywords
-        filtered_results = []
-        for result in vector_results:
-            content_lower = result['content'].lower()
-            if all(keyword.lower() in content_lower for keyword in keywords):
-                filtered_results.append(result)
-
-        logger.info(f"Hybrid search found {len(filtered_results)} documents with keywords {keywords}")
-        return filtered_results[:limit]
+            return filters
+        # Required keywords are matched by the vector store's full-text index, not after ranking
+        return {**(filters or {}), 'content': TextMatch(" ".join(keywords))}
+
+    def _fuse(self, query, keywords, limit, filters, dense_results, start) -> List[Dict[str, Any]]:
+        dense_done = time.perf_counter()
+        lexical_results = []
+        if self.lexical_index is not None:
+            lexical_query = " ".join([query, *(keywords or [])])
+            with stage('lexical_search'):
+                lexical_results = self.lexical_index.search(lexical_query, max(limit, self.candidates), filters)
+        lexical_done = time.perf_counter()
+        with stage('rank_fusion'):
+            results = reciprocal_rank_fusion([dense_results, lexical_results], limit, self.rrf_k)
+        fusion_done = time.perf_counter()
+
+        # Per request, the retriever is shared by every chat; the stages also reach the metrics and the trace
+        timings = {
+            'dense_ms': (dense_done - start) * 1000,
+            'lexical_ms': (lexical_done - dense_done) * 1000,
+            'fusion_ms': (fusion_done - lexical_done) * 1000
+        }
+        logger.debug("Hybrid search fused %d dense and %d lexical results", len(dense_results), len(lexical_results),
+                     extra=timings)
+        return results
 
     def multi_query_search(self,
                           queries: List[str],
@@ -160,27 +303,40 @@ class AdvancedRetriever(DocumentRetriever):
         """
         Search using multiple queries and combine results.
 
+        All queries are embedded in one model call and sent in one batch request.
+
         Args:
             queries: List of search queries
             limit: Maximum total results
-            deduplicate: Whether to remove duplicate documents
+            deduplicate: Whether to remove duplicate documents, keeping their best score
 
         Returns:
             Combined search results from all queries
         """
-        all_results = []
-        seen_ids = set()
-
-        for query in queries:
-            results = self.search(query, limit)
-
-            for result in results:
-                if deduplicate:
-                    if result['id'] not in seen_ids:
-                        all_results.append(result)
-                        seen_ids.add(result['id'])
-                else:
-                    all_results.append(result)
+        return self._merge_results(queries, self.search_batch(queries, limit), limit, deduplicate)
+
+    async def amulti_query_search(self,
+                                  queries: List[str],
+                                  limit: int = 5,
+                                  deduplicate: bool = True) -> List[Dict[str, Any]]:
+        """Async version of multi_query_search."""
+        return self._merge_results(queries, await self.asearch_batch(queries, limit), limit, deduplicate)
+
+    @staticmethod
+    def _merge_results(queries: List[str],
+                       batch: List[List[Dict[str, Any]]],
+                       limit: int,
+                       deduplicate: bool) -> List[Dict[str, Any]]:
+        if deduplicate:
+            best: Dict[Any, Dict[str, Any]] = {}
+            for results in batch:
+                for result in results:
+                    current = best.get(result['id'])
+                    if current is None or result['score'] > current['score']:
+                        best[result['id']] = result
+            all_results = list(best.values())
+        else:
+            all_results = [result for results in batch for result in results]
 
         # Sort by score descending
         all_results.sort(key=lambda x: x['score'], reverse=True)
@@ -0,0 +1,234 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+
+# Payload fields indexed by every backend so filtered searches stay cheap
+INDEXED_PAYLOAD_KEYS = ('source', 'metadata.file_type', 'metadata.category', 'metadata.language')
+
+# Filters map a payload key (dotted for nested fields) to an accepted value, a list of
+# accepted values, or a TextMatch requiring the words of a text to appear in the field
+Filters = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class TextMatch:
+    """Full-text condition: every word of `text` must appear in the payload field."""
+    text: str
+
+
+@dataclass
+class ScoredDocument:
+    """Search hit returned by vector stores: point id, similarity score and payload."""
+    id: str
+    score: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+class VectorStore(ABC):
+    """Operations the RAG pipeline needs from a vector database."""
+
+    collection_name: str
+    # Optional dimension reducer (see rag.quantization) applied to stored and query vectors
+    reducer = None
+    # Normalize vectors before storing and querying, so a dot product ranks like cosine
+    normalize = False
+    # Set while a blue/green rebuild fills a new collection next to the served one
+    migrating = False
+
+    def _prepare(self, vectors) -> np.ndarray:
+        """Vectors as a float32 matrix in the stored space (normalized, then dimension-reduced)."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.normalize and len(vectors):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        if self.reducer is not None and len(vectors):
+            vectors = self.reducer.transform(vectors)
+        return vectors
+
+    def finish_migration(self):
+        """Swap a rebuilt collection in place of the old one once it has been filled."""
+
+    def abort_migration(self):
+        """Drop a partly rebuilt collection after a failed rebuild, keeping the old one."""
+
+    @property
+    def needs_reducer_fit(self) -> bool:
+        """True while a corpus-fitted dimension reduction (PCA) has not seen any data yet."""
+        return self.reducer is not None and not self.reducer.fitted
+
+    def fit_reducer(self, sample: np.ndarray):
+        """Fit the dimension reduction on a sample of full-size embeddings."""
+        if self.reducer is not None and hasattr(self.reducer, 'fit'):
+            self.reducer.fit(sample)
+
+    @abstractmethod
+    def ensure_collection(self) -> bool:
+        """Create the collection if missing, returning True when it was created."""
+
+    @abstractmethod
+    def add_documents(self,
+                      documents: List[Dict[str, Any]],
+                      embeddings: Union[np.ndarray, List[List[float]]],
+                      batch_size: int = 256,
+                      wait: bool = True):
+        """Upsert documents with their embeddings."""
+
+    @abstractmethod
+    def update_payloads(self, documents: List[Dict[str, Any]]):
+        """Replace the payload of stored points with the content, source and metadata of `documents`, keeping their vectors."""
+
+    @abstractmethod
+    def query(self, query_embedding: List[float], limit: int = 5, filters: Optional[Filters] = None) -> List[Any]:
+        """Return the closest points matching the filters, each with id, score and payload attributes."""
+
+    async def aquery(self, query_embedding: List[float], limit: int = 5, filters: Optional[Filters] = None) -> List[Any]:
+        return self.query(query_embedding, limit, filters)
+
+    def query_batch(self, query_embeddings, limit: int = 5, filters: Optional[Filters] = None) -> List[List[Any]]:
+        """
+        Run several queries; stores override this to answer them in one round trip.
+
+        Args:
+            query_embeddings: (n, dim) matrix or list of query vectors
+            limit: Maximum number of results per query
+            filters: Payload conditions shared by all queries
+
+        Returns:
+            One list of scored points per query
+        """
+        return [self.query(list(embedding), limit, filters) for embedding in query_embeddings]
+
+    async def aquery_batch(self, query_embeddings, limit: int = 5, filters: Optional[Filters] = None) -> List[List[Any]]:
+        return self.query_batch(query_embeddings, limit, filters)
+
+    def search_documents_batch(self,
+                               query_embeddings,
+                               limit: int = 5,
+                               score_threshold: Optional[float] = None,
+                               filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Batched version of search_documents.
+
+        Args:
+            query_embeddings: (n, dim) matrix or list of query vectors
+            limit: Maximum number of results per query
+            score_threshold: Minimum similarity score threshold
+            filters: Payload conditions shared by all queries
+
+        Returns:
+            One list of formatted results per query
+        """
+        return [self._format_results(results, score_threshold)
+                for results in self.query_batch(query_embeddings, limit, filters)]
+
+    async def asearch_documents_batch(self,
+                                      query_embeddings,
+                                      limit: int = 5,
+                                      score_threshold: Optional[float] = None,
+                                      filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """Async version of search_documents_batch."""
+        return [self._format_results(results, score_threshold)
+                for results in await self.aquery_batch(query_embeddings, limit, filters)]
+
+    def search_documents(self,
+                         query_embedding: List[float],
+                         limit: int = 5,
+                         score_threshold: Optional[float] = None,
+                         filters: Optional[Filters] = None):
+        """
+        Search for similar documents with optional score and payload filtering.
+
+        Args:
+            query_embedding: Embedding vector of the query
+            limit: Maximum number of results to return
+            score_threshold: Minimum similarity score threshold
+            filters: Payload conditions applied by the store before ranking
+
+        Returns:
+            List of search results with formatted output
+        """
+        return self._format_results(self.query(query_embedding, limit, filters), score_threshold)
+
+    async def asearch_documents(self,
+                                query_embedding: List[float],
+                                limit: int = 5,
+                                score_threshold: Optional[float] = None,
+                                filters: Optional[Filters] = None):
+        """Async version of search_documents."""
+        return self._format_results(await self.aquery(query_embedding, limit, filters), score_threshold)
+
+    def _format_results(self, results, score_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Turn scored points into plain result dictionaries."""
+        formatted_results = []
+        for result in results:
+            if score_threshold is None or result.score >= score_threshold:
+                formatted_results.append({
+                    'id': result.id,
+                    'score': result.score,
+                    'content': result.payload.get('content', ''),
+                    'source': result.payload.get('source', 'unknown'),
+                    'metadata': result.payload.get('metadata', {})
+                })
+        return formatted_results
+
+    @abstractmethod
+    def count(self) -> int:
+        """Exact number of points in the collection."""
+
+    @abstractmethod
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        """Mapping of source to the ids of its points."""
+
+    @abstractmethod
+    def iter_documents(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (point id, payload) for every point of the collection."""
+
+    @abstractmethod
+    def delete_points(self, point_ids: List[str]):
+        """Delete points by id."""
+
+    @abstractmethod
+    def delete_by_source(self, source: str):
+        """Delete every point coming from a source."""
+
+    @abstractmethod
+    def clear_db(self):
+        """Delete the collection."""
+
+    @abstractmethod
+    def describe(self) -> Dict[str, Any]:
+        """Point count, vector size and distance of the collection."""
+
+    def flush(self):
+        """Make pending writes durable (no-op for stores that persist on every write)."""
+
+    def close(self):
+        """Release connections or files."""
+
+    async def aclose(self):
+        self.close()
+
+
+def payload_matches(payload: Dict[str, Any], key: str, expected: Any) -> bool:
+    """Check a single filter condition against a payload."""
+    value = payload_value(payload, key)
+    if isinstance(expected, TextMatch):
+        words = str(value or '').lower()
+        return all(word in words for word in expected.text.lower().split())
+    if isinstance(expected, (list, tuple, set)):
+        return value in expected
+    return value == expected
+
+
+def payload_value(payload: Dict[str, Any], key: str) -> Any:
+    """Read a possibly dotted key (e.g. "metadata.file_type") from a payload."""
+    value: Any = payload
+    for part in key.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
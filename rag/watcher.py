@@ -0,0 +1,81 @@
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from .loaders import discover_files
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryWatcher:
+    def __init__(self,
+                 directory: str,
+                 on_change: Callable[[], None],
+                 interval: float = 10.0,
+                 recursive: bool = True):
+        """
+        Poll a knowledge base directory and call back when its files change.
+
+        Polling only stats the files, so it is cheap and needs no platform-specific
+        notification API. A change is reported once the directory has been stable
+        for a full interval, so files that are still being written are not ingested.
+
+        Args:
+            directory: Directory to watch
+            on_change: Called from the watcher thread after files were added, modified or removed
+            interval: Seconds between two scans
+            recursive: Whether to watch subdirectories too
+        """
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        self.recursive = recursive
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        snapshot = {}
+        for file_path in discover_files(self.directory, self.recursive):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def poll(self) -> bool:
+        """Scan once; True if the directory changed since the last scan."""
+        snapshot = self._scan()
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def _run(self):
+        pending = False
+        while not self._stop.wait(self.interval):
+            try:
+                if self.poll():
+                    pending = True
+                    continue
+                if pending:
+                    pending = False
+                    self.on_change()
+            except Exception as e:
+                logger.error(f"Knowledge base watcher failed to handle a change: {e}")
+
+    def start(self):
+        """Start watching in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.directory} for knowledge base changes every {self.interval}s")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop watching, waiting for an in-flight sync to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -1,13 +1,32 @@
+import time
+STARTED = time.perf_counter()
+
+import asyncio
 import os
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+import secrets
+import signal
+from urllib.parse import urlparse
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters
 from telegram import Update
 from dotenv import load_dotenv
-from llm.Groq_client import GroqClient
 from bot.commands import start, help_command
 from bot.callbacks import language_callback
 from bot.message_handlers import handle_message
-from rag.pipeline import RAGPipeline
+from bot.services import BotServices, SERVICES_KEY
+from bot.conversation import ConversationStore, SQLiteConversationBackend
+from bot.supervisor import ShardRouter, WorkerPool
+from bot.webhook import WebhookServer
+from rag.quantization import VectorCompression
+from rag.context_builder import DEFAULT_RERANKER_MODEL
+from rag.models import DEFAULT_EMBEDDING_MODEL
+from telemetry.log import JsonFormatter
+from telemetry.metrics import QUEUE_DEPTH
+from telemetry.server import MetricsServer
+from telemetry.startup import STARTUP
+from telemetry.tracing import TRACER
 
 load_dotenv()
 
@@ -18,23 +37,233 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '64'))
+CONVERSATION_DB = os.getenv('CONVERSATION_DB')
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'qdrant')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+EMBEDDING_MODEL_MISMATCH = os.getenv('EMBEDDING_MODEL_MISMATCH', 'refuse')
+RERANKER_MODEL = os.getenv('RERANKER_MODEL', DEFAULT_RERANKER_MODEL) or None
+KNOWLEDGE_WATCH_INTERVAL = float(os.getenv('KNOWLEDGE_WATCH_INTERVAL', '0'))
+VECTOR_COMPRESSION = VectorCompression(
+    mode=os.getenv('VECTOR_QUANTIZATION', 'none'),
+    on_disk=os.getenv('VECTOR_ON_DISK', '0') == '1',
+    dimensions=int(os.getenv('VECTOR_DIMENSIONS', '0')) or None,
+    reduction=os.getenv('VECTOR_REDUCTION', 'matryoshka')
+)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+# Webhook mode replaces polling when WEBHOOK_URL (the public https URL Telegram posts to) is set
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', str(CONCURRENT_UPDATES)))
+WEBHOOK_MAX_QUEUED = int(os.getenv('WEBHOOK_MAX_QUEUED', '1000'))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '30'))
+# More than one worker process runs the bot as a supervisor sharding chats over them (0: one per core)
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '1')) or os.cpu_count() or 1
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', '8100'))
+# GatewayConfig arguments; the class is imported on the startup thread with the rest of the llm package
+LLM_SETTINGS = dict(
+    max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+    requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', '30')),
+    tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', '6000')),
+    fallback_models=tuple(model for model in os.getenv('LLM_FALLBACK_MODELS', 'llama-3.3-70b-versatile').split(',') if model)
+)
 
-def main() -> None:
-    if not TELEGRAM_BOT_TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables")
-        return
-    rag = RAGPipeline("hyppo-data", "sentence-transformers/all-MiniLM-L6-v2")
-
-    rag.add_text_files("data")
-
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-
+def add_handlers(application: Application) -> None:
+    """Register the bot's handlers (shared with the end-to-end benchmark)."""
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CallbackQueryHandler(language_callback, pattern="^lang_"))
 
     application.add_handler(MessageHandler(filters.TEXT, handle_message))
 
+def build_services(conversations: ConversationStore, processes: int = 1) -> BotServices:
+    """
+    Build and warm up the services; runs on the startup thread while Telegram initializes.
+
+    In a worker of a pool of `processes`, the knowledge base synced by the supervisor
+    is only read, and the cores and Groq limits are split between the workers.
+    """
+    from llm.gateway import GatewayConfig
+    settings = dict(LLM_SETTINGS)
+    if processes > 1:
+        # The Groq limits apply to the API key, not to each process
+        settings.update(max_concurrency=max(1, settings['max_concurrency'] // processes),
+                        requests_per_minute=settings['requests_per_minute'] / processes,
+                        tokens_per_minute=settings['tokens_per_minute'] / processes)
+    services = BotServices("hyppo-data", EMBEDDING_MODEL, "data",
+                           vector_backend=VECTOR_BACKEND, conversations=conversations,
+                           watch_interval=KNOWLEDGE_WATCH_INTERVAL, compression=VECTOR_COMPRESSION,
+                           on_model_mismatch=EMBEDDING_MODEL_MISMATCH, llm_config=GatewayConfig(**settings),
+                           embedding_threads=max(1, (os.cpu_count() or 1) // processes) if processes > 1 else None,
+                           read_only=processes > 1, reranker_model=RERANKER_MODEL)
+    services.warm_up()
+    return services
+
+def attach_services(services: Future):
+    """post_init hook holding polling back until the services, and so the index, are ready."""
+    async def wait_for_services(application: Application) -> None:
+        application.bot_data[SERVICES_KEY] = await asyncio.wrap_future(services)
+        STARTUP.report()
+    return wait_for_services
+
+async def shutdown_services(application: Application) -> None:
+    # Missing when the startup failed before the services were built
+    if SERVICES_KEY in application.bot_data:
+        await application.bot_data[SERVICES_KEY].shutdown()
+
+async def run_webhook(application: Application, server: WebhookServer, webhook_url: Optional[str] = None) -> None:
+    """
+    Serve the updates posted to the webhook server until SIGINT or SIGTERM.
+
+    The server is up (answering 503) from the start so the platform sees the port
+    bound; the webhook is registered at `webhook_url`, if any, once the services
+    are ready. On shutdown the queued updates are processed before the application
+    stops. The webhook stays registered, so updates sent meanwhile wait at
+    Telegram for the next instance.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    await server.start()
+    try:
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        server.ready = True
+        if webhook_url:
+            await application.bot.set_webhook(webhook_url, secret_token=server.secret_token,
+                                              allowed_updates=Update.ALL_TYPES, max_connections=100)
+        await stop.wait()
+        logger.info("Stopping HyppoBot, draining the webhook queue...")
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+def start_workers(pool: WorkerPool) -> None:
+    """Supervisor startup: sync the knowledge base once, then start the workers serving it read-only."""
+    from rag.pipeline import RAGPipeline
+    with STARTUP.phase("index_sync"):
+        rag = RAGPipeline("hyppo-data", EMBEDDING_MODEL, recreate_collection=False, vector_backend=VECTOR_BACKEND,
+                          compression=VECTOR_COMPRESSION, on_model_mismatch=EMBEDDING_MODEL_MISMATCH)
+        try:
+            rag.sync_directory("data")
+        finally:
+            rag.close()
+    with STARTUP.phase("workers"):
+        pool.start()
+        pool.wait_ready()
+
+def attach_workers(workers: Future, router: ShardRouter):
+    """post_init hook of the supervisor, holding updates back until the workers are ready."""
+    async def wait_for_workers(application: Application) -> None:
+        await asyncio.wrap_future(workers)
+        await router.start()
+        STARTUP.report()
+    return wait_for_workers
+
+def stop_workers(pool: WorkerPool, router: ShardRouter):
+    async def drain_and_stop(application: Application) -> None:
+        await router.stop(WEBHOOK_DRAIN_TIMEOUT)
+        await asyncio.to_thread(pool.stop)
+    return drain_and_stop
+
+def configure_process() -> None:
+    if LOG_FORMAT == 'json':
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(JsonFormatter())
+    TRACER.sample_rate = TRACE_SAMPLE_RATE
+    STARTUP.started = STARTED
+    STARTUP.record("imports", STARTED)
+
+def bot_application(processes: int = 1) -> Application:
+    """The bot with its handlers, whose services are built on a startup thread of their own."""
+    conversations = ConversationStore(
+        max_turns=int(os.getenv('CONVERSATION_MAX_TURNS', '2')),
+        max_tokens=int(os.getenv('CONVERSATION_MAX_TOKENS', '1000')),
+        backend=SQLiteConversationBackend(CONVERSATION_DB) if CONVERSATION_DB else None
+    )
+    # Model load, vector store connection and index sync run on the startup thread
+    # while the application connects to Telegram; updates are only taken once it is done
+    startup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup")
+    services = startup.submit(build_services, conversations, processes)
+    startup.shutdown(wait=False)
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(attach_services(services))
+        .post_shutdown(shutdown_services)
+        .build()
+    )
+    add_handlers(application)
+    return application
+
+def supervisor_application() -> Application:
+    """The front of a worker pool: takes the updates from Telegram and routes each chat to its worker."""
+    pool = WorkerPool(run_worker, WORKER_PROCESSES, secrets.token_urlsafe(32), WORKER_BASE_PORT)
+    router = ShardRouter(pool.urls, pool.secret_token, max_queued=WEBHOOK_MAX_QUEUED,
+                         retry_timeout=2 * WEBHOOK_DRAIN_TIMEOUT)
+    startup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup")
+    workers = startup.submit(start_workers, pool)
+    startup.shutdown(wait=False)
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(attach_workers(workers, router))
+        .post_shutdown(stop_workers(pool, router))
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, router.handle))
+    return application
+
+def run_worker(shard: int, port: int, secret_token: str, processes: int) -> None:
+    """Entry point of a worker process: serve the chats of one shard on a local webhook."""
+    configure_process()
+    application = bot_application(processes)
+    if METRICS_PORT:
+        MetricsServer(METRICS_PORT + 1 + shard).start()
+    server = WebhookServer(application, secret_token, host="127.0.0.1", port=port, workers=WEBHOOK_WORKERS,
+                           max_queued=WEBHOOK_MAX_QUEUED, drain_timeout=WEBHOOK_DRAIN_TIMEOUT)
+    asyncio.run(run_webhook(application, server))
+
+def main() -> None:
+    if not TELEGRAM_BOT_TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables")
+        return
+    configure_process()
+    if WORKER_PROCESSES > 1:
+        logger.info("Running %d worker processes", WORKER_PROCESSES)
+        application = supervisor_application()
+    else:
+        application = bot_application()
+    QUEUE_DEPTH.set_function(application.update_queue.qsize, queue='updates')
+    if METRICS_PORT:
+        MetricsServer(METRICS_PORT).start()
+
+    if WEBHOOK_URL:
+        secret_token = WEBHOOK_SECRET
+        if not secret_token:
+            # Fine for one instance; replicas behind a load balancer need the same WEBHOOK_SECRET
+            secret_token = secrets.token_urlsafe(32)
+            logger.warning("WEBHOOK_SECRET not set, using a random secret token")
+        server = WebhookServer(application, secret_token, port=WEBHOOK_PORT, path=urlparse(WEBHOOK_URL).path or "/",
+                               workers=WEBHOOK_WORKERS, max_queued=WEBHOOK_MAX_QUEUED,
+                               drain_timeout=WEBHOOK_DRAIN_TIMEOUT)
+        logger.info("Starting HyppoBot with a webhook at %s...", WEBHOOK_URL)
+        asyncio.run(run_webhook(application, server, WEBHOOK_URL))
+        return
+
     logger.info("Starting HyppoBot...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
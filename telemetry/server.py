@@ -0,0 +1,71 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .metrics import REGISTRY, MetricsRegistry
+from .tracing import TRACER, Tracer
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer:
+    def __init__(self,
+                 port: int,
+                 host: str = '0.0.0.0',
+                 registry: MetricsRegistry = REGISTRY,
+                 tracer: Tracer = TRACER):
+        """
+        HTTP endpoint for scrapers, served from a daemon thread so it never touches the bot's event loop.
+
+        GET /metrics returns the registry in Prometheus text format, GET /traces the
+        most recent sampled traces as JSON.
+
+        Args:
+            port: Port to listen on, 0 picks a free one
+            host: Interface to bind
+            registry: Metrics to expose
+            tracer: Source of the recent traces
+        """
+        registry_, tracer_ = registry, tracer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    self._reply(200, PROMETHEUS_CONTENT_TYPE, registry_.render().encode())
+                elif self.path.split('?')[0] == '/traces':
+                    self._reply(200, 'application/json', json.dumps(tracer_.recent()).encode())
+                else:
+                    self._reply(404, 'text/plain', b'not found\n')
+
+            def _reply(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the log
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info("Serving metrics on port %d", self.port)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    'hyppo_startup_phase_seconds', 'Duration of the phases of the last startup', ('phase',))
+
+
+class StartupTimer:
+    def __init__(self, started: Optional[float] = None):
+        """
+        Wall-clock phases of the process startup, for the report logged once the bot is ready.
+
+        Phases may run concurrently on several threads; each one records its
+        offset from `started` and its duration, so the report shows what
+        overlapped and which phase was on the critical path.
+
+        Args:
+            started: perf_counter() value the offsets are measured from, defaults to now
+        """
+        self.started = time.perf_counter() if started is None else started
+        self._phases: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def record(self, name: str, start: float, end: Optional[float] = None):
+        """Record a phase that ran from `start` to `end` (perf_counter), now by default."""
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            self._phases.append({'phase': name, 'thread': threading.current_thread().name,
+                                 'start': start - self.started, 'duration': end - start})
+        STARTUP_SECONDS.set(end - start, phase=name)
+
+    def report(self) -> Dict[str, Any]:
+        """Log the phases in start order and return them with the total time since `started`."""
+        total = time.perf_counter() - self.started
+        STARTUP_SECONDS.set(total, phase='total')
+        with self._lock:
+            phases = sorted(self._phases, key=lambda phase: phase['start'])
+        lines = [f"  {phase['phase']:<16} +{phase['start']:6.2f}s {phase['duration']:6.2f}s  ({phase['thread']})"
+                 for phase in phases]
+        logger.info("Ready in %.2fs\n%s", total, '\n'.join(lines),
+                    extra={'startup': {'total': round(total, 3),
+                                       'phases': {phase['phase']: round(phase['duration'], 3) for phase in phases}}})
+        return {'total': total, 'phases': phases}
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,87 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('hyppo_trace', default=None)
+
+
+class Trace:
+    """Spans of one sampled update, in the order they finished."""
+
+    __slots__ = ('update_id', 'started', 'spans', 'attributes')
+
+    def __init__(self, update_id: Any):
+        self.update_id = update_id
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.attributes: Dict[str, Any] = {}
+
+    def add_span(self, name: str, start: float, duration: float):
+        self.spans.append({'name': name, 'start_ms': round((start - self.started) * 1000, 2),
+                           'duration_ms': round(duration * 1000, 2)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'update_id': self.update_id, 'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+                'spans': self.spans, **self.attributes}
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, keep: int = 100):
+        """
+        Sampled span traces keyed by Telegram update_id.
+
+        Only a `sample_rate` fraction of updates is traced, the others pay one
+        random() call. The current trace lives in a context variable, so each
+        update handled concurrently records its own spans. Finished traces are
+        logged and the last `keep` are served by the metrics endpoint.
+
+        Args:
+            sample_rate: Fraction of updates traced, between 0 and 1
+            keep: Finished traces kept in memory
+        """
+        self.sample_rate = sample_rate
+        self._finished: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def start(self, update_id: Any) -> Optional[contextvars.Token]:
+        """Start tracing the current task if the update is sampled; pass the token to finish()."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return _current.set(Trace(update_id))
+
+    def finish(self, token: Optional[contextvars.Token]):
+        if token is None:
+            return
+        trace = _current.get()
+        _current.reset(token)
+        if trace is None:
+            return
+        finished = trace.to_dict()
+        with self._lock:
+            self._finished.append(finished)
+        logger.info("trace update_id=%s duration_ms=%s", trace.update_id, finished['duration_ms'],
+                    extra={'trace': finished})
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._finished)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Attach attributes (cache hit, model, ...) to the current trace, if the update is sampled."""
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+TRACER = Tracer()